@@ -1,83 +1,27 @@
-from picographics import PicoGraphics, DISPLAY_TUFTY_2040, PEN_RGB565
+from picographics import PEN_RGB565
 import pngdec
+import image_cache
+import image_carousel
+import flags
 import time
-from pimoroni import Button
+import app_context
+import badge_settings
+import button_events
+import profiler
+import mem_telemetry
+import text_effects
+import text_fit
 import gc
 import sys
 import os
-import json
-
-# --- Settings file path ---
-SETTINGS_FILE = "/settings.json"
-
-# --- Default settings ---
-DEFAULT_SETTINGS = {
-    "brightness": 1.0,
-    "text_overlay": True,
-    "selected_image": "",
-    "badge_image": True,
-    "background_color": "Black"
-}
-
-# --- Load settings from file ---
-def load_settings():
-    """Load settings from JSON file, return defaults if file doesn't exist"""
-    try:
-        # Check if file exists by trying to stat it
-        try:
-            os.stat(SETTINGS_FILE)
-            # File exists, try to read it
-            with open(SETTINGS_FILE, 'r') as f:
-                settings = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                for key in DEFAULT_SETTINGS:
-                    if key not in settings:
-                        settings[key] = DEFAULT_SETTINGS[key]
-                return settings
-        except OSError:
-            # File doesn't exist, return defaults
-            pass
-    except Exception as e:
-        print(f"Error loading settings: {e}")
-    return DEFAULT_SETTINGS.copy()
-
-# --- Settings file path ---
-BADGE_TEXT_FILE = "/badge_text.json"
-
-# --- Default settings ---
-DEFAULT_BADGE_TEXT = {
-    "line_1": "Name",
-    "line_2": "Descriptor"
-}
-
-# --- Load settings from file ---
-def load_badge_text():
-    """Load settings from JSON file, return defaults if file doesn't exist"""
-    try:
-        # Check if file exists by trying to stat it
-        try:
-            os.stat(BADGE_TEXT_FILE)
-            # File exists, try to read it
-            with open(BADGE_TEXT_FILE, 'r') as f:
-                badge_text = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                for key in DEFAULT_BADGE_TEXT:
-                    print(key)
-                    if key not in badge_text:
-                        print("no key")
-                        badge_text[key] = DEFAULT_BADGE_TEXT[key]
-                return badge_text
-        except OSError:
-            # File doesn't exist, return defaults
-            pass
-    except Exception as e:
-        print(f"Error loading settings: {e}")
-    return DEFAULT_BADGE_TEXT.copy()
 
 # --- Display setup ---
-display = PicoGraphics(display=DISPLAY_TUFTY_2040, pen_type=PEN_RGB565)
+display = app_context.get_display(PEN_RGB565)
 WIDTH, HEIGHT = display.get_bounds()
 
+# Catch button presses from here on, even during the first slow draw
+button_events.start()
+
 # List of available pen colours, add more if necessary
 RED = display.create_pen(209, 34, 41)
 ORANGE = display.create_pen(246, 138, 30)
@@ -114,18 +58,17 @@ COLOR_PENS = {
 }
 
 # --- Load current settings ---
-settings = load_settings()
-brightness = round(settings.get("brightness", 1.0), 1)
-text_overlay = settings.get("text_overlay", True)
-selected_image = settings.get("selected_image", "")
-badge_image = settings.get("badge_image", True)
-background_color_name = settings.get("background_color", "Black")
+brightness = badge_settings.brightness()
+text_overlay = badge_settings.get("text_overlay")
+selected_image = badge_settings.get("selected_image")
+badge_image = badge_settings.get("badge_image")
+background_color_name = badge_settings.get("background_color")
 bg_colour = COLOR_PENS.get(background_color_name, BLACK)
 
 # --- Load current badge_text ---
-badge_text = load_badge_text()
-LINE1 = badge_text.get("line_1", "Name")
-LINE2 = badge_text.get("line_2", "Discriptor")
+badge_text = badge_settings.badge_text()
+LINE1 = badge_text["line_1"]
+LINE2 = badge_text["line_2"]
 
 display.set_backlight(brightness)
 
@@ -145,83 +88,68 @@ DROP_SHADOW_COLOUR = GREY
 DROP_SHADOW_COLOUR_2 = BLACK
 
 
-def draw_text_overlay() -> None:
+# Shadow offsets from the text position, drawn in DROP_SHADOW_COLOUR then DROP_SHADOW_COLOUR_2
+# (comment out the shadows here if you hate drop shadow)
+DROP_SHADOWS = [(-1, -1), (-1, 3)]
+
+# (effect, x, y) for each line, built by prepare_text_overlay()
+overlay_lines = []
+
+
+def set_font(font: str) -> str:
+    """Select `font`, falling back to bitmap8; return the font now in use"""
+    try:
+        display.set_font(font)
+        return font
+    except Exception as e:
+        print(f"Error loading font: {e}")
+        print("Using default font instead")
+        display.set_font("bitmap8")  # Fallback to built-in font
+        return "bitmap8"
+
+
+def prepare_text_overlay() -> None:
+    """Size both lines to fit and rasterise them, before anything is drawn on screen"""
+    global overlay_lines
+    overlay_lines = []
     if not LINE1 and not LINE2:
         return
 
-    # Set a starting scale for text size.
-    # This is intentionally bigger than will fit on the screen, we'll shrink it to fit.
-    name_size = 20
-    pronouns_size = 20
-
-    # These loops adjust the scale of the text until it fits on the screen
-    while True:
-        # Load the PCF font
-        try:
-            display.set_font("sans")
-        except Exception as e:
-            print(f"Error loading font: {e}")
-            print("Using default font instead")
-            display.set_font("bitmap8")  # Fallback to built-in font
-    #    display.set_font("bitmap8")
-        name_length = display.measure_text(LINE1, name_size)
-        if name_length >= WIDTH - 20:
-            name_size -= 1
-        else:
-            # comment out this section if you hate drop shadow
-            DROP_SHADOW_OFFSET = 1
-            display.set_pen(DROP_SHADOW_COLOUR)
-            display.text(LINE1, int((WIDTH - name_length) / 2) - DROP_SHADOW_OFFSET, 78 + DROP_SHADOW_OFFSET, WIDTH, name_size)
-            
-            # comment out this section if you hate drop shadow
-            DROP_SHADOW_OFFSET = 1
-            display.set_pen(DROP_SHADOW_COLOUR_2)
-            display.text(LINE1, int((WIDTH - name_length) / 2) - DROP_SHADOW_OFFSET, 82 + DROP_SHADOW_OFFSET, WIDTH, name_size)
-
-            # draw name and stop looping
-            display.set_pen(TEXT_COLOUR)
-            display.text(LINE1, int((WIDTH - name_length) / 2), 80, WIDTH, name_size)
-            
-            break
-
-    while True:
-        # Load the PCF font
-        try:
-            display.set_font("serif")
-        except Exception as e:
-            print(f"Error loading font: {e}")
-            print("Using default font instead")
-            display.set_font("bitmap8")  # Fallback to built-in font
-    #    display.set_font("bitmap8")
-        pronouns_length = display.measure_text(LINE2, pronouns_size)
-        if pronouns_length >= WIDTH - 60:
-            pronouns_size -= 1
-        else:
-            # comment out this section if you hate drop shadow
-            DROP_SHADOW_OFFSET = 1
-            display.set_pen(DROP_SHADOW_COLOUR)
-            display.text(LINE2, int((WIDTH - pronouns_length) / 2) - DROP_SHADOW_OFFSET, 173 + DROP_SHADOW_OFFSET, WIDTH, pronouns_size)
-            
-            # comment out this section if you hate drop shadow
-            DROP_SHADOW_OFFSET = 1
-            display.set_pen(DROP_SHADOW_COLOUR_2)
-            display.text(LINE2, int((WIDTH - pronouns_length) / 2) - DROP_SHADOW_OFFSET, 177 + DROP_SHADOW_OFFSET, WIDTH, pronouns_size)
-            
-            # draw pronouns and stop looping
-            display.set_pen(TEXT_COLOUR)
-            display.text(LINE2, int((WIDTH - pronouns_length) / 2), 175, WIDTH, pronouns_size)
-            break
+    # Largest scale (up to 20) at which each line fits, remembered between boots
+    name_font = set_font("sans")
+    name_size, name_length = text_fit.fit(display, name_font, LINE1, WIDTH - 20)
+    pronouns_font = set_font("serif")
+    pronouns_size, pronouns_length = text_fit.fit(display, pronouns_font, LINE2, WIDTH - 60)
+
+    # Rasterise each line once; the shadows and text are stamped from it on every redraw
+    name = text_effects.get(display, name_font, LINE1, name_size, shadows=DROP_SHADOWS)
+    pronouns = text_effects.get(display, pronouns_font, LINE2, pronouns_size, shadows=DROP_SHADOWS)
+    overlay_lines = [
+        (name, int((WIDTH - name_length) / 2), 80),
+        (pronouns, int((WIDTH - pronouns_length) / 2), 175),
+    ]
+
+
+def draw_text_overlay() -> None:
+    for effect, x, y in overlay_lines:
+        effect.draw(display, x, y, TEXT_COLOUR, [DROP_SHADOW_COLOUR, DROP_SHADOW_COLOUR_2])
 
 
 # --- Image helpers ---
+# Whole image changes, and the image draw (a decode, cache read or fill) within them
+show_section = profiler.section("badge show")
+decode_section = profiler.section("badge decode")
+
+
 def list_png_files(directory: str) -> list[str]:
+    """The images in `directory`, then the flags from /flags.json"""
     try:
-        files = [f for f in os.listdir(directory) if f.lower().endswith(".png")]
+        files = [f for f in os.listdir(directory) if f.lower().endswith((".png", ".rle"))]
         files.sort()
-        return files
     except Exception as e:
-        print(f"Error listing PNG files in '{directory}': {e}")
-        return []
+        print(f"Error listing image files in '{directory}': {e}")
+        files = []
+    return files + flags.names()
 
 
 def show_image(path: str, draw_overlay: bool) -> None:
@@ -229,9 +157,11 @@ def show_image(path: str, draw_overlay: bool) -> None:
     display.set_pen(display.create_pen(0, 0, 0))  # Black
     display.clear()
 
+    show_section.begin()
     try:
-        png.open_file(path)
-        png.decode(0, 0)
+        decode_section.begin()
+        image_cache.draw_png(display, png, path)
+        decode_section.end()
         print(f"Displayed '{path}'")
     except Exception as e:
         print(f"Error loading image '{path}': {e}")
@@ -241,7 +171,12 @@ def show_image(path: str, draw_overlay: bool) -> None:
     if draw_overlay:
         draw_text_overlay()
 
+    profiler.overlay(display)
     display.update()
+    show_section.end()
+    mem_telemetry.sample()
+
+prepare_text_overlay()
 
 if badge_image:
     png = pngdec.PNG(display)
@@ -251,10 +186,13 @@ if badge_image:
     show_overlay = text_overlay
 
     if current_index >= 0:
-        show_image(f"/badge/{image_files[current_index]}", show_overlay)
+        # Up/down step through /badge with the images either side decoded ahead of time
+        carousel = image_carousel.Carousel(display, png, [f"/badge/{f}" for f in image_files], current_index,
+                                           lambda path: show_image(path, show_overlay))
+        carousel.show_current()
     else:
         display.set_pen(display.create_pen(200, 0, 0))
-        display.text("No PNG files in /badge", 10, HEIGHT // 2, scale=2)
+        display.text("No images in /badge", 10, HEIGHT // 2, scale=2)
         display.update()
 else:
     display.set_pen(bg_colour)
@@ -264,55 +202,39 @@ else:
 
     display.update()
 
-button_a = Button(7, invert=False)
-button_b = Button(8, invert=False)
-button_up = Button(22, invert=False)
-button_down = Button(6, invert=False)
-
 while True:
     time.sleep(0.01)  # Small delay to prevent busy-waiting
-    
-    if button_a.read():
-        # Wait for the button to be released
-        while button_a.is_pressed:
-            time.sleep(0.01)
+
+    event = button_events.poll()
+    if event is None:
+        if badge_image and current_index >= 0:
+            carousel.refill()
+        continue
+    kind, name, pressed_at = event
+
+    if name == "a" and kind == button_events.PRESS:
         break  # Exit the loop after importing
-    
+
     if badge_image:
-        if button_up.read() and current_index >= 0 and image_files:
-            while button_up.is_pressed:
-                time.sleep(0.01)
-            current_index = (current_index - 1) % len(image_files)
-            show_image(f"/badge/{image_files[current_index]}", show_overlay)
-                
-        if button_down.read() and current_index >= 0 and image_files:
-            while button_down.is_pressed:
-                time.sleep(0.01)
-            current_index = (current_index + 1) % len(image_files)
-            show_image(f"/badge/{image_files[current_index]}", show_overlay)
-
-        if button_b.read():
-            while button_b.is_pressed:
-                time.sleep(0.01)
+        if current_index >= 0 and name in ("up", "down") and kind in (button_events.PRESS, button_events.REPEAT):
+            # Timed from the press itself, however long the last frame took
+            carousel.step(-1 if name == "up" else 1, pressed_at)
+        elif name == "b" and kind == button_events.PRESS:
             show_overlay = not show_overlay
             if current_index >= 0:
-                show_image(f"/badge/{image_files[current_index]}", show_overlay)
-    else:                                                                                                                                                                                                                                                                            
-        if button_b.read():
-            while button_b.is_pressed:
-                time.sleep(0.01)
-            text_overlay = not text_overlay
-            if text_overlay:
-                draw_text_overlay()
-            else:
-                display.set_pen(bg_colour)                                 
-                display.clear() 
-            display.update()
-
-# Alternative: If you want to completely restart, use machine.reset()
-# Uncomment these lines instead of __import__("main"):
-import machine
-machine.reset()
-
+                show_image(carousel.current(), show_overlay)
+    elif name == "b" and kind == button_events.PRESS:
+        text_overlay = not text_overlay
+        if text_overlay:
+            draw_text_overlay()
+        else:
+            display.set_pen(bg_colour)
+            display.clear()
+        display.update()
 
+if badge_image and current_index >= 0:
+    print(f"Image steps: {carousel.stats()}")
+profiler.dump()
 
+# Back to the launcher (or reset the badge when run on its own)
+app_context.finish()
@@ -0,0 +1,142 @@
+# Gallery for the Tufty 2040 badge: the images in /badge as a grid of thumbnails
+# Up/down move the highlight, B shows the next page, C makes the highlighted
+# image the badge image, A goes back.
+
+from picographics import PEN_RGB565
+import pngdec
+import time
+import app_context
+import badge_settings
+import button_events
+import mem_telemetry
+import profiler
+import thumbnails
+
+# --- Display setup ---
+display = app_context.get_display(PEN_RGB565)
+display.set_backlight(badge_settings.brightness())
+WIDTH, HEIGHT = display.get_bounds()
+
+# Queue button presses while the thumbnails are brought up to date
+button_events.start()
+
+WHITE = display.create_pen(255, 255, 255)
+BLACK = display.create_pen(0, 0, 0)
+LIGHT_GREY = display.create_pen(200, 200, 200)
+HIGHLIGHT = display.create_pen(255, 216, 0)
+
+# --- Grid layout: 4 x 3 thumbnails, with a line of text underneath ---
+COLUMNS = 4
+ROWS = 3
+PER_PAGE = COLUMNS * ROWS
+CELLS = [(col * thumbnails.THUMB_WIDTH, row * thumbnails.THUMB_HEIGHT) for row in range(ROWS) for col in range(COLUMNS)]
+FOOTER_Y = ROWS * thumbnails.THUMB_HEIGHT
+BORDER = 3
+
+# Time each redraw after the selection moves
+redraw_section = profiler.section("gallery redraw")
+
+display.set_font("bitmap8")
+
+# --- Bring the thumbnails up to date ---
+display.set_pen(BLACK)
+display.clear()
+display.set_pen(WHITE)
+display.text("Updating thumbnails...", 10, HEIGHT // 2, WIDTH, 2)
+display.update()
+
+start = time.ticks_ms()
+entries = thumbnails.update(display, pngdec.PNG(display))
+print(f"Thumbnails ready in {time.ticks_diff(time.ticks_ms(), start)}ms: {thumbnails.stats}")
+
+selected_image = badge_settings.get("selected_image")
+names = [entry[0] for entry in entries]
+selected = names.index(selected_image) if selected_image in names else 0
+shown_page = None
+
+
+def draw_highlight(index: int, pen: int) -> None:
+    x, y = CELLS[index % PER_PAGE]
+    w, h = thumbnails.THUMB_WIDTH, thumbnails.THUMB_HEIGHT
+    display.set_pen(pen)
+    display.rectangle(x, y, w, BORDER)
+    display.rectangle(x, y + h - BORDER, w, BORDER)
+    display.rectangle(x, y, BORDER, h)
+    display.rectangle(x + w - BORDER, y, BORDER, h)
+
+
+def draw_footer() -> None:
+    display.set_pen(BLACK)
+    display.rectangle(0, FOOTER_Y, WIDTH, HEIGHT - FOOTER_Y)
+    name = names[selected]
+    display.set_pen(HIGHLIGHT if name == selected_image else WHITE)
+    display.text(name, 10, FOOTER_Y + 12, WIDTH - 20, 2)
+    pages = (len(entries) + PER_PAGE - 1) // PER_PAGE
+    display.set_pen(LIGHT_GREY)
+    display.text(f"Page {selected // PER_PAGE + 1}/{pages}   C: use as badge image", 10, FOOTER_Y + 36, WIDTH - 20, 1)
+
+
+def draw(previous) -> None:
+    """Redraw after the highlight moved from `previous` (None to redraw everything)"""
+    global shown_page
+    page = selected // PER_PAGE
+    if page != shown_page or previous is None:
+        display.set_pen(BLACK)
+        display.clear()
+        thumbnails.draw(display, entries, page * PER_PAGE, PER_PAGE, CELLS)
+        shown_page = page
+    elif previous != selected:
+        # Same page: just put back the thumbnail under the old highlight
+        thumbnails.draw(display, entries, previous, 1, [CELLS[previous % PER_PAGE]])
+    draw_highlight(selected, HIGHLIGHT)
+    draw_footer()
+    display.update()
+    mem_telemetry.sample()
+
+
+if entries:
+    draw(None)
+else:
+    display.set_pen(BLACK)
+    display.clear()
+    display.set_pen(WHITE)
+    display.text("No images in /badge", 10, HEIGHT // 2, WIDTH, 2)
+    display.update()
+
+while True:
+    time.sleep(0.01)  # Small delay to prevent busy-waiting
+
+    pressed = button_events.pressed()
+    if pressed == "a":
+        break
+
+    if not entries:
+        continue
+
+    previous = selected
+    if pressed == "up":
+        selected = (selected - 1) % len(entries)
+    if pressed == "down":
+        selected = (selected + 1) % len(entries)
+    if pressed == "b":
+        # Next page, wrapping round to the first
+        selected = (selected // PER_PAGE + 1) * PER_PAGE
+        if selected >= len(entries):
+            selected = 0
+    if pressed == "c":
+        selected_image = names[selected]
+        badge_settings.set("selected_image", selected_image)
+        draw_footer()
+        display.update()
+
+    if selected != previous:
+        redraw_section.begin()
+        draw(previous)
+        redraw_section.end()
+
+# Write out the new badge image, if one was chosen
+badge_settings.flush()
+profiler.dump()
+
+# Back to the launcher (or reset the badge when run on its own)
+app_context.finish()
@@ -0,0 +1,48 @@
+# Decode benchmark: .rle images against the PNGs they were made from.
+#
+# Convert some images into both formats and put them in /badge, then run
+# this on the badge (`mpremote run bench/rle_decode.py`) or the simulator:
+#
+#   python tools/convert_assets.py bg_images --format both --out <flash>/badge
+#   python sim/run.py bench/rle_decode.py --root <flash> --duration 60000
+#
+# Every name.rle with a name.png next to it is drawn ROUNDS times in each
+# format, straight from flash (the raw image cache is bypassed).
+
+import os
+import time
+import pngdec
+import app_context
+import rle_image
+from picographics import PEN_RGB565
+
+DIRECTORY = "/badge"
+ROUNDS = 5
+
+display = app_context.get_display(PEN_RGB565)
+
+
+def measure(decoder, path: str) -> int:
+    """Mean microseconds to open and draw `path`"""
+    total = 0
+    for _ in range(ROUNDS):
+        start = time.ticks_us()
+        decoder.open_file(path)
+        decoder.decode(0, 0)
+        total += time.ticks_diff(time.ticks_us(), start)
+    return total // ROUNDS
+
+
+png = pngdec.PNG(display)
+rle = rle_image.RLE(display)
+names = sorted(f[:-4] for f in os.listdir(DIRECTORY) if f.lower().endswith(".rle"))
+pairs = [name for name in names if f"{name}.png" in os.listdir(DIRECTORY)]
+if not pairs:
+    print(f"No name.rle / name.png pairs in {DIRECTORY}")
+
+print(f"{'image':24} {'png bytes':>9} {'rle bytes':>9} {'png us':>8} {'rle us':>8}")
+for name in pairs:
+    png_path = f"{DIRECTORY}/{name}.png"
+    rle_path = f"{DIRECTORY}/{name}.rle"
+    print(f"{name:24} {os.stat(png_path)[6]:>9} {os.stat(rle_path)[6]:>9} "
+          f"{measure(png, png_path):>8} {measure(rle, rle_path):>8}")
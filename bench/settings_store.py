@@ -0,0 +1,51 @@
+# Settings load benchmark: the two JSON files vs the binary settings record.
+#
+# Runs on the badge (copy lib/ across, then `mpremote run bench/settings_store.py`)
+# or on the host simulator:
+#
+#   python sim/run.py bench/settings_store.py
+#
+# Each variant is timed ROUNDS times.  The heap figure is how far
+# gc.mem_free() drops while the result is still referenced.  On the
+# simulator only the flash I/O is modelled, not the parsing itself, so use
+# the badge for real parse times.
+
+import gc
+import time
+import badge_settings
+
+ROUNDS = 20
+
+
+def from_json():
+    return (badge_settings.read_json(badge_settings.SETTINGS_FILE, badge_settings.DEFAULTS),
+            badge_settings.read_json(badge_settings.BADGE_TEXT_FILE, badge_settings.DEFAULT_BADGE_TEXT))
+
+
+def from_record():
+    return badge_settings.read_record()
+
+
+def measure(name: str, fn) -> None:
+    times = []
+    heap = []
+    for _ in range(ROUNDS):
+        gc.collect()
+        free = gc.mem_free()
+        start = time.ticks_us()
+        result = fn()
+        times.append(time.ticks_diff(time.ticks_us(), start))
+        heap.append(free - gc.mem_free())
+        result = None
+    times.sort()
+    print(f"{name:7} mean {sum(times) // ROUNDS} us, min {times[0]} us, max {times[-1]} us, "
+          f"heap {max(heap)} bytes")
+
+
+# Make sure the record exists and matches the JSON before timing either
+badge_settings.load()
+if from_json() != from_record():
+    print("Warning: settings.bin and the JSON files disagree")
+
+measure("json", from_json)
+measure("record", from_record)
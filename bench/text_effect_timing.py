@@ -0,0 +1,64 @@
+# Text effect benchmark: display.text() passes vs a TextEffect built once.
+#
+#   python sim/run.py bench/text_effect_timing.py      (or mpremote run on the badge)
+#
+# For the mood fallback text (shadow + five bold passes) and the badge name
+# overlay (two shadows + text), times one draw done the old way, building
+# the effect, and drawing the built effect.  The simulator doesn't charge
+# for the Python-side slice copies a draw is made of, so its draw times are
+# close to zero; on the badge expect a few microseconds per run.
+
+import time
+from picographics import PEN_RGB565
+import app_context
+import text_effects
+
+ROUNDS = 10
+
+display = app_context.get_display(PEN_RGB565)
+WIDTH, HEIGHT = display.get_bounds()
+BLACK = display.create_pen(0, 0, 0)
+GREY = display.create_pen(64, 64, 64)
+WHITE = display.create_pen(255, 255, 255)
+
+CASES = [
+    # name, font, text, scale, bold passes, shadow offsets
+    ("mood", "sans", "Good/Happy", 1.3, text_effects.BOLD, [(1, 1)]),
+    ("name", "sans", "Name", 3, None, [(-1, -1), (-1, 3)]),
+    ("outline", "sans", "Just A Minute", 2, text_effects.BOLD, []),
+]
+
+
+def passes_draw(text, x, y, scale, bold, shadows):
+    for dx, dy in shadows:
+        display.set_pen(BLACK)
+        display.text(text, x + dx, y + dy, -1, scale)
+    display.set_pen(GREY)
+    for dx, dy in bold or [(0, 0)]:
+        display.text(text, x + dx, y + dy, -1, scale)
+
+
+def timed(fn) -> int:
+    start = time.ticks_us()
+    for _ in range(ROUNDS):
+        fn()
+    return time.ticks_diff(time.ticks_us(), start) // ROUNDS
+
+
+for name, font, text, scale, bold, shadows in CASES:
+    display.set_font(font)
+    x = (WIDTH - display.measure_text(text, scale)) // 2
+    y = HEIGHT // 2
+    outline = name == "outline"
+
+    old = timed(lambda: passes_draw(text, x, y, scale, bold, shadows))
+
+    def build():
+        text_effects.clear_cache()
+        return text_effects.get(display, font, text, scale, bold, outline, shadows)
+
+    built = timed(build)
+    effect = build()
+    drawn = timed(lambda: effect.draw(display, x, y, GREY, [BLACK] * len(shadows), WHITE))
+    print(f"{name:8} display.text x{len(shadows) + len(bold or [0])}: {old} us, "
+          f"build: {built} us, draw: {drawn} us ({len(effect.fill) // 3} fill runs)")
@@ -1,50 +1,24 @@
-from picographics import PicoGraphics, DISPLAY_TUFTY_2040, PEN_RGB565
+from picographics import PEN_RGB565
 import pngdec
+import image_cache
+from tick_scheduler import TickScheduler
+from glyph_atlas import GlyphAtlas, GLYPH_ASCENT, GLYPH_DESCENT, atlas_path, bold_padding
 import time
-from pimoroni import Button
-import gc
+import app_context
+import badge_settings
+import button_events
+import profiler
+import mem_telemetry
 import sys
 import os
-import json
-
-# --- Settings file path ---
-SETTINGS_FILE = "/settings.json"
-
-# --- Default settings ---
-DEFAULT_SETTINGS = {
-    "brightness": 1.0,
-    "text_overlay": True,
-    "selected_image": "",
-    "clock_image": True,
-    "background_color": "Black"
-}
-
-# --- Load settings from file ---
-def load_settings():
-    """Load settings from JSON file, return defaults if file doesn't exist"""
-    try:
-        # Check if file exists by trying to stat it
-        try:
-            os.stat(SETTINGS_FILE)
-            # File exists, try to read it
-            with open(SETTINGS_FILE, 'r') as f:
-                settings = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                for key in DEFAULT_SETTINGS:
-                    if key not in settings:
-                        settings[key] = DEFAULT_SETTINGS[key]
-                return settings
-        except OSError:
-            # File doesn't exist, return defaults
-            pass
-    except Exception as e:
-        print(f"Error loading settings: {e}")
-    return DEFAULT_SETTINGS.copy()
 
 # --- Display setup ---
-display = PicoGraphics(display=DISPLAY_TUFTY_2040, pen_type=PEN_RGB565)
+display = app_context.get_display(PEN_RGB565)
 WIDTH, HEIGHT = display.get_bounds()
 
+# Start queueing button events before the glyph atlases are built
+button_events.start()
+
 # List of available pen colours, add more if necessary
 RED = display.create_pen(209, 34, 41)
 ORANGE = display.create_pen(246, 138, 30)
@@ -81,135 +55,285 @@ COLOR_PENS = {
 }
 
 # --- Load current settings ---
-settings = load_settings()
-brightness = round(settings.get("brightness", 1.0), 1)
-selected_image = settings.get("selected_image", "")
-clock_image = settings.get("clock_image", True)
-background_color_name = settings.get("background_color", "Black")
+brightness = badge_settings.brightness()
+selected_image = badge_settings.get("selected_image")
+clock_image = badge_settings.get("clock_image")
+background_color_name = badge_settings.get("background_color")
 bg_colour = COLOR_PENS.get(background_color_name, BLACK)
 
 # Set brightness
 display.set_backlight(brightness)
 
-# --- Clear background ---
-display.set_pen(display.create_pen(0, 0, 0))  # Black
-display.clear()
-
-if clock_image:
-    png = pngdec.PNG(display)
-
-    # --- Try to display the image ---
-    try:  
-        png.open_file(f"/badge/{selected_image}")
-        png.decode(0, 0)
-        
-    except Exception as e:
-        print(f"Error loading image: {e}")
-        print("Make sure 'jam.png' (320x240 baseline PNG) is on the device.")
-        display.set_pen(bg_colour)
-        display.rectangle(0, 0, WIDTH, HEIGHT)
-else:
+# --- Render mode ---
+# "dirty" keeps the composed background and only repaints the characters that
+# changed since the last tick; "full" redraws the whole frame every second.
+RENDER_MODE = "dirty"
+
+# Sleep with machine.lightsleep() between ticks instead of time.sleep_ms().
+# Saves more power, but stops USB serial while asleep.
+USE_LIGHTSLEEP = False
+
+# Draw the digits from a pre-rendered glyph atlas (cached in ATLAS_DIR)
+# instead of rasterising every shadow and bold pass each tick.
+USE_GLYPH_ATLAS = True
+ATLAS_DIR = "/cache"
+
+BYTES_PER_PIXEL = 2  # PEN_RGB565
+
+# Offsets drawn on top of each other to make the text look bold
+TIME_BOLD = [(0, 0), (1, 0), (0, 1), (2, 0), (0, 2), (-1, 0), (0, -1), (-2, 0), (0, -2)]
+DATE_BOLD = [(0, 0), (1, 0), (0, 1), (-1, 0), (0, -1)]
+
+png = pngdec.PNG(display) if clock_image else None
+
+
+def draw_background() -> bool:
+    """Draw the clock background, return True if it came from the image"""
+    if clock_image:
+        try:
+            image_cache.draw_png(display, png, f"/badge/{selected_image}")
+            return True
+        except Exception as e:
+            print(f"Error loading image: {e}")
+            print(f"Make sure '{selected_image}' (320x240 baseline PNG) is in /badge, or is a flag in /flags.json.")
     display.set_pen(bg_colour)
     display.rectangle(0, 0, WIDTH, HEIGHT)
+    return False
+
+
+def draw_bold_text(text: str, x: int, y: int, scale: float, passes: list) -> None:
+    # Optional: drop shadow for readability
+    display.set_pen(BLACK)
+    display.text(text, x + 1, y + 1, scale=scale)
+
+    # Draw text multiple times for a bold effect
+    display.set_pen(GREY)
+    for dx, dy in passes:
+        display.text(text, x + dx, y + dy, scale=scale)
+
+
+char_widths = {}
+
+
+def char_width(char: str, scale: float) -> int:
+    key = (char, scale)
+    if key not in char_widths:
+        char_widths[key] = display.measure_text(char, scale)
+    return char_widths[key]
+
+
+class ClockLine:
+    """A line of clock text that repaints only the characters that changed"""
+
+    def __init__(self, x: int, y: int, scale: float, passes: list, template: str, atlas=None) -> None:
+        self.x = x
+        self.y = y
+        self.scale = scale
+        self.passes = passes
+        self.atlas = atlas
+        self.pad = bold_padding(passes)
+        self.top = max(0, int(y - GLYPH_ASCENT * scale) - self.pad)
+        self.bottom = min(HEIGHT, int(y + GLYPH_DESCENT * scale) + self.pad + 1)
+        # Widest the line can get, using the widest digit in every digit slot
+        widest = max(char_width(c, scale) for c in "0123456789")
+        width = sum(widest if c.isdigit() else char_width(c, scale) for c in template)
+        self.band_x = max(0, x - self.pad)
+        self.band_w = min(WIDTH, x + width + self.pad + 1) - self.band_x
+        self.band = None
+        self.text = ""
+        self.xs = [x]
+
+    def positions(self, text: str) -> list:
+        xs = [self.x]
+        for c in text:
+            xs.append(xs[-1] + char_width(c, self.scale))
+        return xs
+
+    def save_background(self) -> None:
+        """Copy the background under this line out of the framebuffer"""
+        fb = memoryview(display)
+        row_bytes = self.band_w * BYTES_PER_PIXEL
+        self.band = bytearray(row_bytes * (self.bottom - self.top))
+        for row in range(self.bottom - self.top):
+            src = ((self.top + row) * WIDTH + self.band_x) * BYTES_PER_PIXEL
+            self.band[row * row_bytes:(row + 1) * row_bytes] = fb[src:src + row_bytes]
+
+    def restore_background(self, x0: int, x1: int) -> None:
+        if self.band is None:
+            display.set_pen(bg_colour)
+            display.rectangle(x0, self.top, x1 - x0, self.bottom - self.top)
+            return
+        fb = memoryview(display)
+        band = memoryview(self.band)
+        row_bytes = self.band_w * BYTES_PER_PIXEL
+        offset = (x0 - self.band_x) * BYTES_PER_PIXEL
+        length = (x1 - x0) * BYTES_PER_PIXEL
+        for row in range(self.bottom - self.top):
+            dst = ((self.top + row) * WIDTH + x0) * BYTES_PER_PIXEL
+            src = row * row_bytes + offset
+            fb[dst:dst + length] = band[src:src + length]
+
+    def draw_text(self, text: str, x: int, x0: int = 0, x1: int = WIDTH) -> None:
+        if self.atlas is not None and self.atlas.has(text):
+            # The atlas writes the framebuffer directly, so it clips to x0..x1 itself
+            self.atlas.draw(display, text, x, self.y, x0, x1)
+        else:
+            draw_bold_text(text, x, self.y, self.scale, self.passes)
+
+    def draw(self, text: str) -> None:
+        self.draw_text(text, self.x)
+        self.text = text
+        self.xs = self.positions(text)
+
+    def update(self, text: str) -> int:
+        """Repaint the characters of `text` that differ from the last draw, return the box count"""
+        xs = self.positions(text)
+        old, old_xs = self.text, self.xs
+        n = len(text)
+        changed = [i >= len(old) or text[i] != old[i] or xs[i] != old_xs[i] for i in range(n)]
+        boxes = 0
+        i = 0
+        while i < n:
+            if not changed[i]:
+                i += 1
+                continue
+            j = i
+            while j + 1 < n and changed[j + 1]:
+                j += 1
+            # Cover the old and new glyph extents of the run, plus the bold padding
+            x0 = min(xs[i], old_xs[i] if i < len(old_xs) else xs[i]) - self.pad
+            x1 = max(xs[j + 1], old_xs[j + 1] if j + 1 < len(old_xs) else xs[j + 1]) + self.pad + 1
+            x0 = max(self.band_x, x0)
+            x1 = min(self.band_x + self.band_w, x1)
+            display.set_clip(x0, self.top, x1 - x0, self.bottom - self.top)
+            self.restore_background(x0, x1)
+            # Neighbouring glyphs' bold passes reach into the box, so redraw them too
+            a = max(0, i - 1)
+            b = min(n, j + 2)
+            self.draw_text(text[a:b], xs[a], x0, x1)
+            display.remove_clip()
+            boxes += 1
+            i = j + 1
+        self.text = text
+        self.xs = xs
+        return boxes
+
 
 print(time.localtime())
 
 last_second = None
 
 #vector.set_transform(None)
-button_a = Button(7, invert=False)
 
 # --- Draw centered "bold" text overlay ---
 try:
     display.set_font("sans")
+    font = "sans"
 except Exception:
     display.set_font("bitmap8")
+    font = "bitmap8"
 
-while True:
-    #t.reset()
-    t_start = time.ticks_ms()
-    year, month, day, hour, minute, second, _, _ = time.localtime()
-
-    if last_second == second:
-        continue
+scale = 2
+scale2 = 1
+text_x = (WIDTH - 270) // 2
+text_y = HEIGHT - 160  # 40px from bottom
+text2_x = (WIDTH - 200) // 2
+text2_y = HEIGHT - 80  # 40px from bottom
 
-    last_second = second
 
-    display.set_pen(0)
-    display.clear()
 
-    display.set_pen(GREY)
+def load_atlas(chars: str, scale: float, passes: list):
+    """Load the glyph atlas for this scale from flash, building it on first use"""
+    atlas = GlyphAtlas()
+    path = atlas_path(ATLAS_DIR, font, scale, passes, GREY, BLACK)
+    if atlas.load(path):
+        return atlas
+    try:
+        # Builds in the top-left corner of the framebuffer, before anything is composed
+        atlas.build(display, chars, scale, passes, GREY, BLACK, display.create_pen(255, 0, 255))
+    except MemoryError:
+        print("Not enough memory for the glyph atlas, using vector text")
+        return None
+    try:
+        try:
+            os.mkdir(ATLAS_DIR)
+        except OSError:
+            pass
+        atlas.save(path)
+    except OSError as e:
+        print(f"Error saving glyph atlas: {e}")
+    return atlas
 
-    text = f"{hour:02}:{minute:02}:{second:02}"
-    text2 = f"{day:02}/{month:02}/{year:04}"
-    scale = 2
-    scale2 = 1
-
-    # Measure text width to center it
-    text_width = display.measure_text(text, scale)
-    text_x = (WIDTH - 270) // 2
-    text_y = HEIGHT - 160  # 40px from bottom
-    
-    # Measure text2 width to center it
-    text2_width = display.measure_text(text2, scale2)
-    text2_x = (WIDTH - 200) // 2
-    text2_y = HEIGHT - 80  # 40px from bottom
-
-    # Create pens
-    WHITE = display.create_pen(255, 255, 255)
-    BLACK = display.create_pen(0, 0, 0)
-
-    # --- Try to display the image ---
-    if clock_image:
-        try:  
-            png.open_file(f"/badge/{selected_image}")
-            png.decode(0, 0)
-            
-        except Exception as e:
-            print(f"Error loading image: {e}")
-            print("Make sure 'jam.png' (320x240 baseline PNG) is on the device.")
-            display.set_pen(bg_colour)
-            display.rectangle(0, 0, WIDTH, HEIGHT)
-    else:
-        display.set_pen(bg_colour)
-        display.rectangle(0, 0, WIDTH, HEIGHT)
-    
-    # Optional: drop shadow for readability
-    display.set_pen(BLACK)
-    display.text(text2, text2_x + 1, text2_y + 1, scale=scale2)
 
-    # Draw text2 multiple times for a bold effect
-    display.set_pen(GREY)
-    for dx, dy in [(0, 0), (1, 0), (0, 1), (-1, 0), (0, -1)]:
-        display.text(text2, text2_x + dx, text2_y + dy, scale=scale2)
+time_atlas = load_atlas("0123456789:", scale, TIME_BOLD) if USE_GLYPH_ATLAS else None
+date_atlas = load_atlas("0123456789/", scale2, DATE_BOLD) if USE_GLYPH_ATLAS else None
 
-    # Optional: drop shadow for readability
-    display.set_pen(BLACK)
-    display.text(text, text_x + 1, text_y + 1, scale=scale)
+time_line = ClockLine(text_x, text_y, scale, TIME_BOLD, "00:00:00", time_atlas)
+date_line = ClockLine(text2_x, text2_y, scale2, DATE_BOLD, "00/00/0000", date_atlas)
+composed = False
 
-    # Draw text multiple times for a bold effect
-    display.set_pen(GREY)
-    for dx, dy in [(0, 0), (1, 0), (0, 1), (2, 0), (0, 2), (-1, 0), (0, -1), (-2, 0), (0, -2)]:
-        display.text(text, text_x + dx, text_y + dy, scale=scale)
-    
-    display.update()
-    mem = gc.mem_free()
-    gc.collect()
-    used = gc.mem_free() - mem
-
-    t_end = time.ticks_ms()
-    #print(f"Took {t_end - t_start}ms, mem free: {gc.mem_free()} {used}")
-    
-    if button_a.read():
-        # Wait for the button to be released
-        while button_a.is_pressed:
-            time.sleep(0.01)
-        break  # Exit the loop after importing
-
-# Alternative: If you want to completely restart, use machine.reset()
-# Uncomment these lines instead of __import__("main"):
-import machine
-machine.reset()
+# Time each tick's drawing, the full background redraws and the collection after each tick
+tick_section = profiler.section("clock tick")
+background_section = profiler.section("clock background")
+gc_section = profiler.section("clock gc")
 
+# A button event wakes the scheduler early, so the exit is handled between ticks
+scheduler = TickScheduler(use_lightsleep=USE_LIGHTSLEEP, wake=button_events.pending)
 
+while True:
+    year, month, day, hour, minute, second, _, _ = time.localtime()
 
+    if last_second != second:
+        scheduler.tick()
+        last_second = second
+
+        tick_section.begin()
+
+        text = f"{hour:02}:{minute:02}:{second:02}"
+        text2 = f"{day:02}/{month:02}/{year:04}"
+
+        if RENDER_MODE == "dirty" and composed:
+            date_line.update(text2)
+            time_line.update(text)
+        else:
+            background_section.begin()
+            from_image = draw_background()
+            background_section.end()
+            if RENDER_MODE == "dirty":
+                # Keep the background under both lines so later ticks can restore it
+                try:
+                    for line in (time_line, date_line):
+                        if from_image:
+                            line.save_background()
+                    composed = True
+                except MemoryError:
+                    print("Not enough memory for dirty rendering, redrawing every frame")
+                    time_line.band = date_line.band = None
+                    RENDER_MODE = "full"
+            date_line.draw(text2)
+            time_line.draw(text)
+
+        profiler.overlay(display, font)
+        display.update()
+        tick_section.end()
+
+        gc_section.begin()
+        mem_telemetry.collect()
+        gc_section.end()
+
+    event = button_events.poll()
+    if event is not None and event[0] == button_events.PRESS:
+        # Latency counts from the press the IRQ caught, not from when we looked
+        scheduler.input_handled(event[2])
+        if event[1] == "a":
+            break  # Exit the loop after importing
+
+    # Sleep until the next second is due (or button A is pressed)
+    scheduler.wait()
+
+print(f"Clock scheduler: {scheduler.stats()}")
+print(f"Button events: {button_events.stats}")
+profiler.dump()
+
+# Back to the launcher (or reset the badge when run on its own)
+app_context.finish()
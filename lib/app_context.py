@@ -0,0 +1,62 @@
+# Shared display and buttons for apps run by the launcher.
+#
+# main.py runs apps in-process: it imports the app's module with `warm` set,
+# and the import returns when the app's loop exits.  Apps get their display
+# and buttons from here instead of constructing their own, so the launcher
+# and every app share one framebuffer and one set of Button objects.
+#
+# An app ends with finish(): under the launcher that just returns, and the
+# launcher unloads the module; run on its own (e.g. from Thonny) it resets
+# the badge as the apps always used to.
+
+import gc
+from picographics import PicoGraphics, DISPLAY_TUFTY_2040
+from pimoroni import Button
+
+BUTTON_PINS = {"a": 7, "b": 8, "c": 9, "up": 22, "down": 6}
+
+# True while the launcher is running an app
+warm = False
+
+display = None
+pen_type = None
+# Bumped whenever the display is recreated, so cached pens can be checked
+generation = 0
+
+buttons = {}
+
+
+def get_display(pen: int):
+    """Return the shared display, recreating it only if `pen` differs"""
+    global display, pen_type, generation
+    if display is not None and pen_type == pen:
+        return display
+    # Free the old framebuffer first, there isn't room for two
+    display = None
+    gc.collect()
+    display = PicoGraphics(display=DISPLAY_TUFTY_2040, pen_type=pen)
+    pen_type = pen
+    generation += 1
+    return display
+
+
+def release_display() -> None:
+    """Free the framebuffer; the next get_display() makes a new one"""
+    global display, pen_type
+    display = None
+    pen_type = None
+    gc.collect()
+
+
+def button(name: str):
+    b = buttons.get(name)
+    if b is None:
+        b = buttons[name] = Button(BUTTON_PINS[name], invert=False)
+    return b
+
+
+def finish() -> None:
+    """End the app: return to the launcher, or reset when run standalone"""
+    if not warm:
+        import machine
+        machine.reset()
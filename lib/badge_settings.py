@@ -0,0 +1,314 @@
+# Shared settings for the Tufty 2040 badge apps.
+#
+# /settings.json is read and validated once per boot and kept in memory; as
+# the launcher runs apps in-process, later apps get the cached copy instead
+# of opening and parsing the file again.  DEFAULTS holds every key any app
+# uses, so callers never need their own fallbacks.
+#
+# Changing a value with set() updates the cache and calls any functions
+# registered with subscribe(key, fn).  Writes are deferred: poll() saves
+# once no change has been made for SAVE_DELAY_MS, and flush() saves any
+# pending change straight away (on leaving a page or the app), so a run of
+# button presses costs one flash write instead of one per press.  The file
+# is written to a temporary name and renamed over the old one, so a power
+# cut leaves either the old or the new settings, never a truncated file.
+#
+# The values are also kept, together with the badge text, in /settings.bin:
+# a fixed-layout record read with a single readinto() into a buffer
+# allocated once, so a boot doesn't need the JSON parser at all.
+#
+#   offset 0   b"BSET", version (B), flags (B), brightness in tenths (B),
+#              background colour index (B)
+#   offset 8   size and mtime (I each) of settings.json, then of
+#              badge_text.json, as they were when the record was written
+#   offset 24  three TEXT_SLOT-byte slots for selected_image, line_1 and
+#              line_2, each a length byte followed by UTF-8
+#
+# The JSON files stay the human-editable copies: when either one's size or
+# mtime differs from the record's copy it is migrated again, and save()
+# exports settings.json before rewriting the record.  Any difference counts,
+# not just a newer mtime, as the RTC starts again from its default after a
+# power cut and a later edit can carry an older time.  Keys outside
+# DEFAULTS aren't kept in the record, and while any text is too long for
+# its slot there is no record at all: boots read the JSON, which keeps the
+# text whole, rather than a record that would cut it short.
+
+import json
+import os
+import struct
+import time
+
+SETTINGS_FILE = "/settings.json"
+BADGE_TEXT_FILE = "/badge_text.json"
+STORE_FILE = "/settings.bin"
+
+# --- Default settings ---
+DEFAULTS = {
+    "brightness": 1.0,
+    "text_overlay": True,
+    "selected_image": "",
+    "badge_image": True,
+    "clock_image": True,
+    "background_color": "Black"
+}
+
+DEFAULT_BADGE_TEXT = {
+    "line_1": "Name",
+    "line_2": "Descriptor"
+}
+
+# --- Valid values ---
+MIN_BRIGHTNESS = 0.4
+MAX_BRIGHTNESS = 1.0
+BACKGROUND_COLORS = [
+    "Black", "White", "Red", "Orange", "Yellow", "Green",
+    "Blue", "Indigo", "Violet", "Pink", "Cyan", "Magenta", "Amethyst", "Grey"
+]
+
+# Save this long after the last change
+SAVE_DELAY_MS = 1500
+
+# --- Binary record layout ---
+MAGIC = b"BSET"
+VERSION = 2
+HEADER = "<4sBBBBIIII"
+HEADER_SIZE = 24
+SOURCES = "<IIII"  # (size, mtime) of each JSON file, inside HEADER
+SOURCES_OFFSET = 8
+TEXT_SLOT = 64
+TEXT_FIELDS = ("selected_image", "line_1", "line_2")
+RECORD_SIZE = HEADER_SIZE + TEXT_SLOT * len(TEXT_FIELDS)
+FLAGS = ("text_overlay", "badge_image", "clock_image")  # bit 0 upwards
+
+_record = bytearray(RECORD_SIZE)
+
+_settings = None
+_badge_text = None
+_listeners = []  # (key, fn) pairs, key None for every change
+_changed_at = None  # ticks_ms of the last unsaved change
+
+stats = {"loads": 0, "load_ms": 0, "migrations": 0, "changes": 0, "saves": 0, "bytes_written": 0, "last_save_ms": 0,
+         "max_save_ms": 0}
+
+
+def validate(key: str, value):
+    """Return `value` coerced to the type and range `key` allows, or its default"""
+    default = DEFAULTS.get(key, DEFAULT_BADGE_TEXT.get(key))
+    if default is None:
+        # Not a key we know about, keep it as it is
+        return value
+    try:
+        if key == "brightness":
+            return round(min(MAX_BRIGHTNESS, max(MIN_BRIGHTNESS, float(value))), 1)
+        if key == "background_color":
+            return value if value in BACKGROUND_COLORS else default
+        if isinstance(default, bool):
+            return bool(value)
+        if isinstance(default, str):
+            return value if isinstance(value, str) else default
+    except (TypeError, ValueError):
+        pass
+    return default
+
+
+def _source(path: str) -> tuple:
+    """(size, mtime) of `path`, or (0, 0) if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (0, 0)
+    return (st[6] & 0xFFFFFFFF, st[8] & 0xFFFFFFFF)
+
+
+def _sources() -> tuple:
+    return _source(SETTINGS_FILE) + _source(BADGE_TEXT_FILE)
+
+
+def record_is_current() -> bool:
+    """True if the record read into _record was written from the JSON files as they are now"""
+    return struct.unpack_from(SOURCES, _record, SOURCES_OFFSET) == _sources()
+
+
+def read_json(path: str, defaults: dict) -> dict:
+    values = defaults.copy()
+    try:
+        with open(path, "r") as f:
+            stored = json.load(f)
+        for key in stored:
+            values[key] = validate(key, stored[key])
+    except OSError:
+        # No file yet, use the defaults
+        pass
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+    return values
+
+
+def read_record():
+    """Decode settings.bin, return (settings, badge text) or None if it's unusable or stale"""
+    try:
+        with open(STORE_FILE, "rb") as f:
+            if f.readinto(_record) != RECORD_SIZE:
+                return None
+    except OSError:
+        return None
+    magic, version, flags, tenths, colour = struct.unpack_from(HEADER, _record)[:5]
+    if magic != MAGIC or version != VERSION or not record_is_current():
+        return None
+    settings = DEFAULTS.copy()
+    for bit, key in enumerate(FLAGS):
+        settings[key] = bool(flags & (1 << bit))
+    settings["brightness"] = validate("brightness", tenths / 10)
+    settings["background_color"] = BACKGROUND_COLORS[colour] if colour < len(BACKGROUND_COLORS) else DEFAULTS["background_color"]
+    texts = []
+    for i in range(len(TEXT_FIELDS)):
+        offset = HEADER_SIZE + i * TEXT_SLOT
+        length = min(_record[offset], TEXT_SLOT - 1)
+        texts.append(str(_record[offset + 1:offset + 1 + length], "utf-8"))
+    settings["selected_image"] = texts[0]
+    return settings, {"line_1": texts[1], "line_2": texts[2]}
+
+
+def _pack_text(offset: int, text: str) -> bool:
+    """Copy `text` into the slot at `offset`, return False if it doesn't fit"""
+    data = text.encode()
+    if len(data) > TEXT_SLOT - 1:
+        return False
+    _record[offset] = len(data)
+    _record[offset + 1:offset + 1 + len(data)] = data
+    return True
+
+
+def write_record(settings: dict, badge_text: dict) -> int:
+    """Write settings.bin, return the number of bytes written (0 if the text doesn't fit)"""
+    flags = 0
+    for bit, key in enumerate(FLAGS):
+        if settings[key]:
+            flags |= 1 << bit
+    colour = settings["background_color"]
+    colour = BACKGROUND_COLORS.index(colour) if colour in BACKGROUND_COLORS else 0
+    for i in range(RECORD_SIZE):
+        _record[i] = 0
+    struct.pack_into(HEADER, _record, 0, MAGIC, VERSION, flags, int(settings["brightness"] * 10 + 0.5), colour,
+                     *_sources())
+    texts = (settings["selected_image"], badge_text["line_1"], badge_text["line_2"])
+    for i, text in enumerate(texts):
+        if not _pack_text(HEADER_SIZE + i * TEXT_SLOT, text):
+            # Drop any older record too, so load() goes back to the JSON
+            try:
+                os.remove(STORE_FILE)
+            except OSError:
+                pass
+            return 0
+    tmp = STORE_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_record)
+    os.rename(tmp, STORE_FILE)
+    return RECORD_SIZE
+
+
+def load() -> dict:
+    """Return the settings, reading them from flash only the first time"""
+    global _settings, _badge_text
+    if _settings is not None:
+        return _settings
+    start = time.ticks_ms()
+    loaded = read_record()
+    if loaded is None:
+        # First boot, or the JSON was changed by hand: migrate it into the record
+        loaded = read_json(SETTINGS_FILE, DEFAULTS), read_json(BADGE_TEXT_FILE, DEFAULT_BADGE_TEXT)
+        try:
+            if write_record(*loaded):
+                stats["migrations"] += 1
+        except OSError as e:
+            print(f"Error writing settings record: {e}")
+    _settings, _badge_text = loaded
+    stats["loads"] += 1
+    stats["load_ms"] = time.ticks_diff(time.ticks_ms(), start)
+    return _settings
+
+
+def badge_text() -> dict:
+    load()
+    return _badge_text
+
+
+def reload() -> dict:
+    """Drop the cached copy and read the files again"""
+    global _settings, _badge_text
+    _settings = _badge_text = None
+    return load()
+
+
+def get(key: str):
+    return load()[key]
+
+
+def brightness() -> float:
+    return load()["brightness"]
+
+
+def set(key: str, value) -> bool:
+    """Change a setting in memory, return True if it changed"""
+    global _changed_at
+    settings = load()
+    value = validate(key, value)
+    if settings.get(key) == value:
+        return False
+    settings[key] = value
+    _changed_at = time.ticks_ms()
+    stats["changes"] += 1
+    for listen_key, fn in _listeners:
+        if listen_key is None or listen_key == key:
+            fn(key, value)
+    return True
+
+
+def subscribe(key, fn) -> None:
+    """Call fn(key, value) when `key` changes (every key if None)"""
+    _listeners.append((key, fn))
+
+
+def unsubscribe(fn) -> None:
+    """Remove every subscription for `fn`; apps must do this before exiting"""
+    _listeners[:] = [entry for entry in _listeners if entry[1] is not fn]
+
+
+def dirty() -> bool:
+    return _changed_at is not None
+
+
+def save() -> bool:
+    """Write the settings out now: settings.json first, then the record"""
+    global _changed_at
+    start = time.ticks_ms()
+    tmp = SETTINGS_FILE + ".tmp"
+    try:
+        data = json.dumps(load())
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.rename(tmp, SETTINGS_FILE)
+        # Written last, so the record is never older than the JSON it came from
+        written = len(data) + write_record(_settings, _badge_text)
+    except Exception as e:
+        print(f"Error saving settings: {e}")
+        return False
+    _changed_at = None
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    stats["saves"] += 1
+    stats["bytes_written"] += written
+    stats["last_save_ms"] = elapsed
+    stats["max_save_ms"] = max(stats["max_save_ms"], elapsed)
+    return True
+
+
+def flush() -> bool:
+    """Save any pending change, return True if something was written"""
+    return dirty() and save()
+
+
+def poll() -> bool:
+    """Save once the settings have been left alone for SAVE_DELAY_MS"""
+    if _changed_at is None or time.ticks_diff(time.ticks_ms(), _changed_at) < SAVE_DELAY_MS:
+        return False
+    return save()
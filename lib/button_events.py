@@ -0,0 +1,186 @@
+# Button events for the Tufty 2040 badge, caught by pin IRQ.
+#
+# Polling pimoroni.Button once per loop misses a press made during a long
+# draw, and waiting in `while button.is_pressed` for the release stops the
+# app drawing anything while a button is held.  Here every button pin has
+# an IRQ instead: the handler debounces the edge and records a PRESS or
+# RELEASE, with the ticks_ms it happened at, in a fixed-size ring buffer.
+# The app takes events off with poll() whenever it's ready, and never has
+# to wait for a release.
+#
+# The IRQs are hard: a soft IRQ only runs once the VM gets back to
+# bytecode, after png.decode() or display.update() has returned, by which
+# time a short press has already been released and reading the pin gives
+# nothing.  A hard handler runs at the edge itself, so it mustn't allocate:
+# it only touches the preallocated arrays, small ints and existing globals.
+#
+# A button held for LONG_MS gives one LONG event, then a REPEAT every
+# REPEAT_MS, like pimoroni.Button.read().  Those are made by poll() from
+# the time of the press, so they carry the time they were due rather than
+# the time the app got round to looking.
+#
+# The launcher and every app share the one queue: call start() before
+# reading events (it's harmless to call it again), and use pressed() for
+# the usual "which button was just pressed" question.  If the queue fills
+# up, new events are dropped and counted in stats["dropped"].
+
+import time
+import machine
+from array import array
+import app_context
+
+# --- Event kinds ---
+PRESS = 1
+RELEASE = 2
+LONG = 3
+REPEAT = 4
+
+# --- Timing ---
+DEBOUNCE_MS = 20   # ignore edges this soon after the last accepted one
+LONG_MS = 1000     # hold this long for a LONG event
+REPEAT_MS = 200    # then a REPEAT this often
+
+QUEUE_SIZE = 16
+
+NAMES = tuple(app_context.BUTTON_PINS)
+
+_pins = []
+_held = bytearray(len(NAMES))  # debounced state of each button
+_changed_at = array("L", [0] * len(NAMES))  # ticks_ms of the last accepted edge
+_hold_due = array("L", [0] * len(NAMES))  # ticks_ms the next LONG/REPEAT is due
+_holds = bytearray(len(NAMES))  # LONG/REPEAT events sent for the current press
+
+# --- Ring buffer ---
+_kinds = bytearray(QUEUE_SIZE)
+_buttons = bytearray(QUEUE_SIZE)
+_times = array("L", [0] * QUEUE_SIZE)
+_head = 0
+_count = 0
+
+stats = {"events": 0, "dropped": 0, "bounces": 0, "max_latency_ms": 0}
+
+
+def _push(kind: int, button: int, at: int) -> None:
+    global _count
+    if _count == QUEUE_SIZE:
+        stats["dropped"] += 1
+        return
+    slot = (_head + _count) % QUEUE_SIZE
+    _kinds[slot] = kind
+    _buttons[slot] = button
+    _times[slot] = at
+    _count += 1
+    stats["events"] += 1
+
+
+def _accept(button: int, state: int, now: int) -> None:
+    _held[button] = state
+    _changed_at[button] = now
+    if state:
+        _holds[button] = 0
+        _hold_due[button] = time.ticks_add(now, LONG_MS)
+    _push(PRESS if state else RELEASE, button, now)
+
+
+def _on_edge(button: int) -> None:
+    now = time.ticks_ms()
+    state = _pins[button].value()
+    if state == _held[button]:
+        return
+    if time.ticks_diff(now, _changed_at[button]) < DEBOUNCE_MS:
+        # Contact bounce; poll() picks up the final state if it settles changed
+        stats["bounces"] += 1
+        return
+    _accept(button, state, now)
+
+
+def start() -> None:
+    """Register the button IRQs, if they aren't already"""
+    if _pins:
+        return
+    now = time.ticks_ms()
+    for i, name in enumerate(NAMES):
+        p = machine.Pin(app_context.BUTTON_PINS[name], machine.Pin.IN, machine.Pin.PULL_DOWN)
+        _held[i] = p.value()
+        _changed_at[i] = now
+        _hold_due[i] = time.ticks_add(now, LONG_MS)
+        _holds[i] = 0
+        _pins.append(p)
+    for i, p in enumerate(_pins):
+        p.irq(lambda p, i=i: _on_edge(i), machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING, hard=True)
+
+
+def stop() -> None:
+    global _pins
+    for p in _pins:
+        p.irq(None)
+    _pins = []
+    clear()
+
+
+def clear() -> None:
+    """Drop any events that haven't been read"""
+    global _head, _count
+    irq = machine.disable_irq()
+    _head = 0
+    _count = 0
+    machine.enable_irq(irq)
+
+
+def _check_held(now: int) -> None:
+    """Catch a debounced edge the IRQ ignored, and make the LONG/REPEAT events that are due"""
+    for i, p in enumerate(_pins):
+        state = p.value()
+        if state != _held[i] and time.ticks_diff(now, _changed_at[i]) >= DEBOUNCE_MS:
+            irq = machine.disable_irq()
+            _accept(i, state, now)
+            machine.enable_irq(irq)
+        if _held[i] and time.ticks_diff(now, _hold_due[i]) >= 0:
+            irq = machine.disable_irq()
+            _push(REPEAT if _holds[i] else LONG, i, _hold_due[i])
+            machine.enable_irq(irq)
+            _holds[i] = min(_holds[i] + 1, 255)
+            _hold_due[i] = time.ticks_add(_hold_due[i], REPEAT_MS)
+
+
+def pending() -> bool:
+    return _count > 0
+
+
+def poll():
+    """Return the oldest event as (kind, button name, ticks_ms), or None straight away"""
+    global _head, _count
+    now = time.ticks_ms()
+    _check_held(now)
+    if not _count:
+        return None
+    irq = machine.disable_irq()
+    kind = _kinds[_head]
+    button = _buttons[_head]
+    at = _times[_head]
+    _head = (_head + 1) % QUEUE_SIZE
+    _count -= 1
+    machine.enable_irq(irq)
+    latency = time.ticks_diff(now, at)
+    if latency > stats["max_latency_ms"]:
+        stats["max_latency_ms"] = latency
+    return (kind, NAMES[button], at)
+
+
+def pressed(repeat: tuple = ("up", "down")):
+    """Return the name of the next button pressed, or None if there isn't one.
+
+    Buttons in `repeat` also count each REPEAT while held; releases and
+    other hold events are skipped.
+    """
+    while True:
+        event = poll()
+        if event is None:
+            return None
+        kind, name, _ = event
+        if kind == PRESS or (kind == REPEAT and name in repeat):
+            return name
+
+
+def is_held(name: str) -> bool:
+    return _held[NAMES.index(name)] == 1
@@ -0,0 +1,108 @@
+# Flags drawn from a description instead of an image, for the Tufty 2040 badge.
+#
+# Striped flags are a handful of flat colours, so rather than decoding a
+# PNG they are described in /flags.json and drawn with rectangle() and
+# triangle() at whatever size is asked for:
+#
+#   {"name": "Bi", "stripes": [[214, 2, 112], [155, 79, 150], [0, 56, 168]],
+#    "weights": [2, 1, 2]}
+#
+# "stripes" lists the colours top to bottom (left to right with
+# "vertical": true), and "weights" gives their relative sizes (all equal if
+# left out).  "chevron" lists the colours of arrow-shaped bands pointing in
+# from the hoist, outermost first, each "band" times the flag's height wide,
+# as on the Progress flag.
+#
+# Each flag shows up next to the images in /badge as "<name>.flag", so it
+# can be picked wherever an image can; image_cache.draw_png() draws it with
+# draw_named().  Nothing is stored per flag apart from its description.
+
+import json
+
+FLAGS_FILE = "/flags.json"
+EXTENSION = ".flag"
+
+# Chevron band width as a fraction of the flag's height, if not given
+DEFAULT_BAND = 0.125
+
+_flags = None
+
+
+def load_flags() -> list:
+    """Return the flag descriptions, reading /flags.json only the first time"""
+    global _flags
+    if _flags is None:
+        try:
+            with open(FLAGS_FILE, "r") as f:
+                _flags = json.load(f)["flags"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading flags: {e}")
+            _flags = []
+    return _flags
+
+
+def is_flag(path: str) -> bool:
+    return path.lower().endswith(EXTENSION)
+
+
+def names() -> list:
+    """Return "<name>.flag" for every flag, sorted, to list alongside the images"""
+    return sorted(flag["name"] + EXTENSION for flag in load_flags())
+
+
+def find(name: str):
+    """Return the flag called `name` (with or without a directory and ".flag"), or None"""
+    name = name[name.rfind("/") + 1:]
+    if is_flag(name):
+        name = name[:-len(EXTENSION)]
+    for flag in load_flags():
+        if flag["name"] == name:
+            return flag
+    return None
+
+
+def draw(display, flag: dict, x: int = 0, y: int = 0, w: int = 0, h: int = 0) -> None:
+    """Draw `flag` filling the w x h box at (x, y), the whole screen if w or h is 0"""
+    if not w or not h:
+        w, h = display.get_bounds()
+    colours = flag.get("stripes", [])
+    weights = flag.get("weights") or [1] * len(colours)
+    vertical = flag.get("vertical", False)
+    total = sum(weights)
+    length = w if vertical else h
+
+    # Stripe edges are rounded from the running total, so they meet exactly at any size
+    done = 0
+    start = 0
+    for colour, weight in zip(colours, weights):
+        done += weight
+        end = done * length // total
+        display.set_pen(display.create_pen(*colour))
+        if vertical:
+            display.rectangle(x + start, y, end - start, h)
+        else:
+            display.rectangle(x, y + start, w, end - start)
+        start = end
+
+    chevron = flag.get("chevron")
+    if chevron:
+        # Each band is everything left of a 45 degree arrow with its tip on
+        # the middle line, drawn outermost first so the next one covers it;
+        # the innermost tip is h/2 in, so no arrow reaches left of x
+        band = int(flag.get("band", DEFAULT_BAND) * h)
+        middle = y + h // 2
+        for i, colour in enumerate(chevron):
+            tip = x + h // 2 + (len(chevron) - 1 - i) * band
+            display.set_pen(display.create_pen(*colour))
+            base = tip - h // 2
+            if base > x:
+                display.rectangle(x, y, base - x, h)
+            display.triangle(tip, middle, base, y, base, y + h - 1)
+
+
+def draw_named(display, path: str, x: int = 0, y: int = 0) -> None:
+    """Draw the flag named by `path` full screen at (x, y); OSError if there's no such flag"""
+    flag = find(path)
+    if flag is None:
+        raise OSError(f"no flag called '{path}' in {FLAGS_FILE}")
+    draw(display, flag, x, y)
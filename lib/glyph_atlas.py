@@ -0,0 +1,164 @@
+# Pre-rendered glyph atlas for the Tufty 2040 badge.
+#
+# Each character is rasterised once with its drop shadow and bold passes
+# baked in, then stored as runs of opaque RGB565 pixels.  Drawing a string
+# afterwards is one slice copy into the framebuffer per run, instead of
+# re-rasterising the Hershey glyph for every shadow and bold pass.
+#
+# Atlas file layout (all little-endian):
+#   b"GLYA", version (B), glyph count (B)
+#   per glyph: char (B), advance (H), left (h), top (h), runs (H), pixel bytes (H),
+#              runs as (row, column, length) bytes, then the run pixels in order
+
+import struct
+
+WIDTH, HEIGHT = 320, 240
+BYTES_PER_PIXEL = 2  # PEN_RGB565
+
+# How far the Hershey glyphs reach above and below the text y, at scale 1
+GLYPH_ASCENT = 13
+GLYPH_DESCENT = 10
+
+MAGIC = b"GLYA"
+VERSION = 1
+
+
+def bold_padding(passes: list) -> int:
+    # Bold passes spread the glyphs out, and the shadow adds one more pixel
+    return max(max(abs(dx), abs(dy)) for dx, dy in passes) + 1
+
+
+class GlyphAtlas:
+    def __init__(self) -> None:
+        # char -> (advance, left, top, runs, pixels) where left/top place the
+        # cell relative to the pen position that display.text() would use
+        self.glyphs = {}
+
+    def advance(self, char: str) -> int:
+        return self.glyphs[char][0]
+
+    def has(self, text: str) -> bool:
+        for c in text:
+            if c not in self.glyphs:
+                return False
+        return True
+
+    def build(self, display, chars: str, scale: float, passes: list, fill_pen: int, shadow_pen: int,
+              key_pen: int) -> None:
+        """Rasterise `chars` in the current font, using the top-left of the framebuffer as scratch.
+
+        `key_pen` must differ from both text pens; the scratch area is left
+        dirty, so build before composing the screen.
+        """
+        pad = bold_padding(passes)
+        ascent = int(GLYPH_ASCENT * scale)
+        cell_h = ascent + int(GLYPH_DESCENT * scale) + 2 * pad + 1
+        fb = memoryview(display)
+        for char in chars:
+            advance = display.measure_text(char, scale)
+            cell_w = min(WIDTH, advance + 2 * pad + 3)
+            ox, oy = pad + 1, pad + ascent
+
+            display.set_clip(0, 0, cell_w, cell_h)
+            display.set_pen(key_pen)
+            display.rectangle(0, 0, cell_w, cell_h)
+            # Read the key back rather than packing the pen, pen values are
+            # byte-swapped relative to the framebuffer on some builds
+            key = bytes(fb[0:BYTES_PER_PIXEL])
+            display.set_pen(shadow_pen)
+            display.text(char, ox + 1, oy + 1, scale=scale)
+            display.set_pen(fill_pen)
+            for dx, dy in passes:
+                display.text(char, ox + dx, oy + dy, scale=scale)
+            display.remove_clip()
+
+            runs = bytearray()
+            pixels = bytearray()
+            for row in range(cell_h):
+                base = row * WIDTH * BYTES_PER_PIXEL
+                col = 0
+                while col < cell_w:
+                    i = base + col * BYTES_PER_PIXEL
+                    if fb[i] == key[0] and fb[i + 1] == key[1]:
+                        col += 1
+                        continue
+                    start = col
+                    while col < cell_w and col - start < 255:
+                        i = base + col * BYTES_PER_PIXEL
+                        if fb[i] == key[0] and fb[i + 1] == key[1]:
+                            break
+                        col += 1
+                    runs.extend(bytes((row, start, col - start)))
+                    pixels.extend(fb[base + start * BYTES_PER_PIXEL:base + col * BYTES_PER_PIXEL])
+            self.glyphs[char] = (advance, -ox, -oy, memoryview(bytes(runs)), memoryview(bytes(pixels)))
+
+    def draw(self, display, text: str, x: int, y: int, x0: int = 0, x1: int = WIDTH) -> int:
+        """Blit `text` with its pen position at (x, y), return the x after the last glyph.
+
+        The copies bypass the display's clip, so only columns x0 to x1 (exclusive)
+        are written; runs crossing either edge are trimmed.
+        """
+        fb = memoryview(display)
+        x0 = max(0, x0)
+        x1 = min(WIDTH, x1)
+        for char in text:
+            advance, left, top, runs, pixels = self.glyphs[char]
+            cx = x + left
+            cy = y + top
+            p = 0
+            for i in range(0, len(runs), 3):
+                row = cy + runs[i]
+                length = runs[i + 2] * BYTES_PER_PIXEL
+                col = cx + runs[i + 1]
+                if 0 <= row < HEIGHT:
+                    c0 = col if col > x0 else x0
+                    c1 = col + runs[i + 2]
+                    if c1 > x1:
+                        c1 = x1
+                    if c0 < c1:
+                        dst = (row * WIDTH + c0) * BYTES_PER_PIXEL
+                        src = p + (c0 - col) * BYTES_PER_PIXEL
+                        n = (c1 - c0) * BYTES_PER_PIXEL
+                        fb[dst:dst + n] = pixels[src:src + n]
+                p += length
+            x += advance
+        return x
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(MAGIC + bytes((VERSION, len(self.glyphs))))
+            for char, (advance, left, top, runs, pixels) in self.glyphs.items():
+                f.write(struct.pack("<BHhhHH", ord(char), advance, left, top, len(runs) // 3, len(pixels)))
+                f.write(runs)
+                f.write(pixels)
+
+    def load(self, path: str) -> bool:
+        """Load an atlas written by save(), return False if it's missing or invalid"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+        if len(data) < 6 or data[:4] != MAGIC or data[4] != VERSION:
+            return False
+        data = memoryview(data)
+        pos = 6
+        glyphs = {}
+        for _ in range(data[5]):
+            code, advance, left, top, nruns, npixels = struct.unpack_from("<BHhhHH", data, pos)
+            pos += 11
+            runs = data[pos:pos + nruns * 3]
+            pos += nruns * 3
+            pixels = data[pos:pos + npixels]
+            pos += npixels
+            glyphs[chr(code)] = (advance, left, top, runs, pixels)
+        if pos != len(data):
+            return False
+        self.glyphs = glyphs
+        return True
+
+
+def atlas_path(directory: str, font: str, scale: float, passes: list, fill_pen: int, shadow_pen: int) -> str:
+    """File name that changes whenever anything baked into the atlas does"""
+    signature = sum((i + 1) * (dx * 7 + dy * 13) for i, (dx, dy) in enumerate(passes)) & 0xFFFF
+    return f"{directory}/atlas_{font}_{int(scale * 10)}_{len(passes)}_{signature:04x}_{fill_pen:04x}_{shadow_pen:04x}.bin"
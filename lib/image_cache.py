@@ -0,0 +1,252 @@
+# Pre-decoded image cache for the Tufty 2040 badge.
+#
+# The first time a full-screen PNG is shown, the decoded framebuffer is
+# written to /cache as a raw sidecar (153,600 bytes for PEN_RGB565, 76,800
+# for PEN_RGB332).  Later displays read that file straight into the display
+# buffer with readinto, skipping pngdec's inflate and filter work.
+#
+# Run-length images (".rle", see rle_image.py) and flags (".flag", see
+# flags.py) are quicker to draw than to load, so they are drawn directly and
+# never cached.
+#
+# Sidecars are named after the source path, its size and its mtime, so
+# replacing an image on the badge invalidates its old entry.  The cache is
+# kept under CACHE_BUDGET bytes by removing the oldest sidecars first.
+# Other files in /cache (glyph atlases, the thumbnail index, a half-written
+# .tmp) don't follow the sidecar naming, so they aren't counted or evicted.
+
+import os
+
+CACHE_DIR = "/cache"
+
+# --- Flash budget for sidecar files, in bytes ---
+CACHE_BUDGET = 1024 * 1024
+
+# Always leave this much flash free for settings and other apps
+FLASH_RESERVE = 64 * 1024
+
+WIDTH, HEIGHT = 320, 240
+
+# PNG colour types with an alpha channel; their decoded result depends on
+# whatever was underneath, so they are never cached
+ALPHA_COLOUR_TYPES = (4, 6)
+
+stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "skipped": 0, "prefetches": 0}
+
+
+def set_budget(budget: int) -> None:
+    """Change the flash budget and evict down to it"""
+    global CACHE_BUDGET
+    CACHE_BUDGET = budget
+    evict(0)
+
+
+def format_name(display) -> str:
+    bpp = len(memoryview(display)) // (WIDTH * HEIGHT)
+    return "rgb565" if bpp == 2 else "rgb332" if bpp == 1 else f"{bpp * 8}bpp"
+
+
+def cache_path(path: str, display) -> str:
+    """Return the sidecar path for `path`, or None if it can't be stat'ed"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    name = path.lstrip("/").replace("/", "_")
+    if name.lower().endswith(".png"):
+        name = name[:-4]
+    return f"{CACHE_DIR}/{name}_{st[6]}_{st[8]}.{format_name(display)}"
+
+
+def is_sidecar(name: str) -> bool:
+    """True if `name` looks like a sidecar: <source>_<size>_<mtime>.rgb565 or .rgb332"""
+    stem, dot, ext = name.rpartition(".")
+    if not dot or ext not in ("rgb565", "rgb332"):
+        return False
+    parts = stem.rsplit("_", 2)
+    return len(parts) == 3 and parts[0] != "" and parts[1].isdigit() and parts[2].isdigit()
+
+
+def list_entries() -> list:
+    """Return [(mtime, size, path)] for every sidecar, oldest first"""
+    entries = []
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return entries
+    for name in names:
+        if not is_sidecar(name):
+            continue
+        path = f"{CACHE_DIR}/{name}"
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st[8], st[6], path))
+    entries.sort()
+    return entries
+
+
+def evict(needed: int) -> bool:
+    """Remove the oldest sidecars until `needed` more bytes fit in the budget"""
+    if needed > CACHE_BUDGET:
+        return False
+    entries = list_entries()
+    used = sum(size for _, size, _ in entries)
+    while entries and used + needed > CACHE_BUDGET:
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+            stats["evictions"] += 1
+        except OSError:
+            pass
+        used -= size
+    return used + needed <= CACHE_BUDGET
+
+
+def flash_free() -> int:
+    try:
+        st = os.statvfs("/")
+        return st[0] * st[4]
+    except (OSError, AttributeError):
+        return 0
+
+
+def remove_stale(path: str, keep: str) -> None:
+    """Drop older sidecars of the same source, e.g. after the PNG was replaced"""
+    prefix = keep[len(CACHE_DIR) + 1:].rsplit("_", 2)[0] + "_"
+    ext = keep[keep.rfind("."):]
+    for _, _, entry in list_entries():
+        name = entry[len(CACHE_DIR) + 1:]
+        if entry != keep and name.startswith(prefix) and name.endswith(ext) and name[len(prefix):].count("_") == 1:
+            try:
+                os.remove(entry)
+                stats["evictions"] += 1
+            except OSError:
+                pass
+
+
+def is_cacheable(path: str, png) -> bool:
+    if png.get_width() != WIDTH or png.get_height() != HEIGHT:
+        return False
+    try:
+        with open(path, "rb") as f:
+            header = f.read(26)
+    except OSError:
+        return False
+    return len(header) == 26 and header[25] not in ALPHA_COLOUR_TYPES
+
+
+def store(path: str, display, sidecar: str) -> bool:
+    """Write the current framebuffer out as the sidecar for `path`"""
+    fb = memoryview(display)
+    if len(fb) + FLASH_RESERVE > flash_free() + sum(size for _, size, _ in list_entries()):
+        return False
+    if not evict(len(fb)):
+        return False
+    try:
+        os.mkdir(CACHE_DIR)
+    except OSError:
+        pass
+    # Write to a temporary name first so a power cut can't leave a short file
+    tmp = sidecar + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(fb)
+        os.rename(tmp, sidecar)
+    except OSError as e:
+        print(f"Error writing image cache: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+    stats["writes"] += 1
+    remove_stale(path, sidecar)
+    return True
+
+
+def load(display, sidecar: str) -> bool:
+    """Read a sidecar straight into the display buffer"""
+    fb = memoryview(display)
+    try:
+        if os.stat(sidecar)[6] != len(fb):
+            os.remove(sidecar)
+            return False
+        with open(sidecar, "rb") as f:
+            return f.readinto(fb) == len(fb)
+    except OSError:
+        return False
+
+
+def is_cached(display, path: str) -> bool:
+    """True if `path` has a sidecar for this display's pen format"""
+    sidecar = cache_path(path, display)
+    try:
+        return sidecar is not None and os.stat(sidecar)[6] == len(memoryview(display))
+    except OSError:
+        return False
+
+
+def prefetch(display, png, path: str) -> bool:
+    """Decode `path` and store its sidecar without showing it.
+
+    The decode goes through the framebuffer, so only call this once the
+    current frame has been sent with display.update() and will be redrawn
+    in full before the next one.  Returns True if `path` is now cached.
+    """
+    if is_cached(display, path):
+        return True
+    if path.lower().endswith((".rle", ".flag")):
+        # Quicker to draw than to load from the cache
+        return False
+    sidecar = cache_path(path, display)
+    if sidecar is None:
+        return False
+    png.open_file(path)
+    png.decode(0, 0)
+    stats["prefetches"] += 1
+    if not is_cacheable(path, png):
+        stats["skipped"] += 1
+        return False
+    return store(path, display, sidecar)
+
+
+def draw_png(display, png, path: str, x: int = 0, y: int = 0) -> bool:
+    """Draw `path` at (x, y), from the raw cache when possible.
+
+    Returns True on a cache hit.  Raises the same exceptions as
+    png.open_file()/png.decode() when the image has to be decoded.  Paths
+    ending in ".rle" are drawn by rle_image instead of `png`, and ".flag"
+    paths by flags.
+    """
+    if path.lower().endswith(".flag"):
+        # A few fills from the description in /flags.json, no file to read
+        import flags
+        flags.draw_named(display, path, x, y)
+        stats["skipped"] += 1
+        return False
+
+    if path.lower().endswith(".rle"):
+        # Filling the runs is quicker than reading a 150 KB sidecar, so these
+        # are never cached (imported here so PNG-only apps don't compile it)
+        import rle_image
+        image = rle_image.RLE(display)
+        image.open_file(path)
+        image.decode(x, y)
+        stats["skipped"] += 1
+        return False
+
+    sidecar = cache_path(path, display) if x == 0 and y == 0 else None
+    if sidecar and load(display, sidecar):
+        stats["hits"] += 1
+        return True
+
+    png.open_file(path)
+    png.decode(x, y)
+    stats["misses"] += 1
+    if sidecar and is_cacheable(path, png):
+        store(path, display, sidecar)
+    else:
+        stats["skipped"] += 1
+    return False
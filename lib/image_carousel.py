@@ -0,0 +1,99 @@
+# Up/down image browsing for the Tufty 2040 badge, with the neighbours ready.
+#
+# Stepping to an image that has to be decoded stalls for a PNG decode.  A
+# Carousel keeps the images either side of the current one pre-decoded in
+# the raw image cache (see image_cache.py), so a step is a single flash read
+# straight into the framebuffer.  There's no room in RAM for a second
+# 150 KB frame, so the neighbours are decoded through the framebuffer once
+# the current image is on the panel, which keeps showing it until the next
+# display.update().
+#
+# The app passes up/down presses from button_events to step(), with the
+# time of the press, so one made while a neighbour is being decoded is
+# handled straight afterwards rather than missed.  The latency of each step
+# is measured from the press to the frame being sent.
+#
+# Call refill() from the app's loop when there's no input to handle:
+# refill() decodes at most one neighbour per call, and only once the buttons
+# have been left alone for IDLE_MS.  Images that can't be cached (with
+# alpha, or not 320x240) are skipped.
+
+import time
+import image_cache
+
+# Wait this long after a step before decoding, so a run of presses isn't held up
+IDLE_MS = 300
+
+# How many step latencies to keep for stats()
+MAX_SAMPLES = 32
+
+
+class Carousel:
+    """Steps through `paths`, drawing each with show(path), neighbours prefetched"""
+
+    def __init__(self, display, png, paths: list, index: int, show) -> None:
+        self.display = display
+        self.png = png
+        self.paths = paths
+        self.index = index
+        self.show = show
+        self.pending = []  # neighbours still to prefetch, nearest first
+        self.uncacheable = set()
+        self.stepped_at = time.ticks_ms()
+
+        # --- Benchmark counters ---
+        self.latencies = []  # ms from the press to the frame being sent, newest last
+        self.steps = 0
+        self.cached_steps = 0
+
+    def current(self) -> str:
+        return self.paths[self.index]
+
+    def show_current(self) -> None:
+        """Draw the current image and queue its neighbours for prefetching"""
+        self.show(self.current())
+        self.stepped_at = time.ticks_ms()
+        count = len(self.paths)
+        self.pending = []
+        for delta in (1, -1):  # down is pressed more often than up
+            path = self.paths[(self.index + delta) % count]
+            if path != self.current() and path not in self.pending and path not in self.uncacheable:
+                self.pending.append(path)
+
+    def step(self, delta: int, pressed_at: int) -> None:
+        """Move `delta` images on and show it; `pressed_at` is the ticks_ms of the press"""
+        hits = image_cache.stats["hits"]
+        self.index = (self.index + delta) % len(self.paths)
+        self.show_current()
+
+        latency = time.ticks_diff(time.ticks_ms(), pressed_at)
+        self.steps += 1
+        if image_cache.stats["hits"] > hits:
+            self.cached_steps += 1
+        self.latencies.append(latency)
+        if len(self.latencies) > MAX_SAMPLES:
+            self.latencies.pop(0)
+
+    def refill(self) -> bool:
+        """Prefetch one neighbour if the buttons have been idle; True if it did"""
+        if not self.pending or time.ticks_diff(time.ticks_ms(), self.stepped_at) < IDLE_MS:
+            return False
+        path = self.pending.pop(0)
+        try:
+            if not image_cache.prefetch(self.display, self.png, path):
+                self.uncacheable.add(path)
+        except Exception as e:
+            print(f"Error prefetching '{path}': {e}")
+            self.uncacheable.add(path)
+        return True
+
+    def stats(self) -> dict:
+        latencies = self.latencies
+        return {
+            "steps": self.steps,
+            "cached_steps": self.cached_steps,
+            "last_ms": latencies[-1] if latencies else None,
+            "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "max_ms": max(latencies) if latencies else None,
+            "prefetched": image_cache.stats["prefetches"],
+        }
@@ -0,0 +1,195 @@
+# Per-app heap telemetry for the Tufty 2040 badge.
+#
+# The launcher brackets every app it runs:
+#
+#   mem_telemetry.begin("clock")
+#   ... the app runs ...
+#   mem_telemetry.end()
+#
+# While the app runs, sample() (called once per frame, after
+# display.update()) keeps the high-water mark of gc.mem_alloc(), and
+# collect() runs gc.collect() and times the pause.  Neither allocates.
+#
+# end() frees the shared framebuffer (the launcher's next get_display()
+# makes a new one anyway, as no app shares the menu's pen format), collects,
+# and finds the largest free block by trial allocation.  If it is smaller
+# than FRAMEBUFFER_BYTES, the fragments the app left behind would make the
+# next RGB565 framebuffer allocation fail, and the app is flagged.
+#
+# Each launch appends one line to LOG_FILE:
+#
+#   app,peak_alloc,free,largest_block,gc_count,gc_max_us,ok
+#
+# Once the file passes MAX_LOG_BYTES the oldest half is dropped.  report()
+# sums the log up per app across launches.
+
+import gc
+import os
+import time
+import app_context
+
+LOG_FILE = "/memlog.csv"
+MAX_LOG_BYTES = 8 * 1024
+
+# The largest framebuffer an app asks for: 320x240 at 2 bytes a pixel
+FRAMEBUFFER_BYTES = 320 * 240 * 2
+
+# Trial allocations stop once the largest block is known to this many bytes
+PROBE_STEP = 512
+
+_app = None
+_peak = 0
+_gc_count = 0
+_gc_max_us = 0
+
+last = None  # the record end() made for the last app
+
+
+def begin(app: str) -> None:
+    """Start recording for `app`"""
+    global _app, _peak, _gc_count, _gc_max_us
+    _app = app
+    _gc_count = 0
+    _gc_max_us = 0
+    gc.collect()
+    _peak = gc.mem_alloc()
+
+
+def sample() -> None:
+    """Update the heap high-water mark; cheap enough to call every frame"""
+    global _peak
+    alloc = gc.mem_alloc()
+    if alloc > _peak:
+        _peak = alloc
+
+
+def collect() -> int:
+    """gc.collect(), timed; returns the pause in microseconds"""
+    global _gc_count, _gc_max_us
+    sample()  # the heap is at its fullest just before a collection
+    start = time.ticks_us()
+    gc.collect()
+    took = time.ticks_diff(time.ticks_us(), start)
+    _gc_count += 1
+    if took > _gc_max_us:
+        _gc_max_us = took
+    return took
+
+
+def largest_free_block() -> int:
+    """Size of the largest allocation that currently succeeds, to within PROBE_STEP bytes"""
+    lo, hi = 0, gc.mem_free()
+    while hi - lo > PROBE_STEP:
+        mid = (lo + hi) // 2
+        try:
+            block = bytearray(mid)
+            block = None
+            lo = mid
+        except MemoryError:
+            hi = mid
+    gc.collect()
+    return lo
+
+
+def end() -> dict:
+    """Finish recording the current app, log it and return the record"""
+    global _app, last
+    if _app is None:
+        return None
+    app_context.release_display()
+    collect()
+    largest = largest_free_block()
+    last = {
+        "app": _app,
+        "peak_alloc": _peak,
+        "free": gc.mem_free(),
+        "largest_block": largest,
+        "gc_count": _gc_count,
+        "gc_max_us": _gc_max_us,
+        "ok": largest >= FRAMEBUFFER_BYTES,
+    }
+    _app = None
+    if not last["ok"]:
+        print(f"Memory: {last['app']} left the largest free block at {largest} bytes, "
+              f"a {FRAMEBUFFER_BYTES} byte framebuffer won't fit")
+    append(last)
+    return last
+
+
+# --- Log ---
+def append(record: dict) -> None:
+    line = (f"{record['app']},{record['peak_alloc']},{record['free']},{record['largest_block']},"
+            f"{record['gc_count']},{record['gc_max_us']},{1 if record['ok'] else 0}\n")
+    try:
+        try:
+            size = os.stat(LOG_FILE)[6]
+        except OSError:
+            size = 0
+        if size + len(line) > MAX_LOG_BYTES:
+            trim()
+        with open(LOG_FILE, "a") as f:
+            f.write(line)
+    except OSError as e:
+        print(f"Error writing {LOG_FILE}: {e}")
+
+
+def trim() -> None:
+    """Drop the oldest half of the log"""
+    with open(LOG_FILE, "r") as f:
+        lines = f.readlines()
+    tmp = LOG_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        for line in lines[len(lines) // 2:]:
+            f.write(line)
+    os.rename(tmp, LOG_FILE)
+
+
+def read() -> list:
+    """Return every logged launch, oldest first"""
+    records = []
+    try:
+        with open(LOG_FILE, "r") as f:
+            for line in f:
+                fields = line.strip().split(",")
+                if len(fields) != 7:
+                    continue
+                try:
+                    records.append({
+                        "app": fields[0],
+                        "peak_alloc": int(fields[1]),
+                        "free": int(fields[2]),
+                        "largest_block": int(fields[3]),
+                        "gc_count": int(fields[4]),
+                        "gc_max_us": int(fields[5]),
+                        "ok": fields[6] == "1",
+                    })
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def summary() -> dict:
+    """Per-app worst case over every logged launch"""
+    apps = {}
+    for r in read():
+        s = apps.get(r["app"])
+        if s is None:
+            s = apps[r["app"]] = {"launches": 0, "peak_alloc": 0, "largest_block": r["largest_block"],
+                                  "gc_max_us": 0, "failed": 0}
+        s["launches"] += 1
+        s["peak_alloc"] = max(s["peak_alloc"], r["peak_alloc"])
+        s["largest_block"] = min(s["largest_block"], r["largest_block"])
+        s["gc_max_us"] = max(s["gc_max_us"], r["gc_max_us"])
+        if not r["ok"]:
+            s["failed"] += 1
+    return apps
+
+
+def report() -> None:
+    """Print summary() a line per app"""
+    for app, s in sorted(summary().items()):
+        flag = f"  FRAGMENTED x{s['failed']}" if s["failed"] else ""
+        print(f"{app:18} launches={s['launches']:<4} peak={s['peak_alloc']} largest={s['largest_block']} "
+              f"gc max={s['gc_max_us']}us{flag}")
@@ -0,0 +1,115 @@
+# Mood screens for the Tufty 2040 badge, described by /moods.json.
+#
+# Each mood is a small dict rather than its own script:
+#
+#   {"title": "Good Mood", "order": 1, "image": "thumb_up2.png",
+#    "colour": [0, 255, 0], "lines": ["Good/Happy", "Mood"],
+#    "brightness": 0.4, "pen": "RGB565"}
+#
+# "image" is shown full screen; if it can't be drawn, the screen is filled
+# with "colour" and the two "lines" are drawn in bold grey instead.  Leave
+# out "brightness" to use the brightness from the settings.  "order" places
+# the mood in the launcher's list alongside the numbered apps.
+#
+# The launcher lists the moods and calls show(); switching between moods
+# (up/down while one is shown) is a render() call, not a module import.
+
+import json
+import time
+from picographics import PEN_RGB565, PEN_RGB332
+import pngdec
+import image_cache
+import app_context
+import badge_settings
+import button_events
+import mem_telemetry
+import profiler
+import text_effects
+
+MOODS_FILE = "/moods.json"
+
+PEN_TYPES = {"RGB565": PEN_RGB565, "RGB332": PEN_RGB332}
+
+render_section = profiler.section("mood render")
+
+# Text layout for the fallback screen
+TEXT_SCALE = 1.3
+LINE_Y = (80, 160)  # distance of each line's baseline from the bottom
+BOLD_PASSES = [(0, 0), (1, 0), (0, 1), (-1, 0), (0, -1)]
+
+_moods = None
+
+
+def load_moods() -> list:
+    """Return the mood definitions, reading /moods.json only the first time"""
+    global _moods
+    if _moods is None:
+        try:
+            with open(MOODS_FILE, "r") as f:
+                _moods = json.load(f)["moods"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading moods: {e}")
+            _moods = []
+    return _moods
+
+
+def render(display, mood: dict) -> None:
+    """Draw `mood` and push it to the screen"""
+    render_section.begin()
+    width, height = display.get_bounds()
+    brightness = mood.get("brightness")
+    display.set_backlight(brightness if brightness is not None else badge_settings.brightness())
+    colour = display.create_pen(*mood["colour"])
+
+    display.set_pen(colour)
+    display.clear()
+    try:
+        png = pngdec.PNG(display)
+        image_cache.draw_png(display, png, mood["image"])
+    except Exception as e:
+        print(f"Error loading image: {e}")
+        print(f"Make sure '{mood['image']}' (320x240 baseline PNG) is on the device.")
+        try:
+            display.set_font("sans")
+            font = "sans"
+        except Exception:
+            display.set_font("bitmap8")
+            font = "bitmap8"
+        # Bold grey text with a black drop shadow, rasterised once per line
+        effects = [text_effects.get(display, font, text, TEXT_SCALE, BOLD_PASSES, shadows=[(1, 1)])
+                   for text in mood["lines"]]
+
+        display.set_pen(colour)
+        display.rectangle(0, 0, width, height)
+        black = display.create_pen(0, 0, 0)
+        grey = display.create_pen(64, 64, 64)
+        for effect, from_bottom in zip(effects, reversed(LINE_Y)):
+            effect.draw(display, (width - effect.width) // 2, height - from_bottom, grey, [black])
+
+    display.update()
+    render_section.end()
+
+
+def show(index: int) -> None:
+    """Show mood `index` until button A is pressed; up/down step through the moods"""
+    moods = load_moods()
+    button_events.start()
+
+    index %= len(moods)
+    shown = None
+    while True:
+        if shown != index:
+            mood = moods[index]
+            render(app_context.get_display(PEN_TYPES.get(mood.get("pen"), PEN_RGB565)), mood)
+            mem_telemetry.sample()
+            shown = index
+
+        time.sleep(0.01)  # Small delay to prevent busy-waiting
+
+        pressed = button_events.pressed()
+        if pressed == "a":
+            return
+        if pressed == "up":
+            index = (index - 1) % len(moods)
+        if pressed == "down":
+            index = (index + 1) % len(moods)
@@ -0,0 +1,170 @@
+# Frame-time and heap profiling for the Tufty 2040 badge apps.
+#
+# An app names the parts of its loop it wants measured once, at start-up:
+#
+#   frame = profiler.section("frame")
+#   ...
+#   frame.begin()
+#   draw_everything()
+#   frame.end()
+#
+# Each section keeps its last SAMPLES durations (in microseconds) and heap
+# deltas (bytes allocated between begin() and end()) in arrays allocated
+# up front, so measuring allocates nothing.  dump() prints min/mean/p95/max
+# for every section over USB serial; overlay() draws the frame rate and free
+# heap in the corner of the screen, just before display.update().
+#
+# Profiling is off unless ENABLED is set here (or enable() is called before
+# the app creates its sections).  While it's off, section() hands back one
+# shared object whose begin() and end() do nothing, and dump() and
+# overlay() return straight away, so the calls can stay in the apps.
+
+import gc
+import time
+from array import array
+import app_context
+
+# Turn profiling on, and the on-screen frame rate and heap display with it
+ENABLED = False
+OVERLAY = False
+
+SAMPLES = 64
+
+# Overlay box, top-left corner
+OVERLAY_WIDTH = 120
+OVERLAY_HEIGHT = 12
+OVERLAY_MS = 1000  # how often the frame rate is recalculated
+
+_sections = []
+
+
+def enable(overlay: bool = False) -> None:
+    """Turn profiling on for sections created from now on"""
+    global ENABLED, OVERLAY
+    ENABLED = True
+    OVERLAY = overlay
+
+
+class Section:
+    """Durations and heap deltas of the last SAMPLES runs of one part of the loop"""
+
+    def __init__(self, name: str, samples: int = SAMPLES) -> None:
+        self.name = name
+        self.times = array("l", [0] * samples)
+        self.heap = array("l", [0] * samples)
+        self.count = 0
+        self.started = 0
+        self.allocated = 0
+
+    def begin(self) -> None:
+        self.allocated = gc.mem_alloc()
+        self.started = time.ticks_us()
+
+    def end(self) -> None:
+        took = time.ticks_diff(time.ticks_us(), self.started)
+        slot = self.count % len(self.times)
+        self.times[slot] = took
+        self.heap[slot] = gc.mem_alloc() - self.allocated
+        self.count += 1
+
+    def summary(self) -> dict:
+        n = min(self.count, len(self.times))
+        if not n:
+            return {"n": 0}
+        times = sorted(self.times[:n])
+        heap = self.heap[:n]
+        return {
+            "n": self.count,
+            "min_us": times[0],
+            "mean_us": sum(times) // n,
+            "p95_us": times[min(n - 1, n * 95 // 100)],
+            "max_us": times[-1],
+            "heap_mean": sum(heap) // n,
+            "heap_max": max(heap),
+        }
+
+
+class _Off:
+    """Stands in for every Section while profiling is off"""
+
+    name = "off"
+    count = 0
+
+    def begin(self) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def summary(self) -> dict:
+        return {"n": 0}
+
+
+_OFF = _Off()
+
+
+def section(name: str, samples: int = SAMPLES):
+    """Return the section called `name`, creating it (or the do-nothing stand-in if disabled)"""
+    if not ENABLED:
+        return _OFF
+    for s in _sections:
+        if s.name == name:
+            return s
+    s = Section(name, samples)
+    _sections.append(s)
+    return s
+
+
+def dump() -> None:
+    """Print a summary line for each section"""
+    if not ENABLED:
+        return
+    for s in _sections:
+        summary = s.summary()
+        if not summary["n"]:
+            continue
+        print(f"{s.name:18} n={summary['n']:<5} min={summary['min_us']}us mean={summary['mean_us']}us "
+              f"p95={summary['p95_us']}us max={summary['max_us']}us heap mean={summary['heap_mean']} "
+              f"max={summary['heap_max']}")
+
+
+def reset() -> None:
+    """Forget every section, e.g. when an app exits"""
+    _sections.clear()
+
+
+# --- On-screen overlay ---
+_overlay_pens = None  # (display generation, background pen, text pen)
+_frames = 0
+_window_start = 0
+_overlay_text = ""
+
+
+def overlay(display, font: str = None) -> None:
+    """Draw "<fps> fps <free>K" in the top-left corner; call once per frame before update().
+
+    The overlay is drawn in bitmap8; pass the app's `font` to have it selected again afterwards.
+    """
+    global _overlay_pens, _frames, _window_start, _overlay_text
+    if not OVERLAY:
+        return
+    now = time.ticks_ms()
+    if _overlay_pens is None or _overlay_pens[0] != app_context.generation:
+        # Pens take palette slots in the P4/P8 modes, so only make them once per display
+        _overlay_pens = (app_context.generation, display.create_pen(0, 0, 0), display.create_pen(255, 255, 0))
+        _frames = 0
+        _window_start = now
+    _frames += 1
+    elapsed = time.ticks_diff(now, _window_start)
+    if elapsed >= OVERLAY_MS or not _overlay_text:
+        fps = _frames * 1000 / elapsed if elapsed > 0 else 0
+        _overlay_text = f"{fps:.1f} fps {gc.mem_free() // 1024}K"
+        _frames = 0
+        _window_start = now
+    display.set_pen(_overlay_pens[1])
+    display.rectangle(0, 0, OVERLAY_WIDTH, OVERLAY_HEIGHT)
+    display.set_pen(_overlay_pens[2])
+    display.set_font("bitmap8")
+    display.text(_overlay_text, 2, 2, OVERLAY_WIDTH, 1)
+    if font:
+        display.set_font(font)
@@ -0,0 +1,98 @@
+# Run-length, palette-indexed images for the Tufty 2040 badge (".rle").
+#
+# Flag backgrounds are a few flat colours in bands, yet as PNGs every pixel
+# goes through inflate and unfiltering.  An .rle file stores each run of one
+# colour as two bytes, and a band of identical rows only once, so drawing it
+# is one rectangle() per run per band: a five-stripe flag is five calls.
+#
+#   offset 0   b"BRLE", version (B), palette size (B, 0 for 256),
+#              width (H), height (H)
+#   offset 10  palette, R G B bytes per colour
+#   then       groups of identical rows until `height` rows are covered:
+#              row count (B, 1-255), run count (H), then for each run
+#              length - 1 (B) and palette index (B); a group's runs add up
+#              to `width`
+#
+# RLE has the same open_file()/decode()/get_width()/get_height() methods as
+# pngdec.PNG, so it can be used wherever an app decodes a PNG;
+# image_cache.draw_png() picks it for paths ending in ".rle".  Files are made
+# on the host with tools/convert_assets.py --format rle.
+
+import struct
+
+MAGIC = b"BRLE"
+VERSION = 1
+HEADER = "<4sBBHH"
+HEADER_SIZE = 10
+GROUP = "<BH"
+GROUP_SIZE = 3
+
+EXTENSION = ".rle"
+
+# Longest row this decoder handles, sizes the run buffer
+MAX_WIDTH = 320
+
+
+def is_rle(path: str) -> bool:
+    return path.lower().endswith(EXTENSION)
+
+
+class RLE:
+    """Streaming .rle decoder with the same interface as pngdec.PNG"""
+
+    def __init__(self, display) -> None:
+        self.display = display
+        self.path = None
+        self.width = 0
+        self.height = 0
+        self.colours = 0
+        # Every run is at least one pixel, so a row never has more than MAX_WIDTH runs
+        self.runs = bytearray(2 * MAX_WIDTH)
+
+    def open_file(self, path: str) -> None:
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            raise OSError("not an RLE image")
+        magic, version, colours, width, height = struct.unpack(HEADER, header)
+        if magic != MAGIC or version != VERSION:
+            raise OSError("not an RLE image")
+        if width > MAX_WIDTH:
+            raise OSError(f"RLE image wider than {MAX_WIDTH}")
+        self.path = path
+        self.colours = colours or 256
+        self.width = width
+        self.height = height
+
+    def get_width(self) -> int:
+        return self.width
+
+    def get_height(self) -> int:
+        return self.height
+
+    def decode(self, x: int = 0, y: int = 0) -> None:
+        """Draw the open image with its top-left corner at (x, y)"""
+        if self.path is None:
+            raise OSError("no RLE image open")
+        display = self.display
+        runs = memoryview(self.runs)
+        with open(self.path, "rb") as f:
+            f.seek(HEADER_SIZE)
+            palette = f.read(3 * self.colours)
+            pens = [display.create_pen(palette[i], palette[i + 1], palette[i + 2])
+                    for i in range(0, len(palette), 3)]
+            header = bytearray(GROUP_SIZE)
+            row = 0
+            while row < self.height:
+                if f.readinto(header) != GROUP_SIZE:
+                    raise OSError("truncated RLE image")
+                rows, count = struct.unpack(GROUP, header)
+                if count > MAX_WIDTH or f.readinto(runs[:2 * count]) != 2 * count:
+                    raise OSError("bad RLE image")
+                col = x
+                for i in range(0, 2 * count, 2):
+                    length = runs[i] + 1
+                    display.set_pen(pens[runs[i + 1]])
+                    display.rectangle(col, y + row, length, rows)
+                    col += length
+                row += rows
@@ -0,0 +1,128 @@
+# Cooperative task runtime for the Tufty 2040 badge, on uasyncio.
+#
+# An app's loop usually polls input, redraws and sleeps in one place, so a
+# slow redraw holds up everything else and every job runs as often as the
+# fastest one needs to.  Here each job is a function registered with a
+# period:
+#
+#   runtime = Runtime()
+#   runtime.every("input", 20, handle_input)
+#   runtime.every("settings", 250, badge_settings.poll)
+#   result = runtime.run()
+#
+# Each job runs as its own uasyncio task that sleeps until it's next due, so
+# the CPU only wakes for jobs that have something to do and the badge idles
+# in between.  A job ends the run with runtime.stop(result); run() returns
+# that result.
+#
+# A run that starts a whole period or more late has missed a deadline: the
+# missed slots are counted and skipped rather than run back to back.
+# stats() reports each job's runs, busy time and missed deadlines.
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+
+class Job:
+    """A function run every `period_ms` by a Runtime"""
+
+    def __init__(self, name: str, period_ms: int, fn) -> None:
+        self.name = name
+        self.period_ms = period_ms
+        self.fn = fn
+        self.task = None
+
+        # --- Benchmark counters ---
+        self.runs = 0
+        self.busy_us = 0
+        self.max_us = 0
+        self.missed = 0
+
+    async def loop(self, runtime) -> None:
+        due = time.ticks_ms()
+        while runtime.running:
+            wait = time.ticks_diff(due, time.ticks_ms())
+            # sleep_ms(0) still yields, so a job that's behind can't starve the others
+            await asyncio.sleep_ms(wait if wait > 0 else 0)
+            if not runtime.running:
+                break
+            late = time.ticks_diff(time.ticks_ms(), due)
+            if late >= self.period_ms:
+                skipped = late // self.period_ms
+                self.missed += skipped
+                due = time.ticks_add(due, skipped * self.period_ms)
+
+            start = time.ticks_us()
+            try:
+                self.fn()
+            except Exception as e:
+                print(f"Error in task '{self.name}': {e}")
+            took = time.ticks_diff(time.ticks_us(), start)
+            self.runs += 1
+            self.busy_us += took
+            if took > self.max_us:
+                self.max_us = took
+            due = time.ticks_add(due, self.period_ms)
+
+    def stats(self) -> dict:
+        return {
+            "period_ms": self.period_ms,
+            "runs": self.runs,
+            "busy_ms": self.busy_us // 1000,
+            "mean_us": self.busy_us // self.runs if self.runs else 0,
+            "max_us": self.max_us,
+            "missed": self.missed,
+        }
+
+
+class Runtime:
+    def __init__(self) -> None:
+        self.jobs = []
+        self.running = False
+        self.result = None
+        self.done = None  # uasyncio.Event, set by stop()
+        self.started = None
+        self.elapsed_ms = 0
+
+    def every(self, name: str, period_ms: int, fn) -> Job:
+        """Run fn() every `period_ms` once run() is called, starting straight away"""
+        job = Job(name, period_ms, fn)
+        self.jobs.append(job)
+        return job
+
+    def stop(self, result=None) -> None:
+        """End run() once the current job returns; run() returns `result`"""
+        self.result = result
+        self.running = False
+        if self.done is not None:
+            self.done.set()
+
+    async def main(self) -> None:
+        self.done = asyncio.Event()
+        for job in self.jobs:
+            job.task = asyncio.create_task(job.loop(self))
+        await self.done.wait()
+        # Jobs sleeping until a later deadline would otherwise hold on until it
+        for job in self.jobs:
+            job.task.cancel()
+            job.task = None
+
+    def run(self):
+        """Run the jobs until one of them calls stop(), return the result it gave"""
+        self.running = True
+        self.result = None
+        self.done = None
+        self.started = time.ticks_ms()
+        asyncio.run(self.main())
+        self.elapsed_ms = time.ticks_diff(time.ticks_ms(), self.started)
+        return self.result
+
+    def stats(self) -> dict:
+        busy_ms = sum(job.busy_us for job in self.jobs) // 1000
+        report = {job.name: job.stats() for job in self.jobs}
+        report["idle_percent"] = round(100 - 100 * busy_ms / self.elapsed_ms, 1) if self.elapsed_ms else 0.0
+        return report
@@ -0,0 +1,163 @@
+# Shadowed, outlined and bold text for the Tufty 2040 badge.
+#
+# display.text() rasterises the Hershey glyphs again on every call, so a
+# bold line with a drop shadow cost six or seven rasterisations.  Here a
+# string is rasterised once, white on black, in a clipped scratch area at
+# the top-left of the framebuffer and read back as a 1-bit mask, stored as
+# runs of set pixels.  Because every scratch pixel is all-zero or all-one
+# bytes, the ends of each run are found with bytes.find() rather than by
+# testing pixels one at a time.
+#
+# Bold and outline layers are the mask dilated by a set of offsets, merged
+# once when the effect is built.  Drawing stamps each layer by copying a
+# row of the pen colour into the framebuffer for every run, so redrawing
+# costs no rasterisation and no drawing calls at all (and ignores the clip).
+#
+# Only for PEN_RGB565 and PEN_RGB332 displays, where white is all-one bytes.
+
+from array import array
+
+WIDTH, HEIGHT = 320, 240
+
+# How far the Hershey glyphs reach above and below the text y, at scale 1
+# (as in glyph_atlas, copied so apps don't pay for compiling that module)
+GLYPH_ASCENT = 13
+GLYPH_DESCENT = 10
+
+# Offsets for the classic "draw it five times" bold, and a one pixel outline
+BOLD = [(0, 0), (1, 0), (0, 1), (-1, 0), (0, -1)]
+OUTLINE = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+def rasterise(display, text: str, scale: float) -> array:
+    """Return the mask of `text` as (row, x0, x1) runs relative to the pen position.
+
+    Uses the top-left of the framebuffer as scratch, so build masks before
+    composing the screen.  The current font is used.
+    """
+    fb = memoryview(display)
+    bpp = len(fb) // (WIDTH * HEIGHT)
+    pad = int(scale) + 2
+    ox = pad
+    oy = int(GLYPH_ASCENT * scale) + pad
+    w = min(WIDTH, display.measure_text(text, scale) + 2 * pad)
+    h = min(HEIGHT, oy + int(GLYPH_DESCENT * scale) + pad)
+
+    display.set_clip(0, 0, w, h)
+    display.set_pen(display.create_pen(0, 0, 0))
+    display.rectangle(0, 0, w, h)
+    display.set_pen(display.create_pen(255, 255, 255))
+    display.text(text, ox, oy, -1, scale)
+    display.remove_clip()
+
+    spans = array("h")
+    for row in range(h):
+        base = row * WIDTH * bpp
+        line = bytes(fb[base:base + w * bpp])
+        start = line.find(b"\xff")
+        while start >= 0:
+            end = line.find(b"\x00", start)
+            if end < 0:
+                end = len(line)
+            spans.extend((row - oy, start // bpp - ox, end // bpp - ox))
+            start = line.find(b"\xff", end)
+    return spans
+
+
+def dilate(spans: array, offsets: list) -> array:
+    """Union of the mask shifted by every (dx, dy) in `offsets`"""
+    rows = {}
+    for i in range(0, len(spans), 3):
+        for dx, dy in offsets:
+            row = spans[i] + dy
+            if row not in rows:
+                rows[row] = []
+            rows[row].append((spans[i + 1] + dx, spans[i + 2] + dx))
+
+    merged = array("h")
+    for row in sorted(rows):
+        runs = sorted(rows[row])
+        x0, x1 = runs[0]
+        for a, b in runs:
+            if a <= x1:
+                if b > x1:
+                    x1 = b
+            else:
+                merged.extend((row, x0, x1))
+                x0, x1 = a, b
+        merged.extend((row, x0, x1))
+    return merged
+
+
+def pen_row(display, pen: int) -> memoryview:
+    """A screen-wide row of `pen`, as it's laid out in the framebuffer"""
+    fb = memoryview(display)
+    bpp = len(fb) // (WIDTH * HEIGHT)
+    # Plot one pixel and read it back rather than packing the pen ourselves,
+    # pen values are byte-swapped relative to the framebuffer on some builds
+    saved = bytes(fb[0:bpp])
+    display.set_pen(pen)
+    display.pixel(0, 0)
+    colour = bytes(fb[0:bpp])
+    fb[0:bpp] = saved
+    return memoryview(colour * WIDTH)
+
+
+def stamp(display, spans: array, x: int, y: int, row: memoryview) -> None:
+    """Copy `row` (from pen_row) into the framebuffer under every run of `spans`"""
+    fb = memoryview(display)
+    bpp = len(fb) // (WIDTH * HEIGHT)
+    for i in range(0, len(spans), 3):
+        ry = y + spans[i]
+        if ry < 0 or ry >= HEIGHT:
+            continue
+        x0 = max(0, x + spans[i + 1])
+        x1 = min(WIDTH, x + spans[i + 2])
+        if x1 > x0:
+            dst = (ry * WIDTH + x0) * bpp
+            fb[dst:dst + (x1 - x0) * bpp] = row[:(x1 - x0) * bpp]
+
+
+class TextEffect:
+    """A string rasterised once, with its shadows, outline and fill ready to stamp"""
+
+    def __init__(self, display, text: str, scale: float, bold: list = None, outline: bool = False,
+                 shadows: list = ()) -> None:
+        self.width = display.measure_text(text, scale)
+        self.mask = rasterise(display, text, scale)
+        self.fill = dilate(self.mask, bold) if bold else self.mask
+        self.outline = dilate(self.fill, OUTLINE) if outline else None
+        # Shadows are the plain glyphs offset by (dx, dy), drawn under everything else
+        self.shadows = shadows
+
+    def draw(self, display, x: int, y: int, fill_pen: int, shadow_pens: list = (),
+             outline_pen: int = None) -> None:
+        """Draw with the pen position at (x, y), as display.text() would"""
+        for (dx, dy), pen in zip(self.shadows, shadow_pens):
+            stamp(display, self.mask, x + dx, y + dy, pen_row(display, pen))
+        if self.outline is not None and outline_pen is not None:
+            stamp(display, self.outline, x, y, pen_row(display, outline_pen))
+        stamp(display, self.fill, x, y, pen_row(display, fill_pen))
+
+
+# --- Cache ---
+# Built effects by (font, text, scale, effect); the text on a badge rarely changes
+MAX_CACHED = 8
+_cache = {}
+
+
+def get(display, font: str, text: str, scale: float, bold: list = None, outline: bool = False,
+        shadows: list = ()) -> TextEffect:
+    """Return a cached TextEffect, building it (in the framebuffer scratch area) if needed"""
+    key = (font, text, scale, tuple(bold or ()), outline, tuple(shadows))
+    effect = _cache.get(key)
+    if effect is None:
+        if len(_cache) >= MAX_CACHED:
+            _cache.clear()
+        display.set_font(font)
+        effect = _cache[key] = TextEffect(display, text, scale, bold, outline, shadows)
+    return effect
+
+
+def clear_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,95 @@
+# Largest-scale text fitting for the Tufty 2040 badge.
+#
+# Apps used to size a line by starting at a scale that's too big and
+# shrinking it by one, calling measure_text() every step: up to twenty
+# measurements for a long name.  fit() binary-searches the largest whole
+# scale that fits instead, so a scale between 0 and 20 takes at most five.
+#
+# Results are remembered by (font, max width, text), in memory and in
+# /text_fit.json next to /badge_text.json, so once the badge text has been
+# sized it is never measured again, even after a reset.  Changing the text
+# or the width gives a new key; the file is emptied when it holds more than
+# MAX_ENTRIES results.
+
+import json
+import os
+
+FIT_FILE = "/text_fit.json"
+
+MAX_ENTRIES = 16
+
+_fits = None  # "font|max width|text" -> [scale, width]
+
+stats = {"hits": 0, "misses": 0, "measurements": 0}
+
+
+def _load() -> dict:
+    global _fits
+    if _fits is None:
+        try:
+            with open(FIT_FILE, "r") as f:
+                _fits = json.load(f)
+        except OSError:
+            # No file yet
+            _fits = {}
+        except Exception as e:
+            print(f"Error loading {FIT_FILE}: {e}")
+            _fits = {}
+    return _fits
+
+
+def _save() -> None:
+    tmp = FIT_FILE + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(json.dumps(_fits))
+        os.rename(tmp, FIT_FILE)
+    except OSError as e:
+        print(f"Error saving {FIT_FILE}: {e}")
+
+
+def fit(display, font: str, text: str, max_width: int, largest: int = 20) -> tuple:
+    """Return (scale, width) for the largest whole scale up to `largest` that
+    measures narrower than `max_width`.
+
+    `font` must already be the display's current font; it's only used as part
+    of the key.  Scale 0 is returned if nothing fits.
+    """
+    fits = _load()
+    key = f"{font}|{max_width}|{text}"
+    found = fits.get(key)
+    if found is not None:
+        stats["hits"] += 1
+        return found[0], found[1]
+    stats["misses"] += 1
+
+    def measure(scale):
+        stats["measurements"] += 1
+        return display.measure_text(text, scale)
+
+    # Widths only grow with the scale: keep `low` fitting and `high` not
+    low, low_width = 0, 0
+    high = largest + 1
+    while high - low > 1:
+        mid = (low + high) // 2
+        width = measure(mid)
+        if width < max_width:
+            low, low_width = mid, width
+        else:
+            high = mid
+
+    if len(fits) >= MAX_ENTRIES:
+        fits.clear()
+    fits[key] = [low, low_width]
+    _save()
+    return low, low_width
+
+
+def forget() -> None:
+    """Drop every remembered result, in memory and on flash"""
+    global _fits
+    _fits = {}
+    try:
+        os.remove(FIT_FILE)
+    except OSError:
+        pass
@@ -0,0 +1,219 @@
+# Thumbnail index for the images in /badge.
+#
+# Every image is shrunk to THUMB_WIDTH x THUMB_HEIGHT once and kept, in the
+# display's pixel format, in a single packed file in /cache:
+#
+#   offset 0   b"THMB", version (B), bytes per pixel (B), count (H)
+#   offset 8   count index entries: data offset (I), file size (I),
+#              mtime (I), name as a length byte and up to 63 bytes of UTF-8
+#   then       count thumbnails of THUMB_BYTES each, in name order
+#
+# A page of the gallery is therefore one sequential run through the file,
+# instead of a full PNG decode per image.  update() compares each PNG's
+# size and mtime with its index entry and only decodes the ones that are new
+# or have changed; thumbnails that are still valid are copied across from
+# the old file.  The new file is written under a temporary name and renamed
+# over the old one.
+#
+# Thumbnails are made by decoding into the framebuffer and sampling every
+# SHRINK-th pixel, so the caller must redraw the screen after update().
+
+import os
+import struct
+import image_cache
+
+THUMB_WIDTH = 80
+THUMB_HEIGHT = 60
+SHRINK = 4  # 320x240 -> 80x60
+
+WIDTH, HEIGHT = 320, 240
+
+# --- Packed file layout ---
+MAGIC = b"THMB"
+VERSION = 1
+HEADER = "<4sBBH"
+HEADER_SIZE = 8
+ENTRY = "<III"
+NAME_SLOT = 64
+ENTRY_SIZE = 12 + NAME_SLOT
+
+stats = {"checked": 0, "made": 0, "kept": 0, "rebuilds": 0}
+
+
+def thumbs_path(display) -> str:
+    return f"{image_cache.CACHE_DIR}/thumbs.{image_cache.format_name(display)}"
+
+
+def thumb_bytes(display) -> int:
+    return THUMB_WIDTH * THUMB_HEIGHT * (len(memoryview(display)) // (WIDTH * HEIGHT))
+
+
+def list_pngs(directory: str) -> list:
+    """Return [(name, size, mtime)] for the PNG and .rle images in `directory`, sorted by name"""
+    try:
+        names = sorted(f for f in os.listdir(directory) if f.lower().endswith((".png", ".rle")))
+    except OSError:
+        return []
+    found = []
+    for name in names:
+        if len(name.encode()) >= NAME_SLOT:
+            print(f"Skipping '{name}', the name is too long for the thumbnail index")
+            continue
+        try:
+            st = os.stat(f"{directory}/{name}")
+        except OSError:
+            continue
+        found.append((name, st[6], st[8]))
+    return found
+
+
+def read_index(path: str, bpp: int) -> list:
+    """Return [(name, size, mtime, offset)] from a thumbnail file, [] if it's unusable"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE:
+                return []
+            magic, version, file_bpp, count = struct.unpack(HEADER, header)
+            if magic != MAGIC or version != VERSION or file_bpp != bpp:
+                return []
+            data = f.read(count * ENTRY_SIZE)
+    except OSError:
+        return []
+    if len(data) != count * ENTRY_SIZE:
+        return []
+    entries = []
+    for i in range(count):
+        base = i * ENTRY_SIZE
+        offset, size, mtime = struct.unpack_from(ENTRY, data, base)
+        length = min(data[base + 12], NAME_SLOT - 1)
+        entries.append((str(data[base + 13:base + 13 + length], "utf-8"), size, mtime, offset))
+    return entries
+
+
+def shrink(display, buf: bytearray) -> None:
+    """Sample the framebuffer down into `buf`, one pixel from each SHRINK x SHRINK block"""
+    fb = memoryview(display)
+    bpp = len(fb) // (WIDTH * HEIGHT)
+    step = SHRINK * bpp
+    centre = SHRINK // 2
+    out = 0
+    for ty in range(THUMB_HEIGHT):
+        src = ((ty * SHRINK + centre) * WIDTH + centre) * bpp
+        for _ in range(THUMB_WIDTH):
+            buf[out:out + bpp] = fb[src:src + bpp]
+            out += bpp
+            src += step
+
+
+def make_thumb(display, png, path: str, buf: bytearray) -> None:
+    """Decode `path` (from the raw image cache if it's there) and shrink it into `buf`"""
+    display.set_pen(display.create_pen(0, 0, 0))
+    display.clear()
+    try:
+        if path.lower().endswith(".rle"):
+            image_cache.draw_png(display, png, path)
+        else:
+            sidecar = image_cache.cache_path(path, display)
+            if not (sidecar and image_cache.load(display, sidecar)):
+                png.open_file(path)
+                png.decode(0, 0)
+    except Exception as e:
+        # Leave it black, the index entry stops it being retried every time
+        print(f"Error making thumbnail for '{path}': {e}")
+    shrink(display, buf)
+    stats["made"] += 1
+
+
+def update(display, png, directory: str = "/badge") -> list:
+    """Bring the thumbnail file up to date, return its index.
+
+    Overwrites the framebuffer if anything had to be decoded.
+    """
+    path = thumbs_path(display)
+    size = thumb_bytes(display)
+    bpp = size // (THUMB_WIDTH * THUMB_HEIGHT)
+    pngs = list_pngs(directory)
+    old = read_index(path, bpp)
+    stats["checked"] += len(pngs)
+    if [entry[:3] for entry in old] == pngs:
+        return old
+
+    # Something was added, removed or changed: write a new file, keeping the
+    # thumbnails that are still valid
+    stats["rebuilds"] += 1
+    known = {}
+    for name, file_size, mtime, offset in old:
+        known[name] = (file_size, mtime, offset)
+    data_start = HEADER_SIZE + len(pngs) * ENTRY_SIZE
+    entries = [(name, file_size, mtime, data_start + i * size) for i, (name, file_size, mtime) in enumerate(pngs)]
+
+    index = bytearray(data_start)
+    struct.pack_into(HEADER, index, 0, MAGIC, VERSION, bpp, len(entries))
+    for i, (name, file_size, mtime, offset) in enumerate(entries):
+        base = HEADER_SIZE + i * ENTRY_SIZE
+        struct.pack_into(ENTRY, index, base, offset, file_size, mtime)
+        data = name.encode()
+        index[base + 12] = len(data)
+        index[base + 13:base + 13 + len(data)] = data
+
+    try:
+        os.mkdir(image_cache.CACHE_DIR)
+    except OSError:
+        pass
+    buf = bytearray(size)
+    tmp = path + ".tmp"
+    try:
+        old_file = open(path, "rb") if old else None
+        try:
+            with open(tmp, "wb") as f:
+                f.write(index)
+                for name, file_size, mtime, _ in entries:
+                    previous = known.get(name)
+                    if previous and previous[:2] == (file_size, mtime):
+                        old_file.seek(previous[2])
+                        old_file.readinto(buf)
+                        stats["kept"] += 1
+                    else:
+                        make_thumb(display, png, f"{directory}/{name}", buf)
+                    f.write(buf)
+        finally:
+            if old_file:
+                old_file.close()
+        os.rename(tmp, path)
+    except OSError as e:
+        print(f"Error writing thumbnails: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return []
+    return entries
+
+
+def draw(display, entries: list, first: int, count: int, positions: list) -> None:
+    """Copy thumbnails first..first+count-1 to the (x, y) in `positions`, in one pass through the file"""
+    entries = entries[first:first + count]
+    if not entries:
+        return
+    fb = memoryview(display)
+    size = thumb_bytes(display)
+    bpp = size // (THUMB_WIDTH * THUMB_HEIGHT)
+    row_bytes = THUMB_WIDTH * bpp
+    buf = bytearray(size)
+    view = memoryview(buf)
+    try:
+        with open(thumbs_path(display), "rb") as f:
+            # The thumbnails are stored one after another, so only seek once
+            f.seek(entries[0][3])
+            for (x, y) in positions[:len(entries)]:
+                if f.readinto(buf) != size:
+                    break
+                src = 0
+                dst = (y * WIDTH + x) * bpp
+                for _ in range(THUMB_HEIGHT):
+                    fb[dst:dst + row_bytes] = view[src:src + row_bytes]
+                    src += row_bytes
+                    dst += WIDTH * bpp
+    except OSError as e:
+        print(f"Error reading thumbnails: {e}")
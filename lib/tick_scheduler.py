@@ -0,0 +1,87 @@
+# Second-aligned tick scheduler for the Tufty 2040 badge.
+#
+# Instead of spinning on time.localtime() until the second changes, an app
+# calls wait() to sleep until the next tick is due.  Sleeps are split into
+# short slices, and the `wake` callable (button_events.pending, say) is
+# checked between them, so a queued button press ends the wait early.
+# When the app has dealt with a press it calls input_handled() with the
+# ticks_ms the press happened at, and stats() reports the latency.
+#
+# Ticks are scheduled slightly before the expected RTC rollover; the app
+# then naps in STEP_MS steps until the second actually changes and calls
+# tick() to re-anchor, so drift between ticks_ms and the RTC can't build up.
+
+import time
+import machine
+
+# --- Timing ---
+EARLY_MS = 4    # wake this long before the predicted rollover
+STEP_MS = 1     # nap length while waiting for the RTC to roll over
+SLICE_MS = 20   # longest single sleep, bounds the input latency
+
+LATENCY_HISTORY = 16
+
+
+class TickScheduler:
+    def __init__(self, period_ms: int = 1000, slice_ms: int = SLICE_MS,
+                 use_lightsleep: bool = False, wake=None) -> None:
+        self.period_ms = period_ms
+        self.wake = wake
+        self.slice_ms = slice_ms
+        self.use_lightsleep = use_lightsleep
+        self.next_tick = None
+
+        # --- Benchmark counters ---
+        self.ticks = 0
+        self.idle_ms = 0
+        self.started = time.ticks_ms()
+        self.latencies = []
+
+    def input_handled(self, pressed_at: int) -> int:
+        """Record a press handled now that happened at `pressed_at` (ticks_ms), return its latency"""
+        latency = time.ticks_diff(time.ticks_ms(), pressed_at)
+        self.latencies.append(latency)
+        if len(self.latencies) > LATENCY_HISTORY:
+            self.latencies.pop(0)
+        return latency
+
+    def tick(self) -> None:
+        """Call when a tick has been observed; schedules the next one"""
+        self.ticks += 1
+        self.next_tick = time.ticks_add(time.ticks_ms(), self.period_ms - EARLY_MS)
+
+    def sleep(self, ms: int) -> None:
+        start = time.ticks_ms()
+        if self.use_lightsleep:
+            machine.lightsleep(ms)
+        else:
+            time.sleep_ms(ms)
+        self.idle_ms += time.ticks_diff(time.ticks_ms(), start)
+
+    def wait(self) -> bool:
+        """Sleep until the next tick is due, return True if woken by input instead"""
+        while not (self.wake and self.wake()):
+            if self.next_tick is None:
+                self.sleep(STEP_MS)
+                return False
+            remaining = time.ticks_diff(self.next_tick, time.ticks_ms())
+            if remaining <= 0:
+                # Due, but the RTC may not have rolled over yet: nap briefly
+                self.sleep(STEP_MS)
+                return False
+            self.sleep(min(remaining, self.slice_ms))
+        return True
+
+    def idle_percent(self) -> float:
+        elapsed = time.ticks_diff(time.ticks_ms(), self.started)
+        return 100 * self.idle_ms / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> dict:
+        latencies = self.latencies
+        return {
+            "ticks": self.ticks,
+            "idle_percent": round(self.idle_percent(), 1),
+            "input_latency_ms": latencies[-1] if latencies else None,
+            "max_input_latency_ms": max(latencies) if latencies else None,
+        }
+
@@ -1,58 +1,21 @@
 # Tufty2040 boot menu/loader.
 
 import gc
+import math
+import sys
 import time
 from os import listdir
-from picographics import PicoGraphics, DISPLAY_TUFTY_2040, PEN_RGB565
-from pimoroni import Button
+from picographics import PEN_P8
+from task_runtime import Runtime
+import app_context
+import badge_settings
+import button_events
+import profiler
+import mem_telemetry
+import mood_engine
 import os
 import json
 
-def prepare_for_launch() -> None:
-    """Clean up before launching another module"""
-    # Remove this module from sys.modules so it can be reloaded fresh next time
-    if '5_jam_badge' in sys.modules:
-        del sys.modules['5_jam_badge']
-    
-    # Collect garbage to free memory
-    gc.collect()
-    
-# --- Settings file path ---
-SETTINGS_FILE = "/settings.json"
-
-# --- Default settings ---
-DEFAULT_SETTINGS = {
-    "brightness": 1.0,
-    "text_overlay": True,
-    "selected_image": ""
-}
-    
-# --- Load settings from file ---
-def load_settings():
-    """Load settings from JSON file, return defaults if file doesn't exist"""
-    try:
-        # Check if file exists by trying to stat it
-        try:
-            os.stat(SETTINGS_FILE)
-            # File exists, try to read it
-            with open(SETTINGS_FILE, 'r') as f:
-                settings = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                for key in DEFAULT_SETTINGS:
-                    if key not in settings:
-                        settings[key] = DEFAULT_SETTINGS[key]
-                return settings
-        except OSError:
-            # File doesn't exist, return defaults
-            pass
-    except Exception as e:
-        print(f"Error loading settings: {e}")
-    return DEFAULT_SETTINGS.copy()
-
-# --- Load current settings ---
-settings = load_settings()
-brightness = round(settings.get("brightness", 1.0), 1)
-
 def hsv_to_rgb(h: float, s: float, v: float) -> tuple[float, float, float]:  # noqa: RET503
     if s == 0.0:
         return v, v, v
@@ -80,119 +43,227 @@ def hsv_to_rgb(h: float, s: float, v: float) -> tuple[float, float, float]:  # n
         return v, p, q
 
 
-def get_applications() -> list[dict[str, str]]:
-    # fetch a list of the applications that are stored in the filesystem
-    applications = []
-    for file in listdir():
-        if file.endswith(".py") and file != "main.py" and file != "settings.py" and file != "clock.py":
-            # remove any numeric prefix such as "4_" from filenames like "4_jam.py"
-            base_name = file[:-3]
-            while base_name and base_name[0].isdigit():
-                base_name = base_name[1:]
-            if base_name.startswith("_"):
-                base_name = base_name[1:]
-
-            # convert the filename from "something_or_other" to "Something Or Other"
-            title = " ".join([v[:1].upper() + v[1:] for v in base_name.split("_")])
-
-            applications.append(
-                {
-                    "file": file,
-                    "title": title
-                }
-            )
-
-    # sort the application list alphabetically by title and return the list
-    return applications
+# --- Rainbow background ---
+# The menu background is a grid of cells whose hue depends on their diagonal
+# (x + y) and on time.  Each diagonal gets its own palette entry, so the grid
+# is drawn once and animated by rotating colours through those entries.
+GRID_SIZE = 40
+GRID_COLUMNS = 320 // GRID_SIZE
+GRID_ROWS = 240 // GRID_SIZE
+DIAGONALS = GRID_COLUMNS + GRID_ROWS - 1
+HUE_STEPS = 50  # the hue wraps around every 50 steps
+HUE_STEPS_PER_SECOND = 5
+
+# --- Task periods ---
+MENU_FPS = 30
+INPUT_PERIOD_MS = 20
+SETTINGS_PERIOD_MS = 500
+# Scroll easing time constant; matches the old "1/5 of the way per frame" at ~40 fps
+SCROLL_TIME_CONSTANT_MS = 110
+
+
+def build_hue_table() -> list[tuple[int, int, int]]:
+    # Precompute every colour the background can show, so no float maths per frame
+    return [hsv_to_rgb(step / HUE_STEPS, 0.5, 1) for step in range(HUE_STEPS)]
+
+
+def draw_background_grid(display, diagonal_pens: list[int]) -> None:
+    for y in range(GRID_ROWS):
+        for x in range(GRID_COLUMNS):
+            display.set_pen(diagonal_pens[x + y])
+            display.rectangle(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
+
+
+def rotate_background_palette(display, diagonal_pens: list[int], hue_table: list, hue_step: int) -> None:
+    for diagonal, pen in enumerate(diagonal_pens):
+        r, g, b = hue_table[(diagonal + hue_step) % HUE_STEPS]
+        display.update_pen(pen, r, g, b)
+
+
+# --- Application manifest ---
+# The launcher's app list is kept in /apps.json so boots don't have to
+# re-derive titles and ordering.  It is rebuilt only when the set of app
+# files on the badge changes; entries for files that are still present are
+# kept as they are, so titles or icons edited in the file survive a rebuild.
+APPS_FILE = "/apps.json"
+SYSTEM_FILES = ("main.py", "settings.py", "clock.py")
+UNNUMBERED_ORDER = 1000  # apps without a numeric prefix sort after numbered ones
+
+
+def describe_application(file: str) -> dict:
+    # split a numeric prefix such as "4_" from filenames like "4_jam.py" into a sort order
+    base_name = file[:-3]
+    digits = ""
+    while base_name and base_name[0].isdigit():
+        digits += base_name[0]
+        base_name = base_name[1:]
+    if base_name.startswith("_"):
+        base_name = base_name[1:]
+
+    # convert the filename from "something_or_other" to "Something Or Other"
+    title = " ".join([v[:1].upper() + v[1:] for v in base_name.split("_")])
+
+    return {
+        "file": file,
+        "title": title,
+        "order": int(digits) if digits else UNNUMBERED_ORDER,
+        "icon": ""
+    }
+
+
+def list_application_files() -> list[str]:
+    return sorted(f for f in listdir() if f.endswith(".py") and f not in SYSTEM_FILES)
 
 
-def prepare_for_launch() -> None:
-    for k in locals().keys():
-        if k not in ("__name__",
-                     "application_file_to_launch",
-                     "gc"):
-            del locals()[k]
-    gc.collect()
-    
+def load_manifest():
+    try:
+        with open(APPS_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(manifest: dict) -> None:
+    # write to a temporary file first so a power cut can't leave half a manifest
+    try:
+        with open(APPS_FILE + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.rename(APPS_FILE + ".tmp", APPS_FILE)
+    except OSError as e:
+        print(f"Error saving app manifest: {e}")
+
+
+def build_manifest(files: list[str], previous) -> dict:
+    known = {}
+    if previous:
+        for application in previous.get("apps", []):
+            known[application["file"]] = application
 
-def menu() -> str:
-    applications = get_applications()
+    applications = [known.get(file) or describe_application(file) for file in files]
+
+    # sort by the numeric prefix first, then alphabetically by title
+    applications.sort(key=lambda a: (a.get("order", UNNUMBERED_ORDER), a["title"]))
+    return {"files": files, "apps": applications}
+
+
+def get_applications() -> list[dict[str, str]]:
+    # fetch the list of applications, rebuilding the manifest if the files changed
+    files = list_application_files()
+    manifest = load_manifest()
+    if manifest is None or manifest.get("files") != files:
+        manifest = build_manifest(files, manifest)
+        save_manifest(manifest)
+
+    # moods from /moods.json are listed alongside the apps, but shown by the mood engine
+    applications = list(manifest["apps"])
+    for index, mood in enumerate(mood_engine.load_moods()):
+        applications.append({"file": mood_engine.MOODS_FILE, "title": mood["title"], "mood": index,
+                             "order": mood.get("order", UNNUMBERED_ORDER)})
+    applications.sort(key=lambda a: (a.get("order", UNNUMBERED_ORDER), a["title"]))
+    return applications
 
-    button_up = Button(22, invert=False)
-    button_down = Button(6, invert=False)
-    button_a = Button(7, invert=False)
-    button_b = Button(8, invert=False)
-    button_c = Button(9, invert=False)
 
-    display = PicoGraphics(display=DISPLAY_TUFTY_2040, pen_type=PEN_RGB565)
-    display.set_backlight(brightness)
+# --- Menu state ---
+# Kept at module level so returning from an app resumes the menu as it was
+selected_item = 2
+scroll_position = 2
+target_scroll_position = 2
+hue_table = build_hue_table()
+# (display generation, selected, unselected, shadow, diagonal pens); P8 pens
+# use up palette slots, so they are only created once per display
+menu_pens = None
+# Time taken by each full redraw of the menu
+frame_section = profiler.section("menu frame")
+# When the last app exited, for measuring how long the menu took to come back
+returned_at = None
+return_latencies = []
+
+
+def create_menu_pens(display) -> tuple:
+    return (
+        app_context.generation,
+        display.create_pen(255, 255, 255),
+        display.create_pen(80, 80, 100),
+        display.create_pen(0, 0, 0),
+        [display.create_pen(*hue_table[d % HUE_STEPS]) for d in range(DIAGONALS)],
+    )
+
+
+def menu() -> dict:
+    global menu_pens
+
+    # 8-bit palette mode: the background animates by changing palette entries
+    display = app_context.get_display(PEN_P8)
+    display.set_backlight(badge_settings.brightness())
     WIDTH, HEIGHT = display.get_bounds()
 
-    selected_item = 2
-    scroll_position = 2
-    target_scroll_position = 2
+    if menu_pens is None or menu_pens[0] != app_context.generation:
+        menu_pens = create_menu_pens(display)
+    _, selected_pen, unselected_pen, shadow_pen, diagonal_pens = menu_pens
 
-    selected_pen = display.create_pen(255, 255, 255)
-    unselected_pen = display.create_pen(80, 80, 100)
-    background_pen = display.create_pen(50, 50, 70)
-    shadow_pen = display.create_pen(0, 0, 0)
+    hue_step = None
+    drawn_scroll_position = None
+    last_frame = time.ticks_ms()
+    frames = {"rendered": 0, "palette_only": 0, "skipped": 0}
+    runtime = Runtime()
 
-    while True:
-        t = time.ticks_ms() / 1000.0
+    def handle_input() -> None:
+        global target_scroll_position
+        pressed = button_events.pressed()
 
-        if button_up.read():
+        if pressed == "up":
             target_scroll_position -= 1
             target_scroll_position = target_scroll_position if target_scroll_position >= 0 else len(applications) - 1
 
-        if button_down.read():
+        if pressed == "down":
             target_scroll_position += 1
             target_scroll_position = target_scroll_position if target_scroll_position < len(applications) else 0
 
-        if button_a.read():
-            # Wait for the button to be released.
-            while button_a.is_pressed:
-                time.sleep(0.01)
-
-            return applications[selected_item]["file"]
-
-        if button_b.read():
-            # Wait for the button to be released.
-            while button_b.is_pressed:
-                time.sleep(0.01)
-
-            # Clean up this module
-            #prepare_for_launch()
-            
-            # Return to main menu (import without .py extension)
-            return "settings" 
-
-        if button_c.read():
-            # Wait for the button to be released.
-            while button_c.is_pressed:
-                time.sleep(0.01)
-            
-            # Clean up this module
-            #prepare_for_launch()
-            
-            # Return to main menu (import without .py extension)
-            return "clock" 
-
-        display.set_pen(background_pen)
-        display.clear()
+        if pressed == "a":
+            runtime.stop(applications[selected_item])
+
+        if pressed == "b":
+            runtime.stop({"file": "settings"})
+
+        if pressed == "c":
+            runtime.stop({"file": "clock"})
+
+    def animate() -> None:
+        global selected_item, scroll_position, returned_at
+        nonlocal hue_step, drawn_scroll_position, last_frame
+        now = time.ticks_ms()
+        dt = time.ticks_diff(now, last_frame)
+        last_frame = now
+        t = now / 1000.0
+
+        # Ease towards the target by elapsed time, so the speed doesn't depend on frame rate
+        scroll_position += (target_scroll_position - scroll_position) * (1 - math.exp(-dt / SCROLL_TIME_CONSTANT_MS))
+        if abs(target_scroll_position - scroll_position) < 0.02:
+            # Less than half a pixel away, settle so the list stops redrawing
+            scroll_position = target_scroll_position
+
+        # Animate the background by rotating the palette, no redraw needed
+        step = int(t * HUE_STEPS_PER_SECOND)
+        hue_changed = step != hue_step
+        if hue_changed:
+            hue_step = step
+            rotate_background_palette(display, diagonal_pens, hue_table, hue_step)
+
+        # Only repaint the grid and list when the list has actually moved
+        if scroll_position == drawn_scroll_position:
+            if hue_changed:
+                profiler.overlay(display)
+                display.update()
+                frames["palette_only"] += 1
+            else:
+                frames["skipped"] += 1
+            return
+        drawn_scroll_position = scroll_position
+
+        frame_section.begin()
+        draw_background_grid(display, diagonal_pens)
         display.set_font("sans")
 
-        scroll_position += (target_scroll_position - scroll_position) / 5
-
-        grid_size = 40
-        for y in range(240 // grid_size):
-            for x in range(320 // grid_size):
-                h = x + y + int(t * 5)
-                h = h / 50.0
-                r, g, b = hsv_to_rgb(h, 0.5, 1)
-
-                display.set_pen(display.create_pen(r, g, b))
-                display.rectangle(x * grid_size, y * grid_size, grid_size, grid_size)
-
         # work out which item is selected (closest to the current scroll position)
         selected_item = round(target_scroll_position)
 
@@ -222,17 +293,94 @@ def menu() -> str:
         display.set_pen(unselected_pen)
         display.set_font("serif")
         display.text("A: Select | B: Settings | C: Clock", 30, HEIGHT - 20, WIDTH, 0.5)
+        profiler.overlay(display)
         display.update()
-
-
-# The application we will be launching. This should be ouronly global, so we can
-# drop everything else.
-application_file_to_launch = menu()
-
-# Run whatever we've set up to.
-# If this fails, we'll exit the script and drop to the REPL, which is
-# fairly reasonable.
-prepare_for_launch()
-__import__(application_file_to_launch)
-
-
+        frame_section.end()
+        frames["rendered"] += 1
+        if returned_at is not None:
+            latency = time.ticks_diff(time.ticks_ms(), returned_at)
+            return_latencies.append(latency)
+            print(f"Back in the menu {latency}ms after the app exited")
+            returned_at = None
+
+    # Input, animation and settings saves each wake only when they're due
+    runtime.every("input", INPUT_PERIOD_MS, handle_input)
+    runtime.every("animation", 1000 // MENU_FPS, animate)
+    runtime.every("settings", SETTINGS_PERIOD_MS, badge_settings.poll)
+    application = runtime.run()
+    print(f"Menu frames: {frames}, tasks: {runtime.stats()}")
+    profiler.dump()
+    return application
+
+
+# --- App lifecycle ---
+# Apps run in-process: importing an app's module runs it, and with
+# app_context.warm set its closing app_context.finish() returns here rather
+# than resetting the badge.  The module is then dropped from sys.modules so
+# its globals (images, atlases, band buffers) can be collected, and the menu
+# resumes with its display, pens and app list already set up.
+# Set to False to go back to resetting the badge after every app.
+WARM_SWITCHING = True
+
+# Log each app's peak heap, GC pauses and largest free block to /memlog.csv
+# as it exits (see lib/mem_telemetry.py).  Costs a few tens of ms per exit.
+MEMORY_TELEMETRY = True
+
+
+def module_name(file: str) -> str:
+    return file[:-3] if file.endswith(".py") else file
+
+
+def launch(file: str) -> None:
+    """Run an app to completion, then unload it"""
+    name = module_name(file)
+    app_context.warm = True
+    if MEMORY_TELEMETRY:
+        mem_telemetry.begin(name)
+    try:
+        __import__(name)
+    except Exception as e:
+        # A broken app shouldn't take the launcher down with it
+        print(f"Error running {name}: {e}")
+    finally:
+        app_context.warm = False
+        # Don't lose settings an app changed but didn't get round to saving
+        badge_settings.flush()
+        if name in sys.modules:
+            del sys.modules[name]
+        if MEMORY_TELEMETRY:
+            mem_telemetry.end()
+        else:
+            gc.collect()
+
+
+applications = get_applications()
+button_events.start()
+
+while True:
+    application = menu()
+
+    if "mood" in application:
+        # Moods are drawn by the mood engine, there's no module to load
+        if MEMORY_TELEMETRY:
+            mem_telemetry.begin("mood")
+        try:
+            mood_engine.show(application["mood"])
+        except Exception as e:
+            # A broken mood shouldn't take the launcher down either
+            print(f"Error showing mood: {e}")
+        finally:
+            if MEMORY_TELEMETRY:
+                mem_telemetry.end()
+            else:
+                gc.collect()
+    elif not WARM_SWITCHING:
+        # Run whatever we've set up to; the app resets the badge when it exits.
+        # If this fails, we'll exit the script and drop to the REPL, which is
+        # fairly reasonable.
+        gc.collect()
+        __import__(module_name(application["file"]))
+        break
+    else:
+        launch(application["file"])
+    returned_at = time.ticks_ms()
@@ -1,23 +1,20 @@
 # Settings menu for Tufty 2040 badge
 # Two pages: Display settings and Clock settings
 
-from picographics import PicoGraphics, DISPLAY_TUFTY_2040, PEN_RGB565
-from pimoroni import Button
-import gc
-import sys
-import time
+from picographics import PEN_RGB565
+import app_context
+import badge_settings
+import button_events
+import mem_telemetry
+import profiler
+from task_runtime import Runtime
+from badge_settings import BACKGROUND_COLORS
+import flags
 import os
-import json
 import machine
 
-def prepare_for_launch() -> None:
-    """Clean up before launching another module"""
-    if 'settings' in sys.modules:
-        del sys.modules['settings']
-    gc.collect()
-
 # --- Display setup ---
-display = PicoGraphics(display=DISPLAY_TUFTY_2040, pen_type=PEN_RGB565)
+display = app_context.get_display(PEN_RGB565)
 display.set_backlight(1.0)
 WIDTH, HEIGHT = display.get_bounds()
 
@@ -40,51 +37,11 @@ CYAN = display.create_pen(33, 177, 255)
 MAGENTA = display.create_pen(255, 33, 140)
 AMETHYST = display.create_pen(156, 89, 209)
 
-# --- Settings file path ---
-SETTINGS_FILE = "/settings.json"
-
-# --- Default settings ---
-DEFAULT_SETTINGS = {
-    "brightness": 1.0,
-    "text_overlay": True,
-    "selected_image": "",
-    "badge_image": True,
-    "clock_image": True,
-    "background_color": "Black"
-}
-
-# --- Load settings from file ---
-def load_settings():
-    """Load settings from JSON file, return defaults if file doesn't exist"""
-    try:
-        # Check if file exists by trying to stat it
-        try:
-            os.stat(SETTINGS_FILE)
-            # File exists, try to read it
-            with open(SETTINGS_FILE, 'r') as f:
-                settings = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                for key in DEFAULT_SETTINGS:
-                    if key not in settings:
-                        settings[key] = DEFAULT_SETTINGS[key]
-                return settings
-        except OSError:
-            # File doesn't exist, return defaults
-            pass
-    except Exception as e:
-        print(f"Error loading settings: {e}")
-    return DEFAULT_SETTINGS.copy()
+draw_section = profiler.section("settings draw")
 
-# --- Save settings to file ---
-def save_settings(settings):
-    """Save settings to JSON file"""
-    try:
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f)
-        return True
-    except Exception as e:
-        print(f"Error saving settings: {e}")
-        return False
+# Keep the backlight in step with the brightness setting
+def apply_brightness(key, value):
+    display.set_backlight(value)
 
 # --- Get list of PNG files in badge folder ---
 def list_png_files(directory: str) -> list:
@@ -92,7 +49,7 @@ def list_png_files(directory: str) -> list:
     try:
         # Check if directory exists by trying to list it
         try:
-            files = [f for f in os.listdir(directory) if f.lower().endswith(".png")]
+            files = [f for f in os.listdir(directory) if f.lower().endswith((".png", ".rle"))]
             files.sort()
             return files
         except OSError:
@@ -102,12 +59,6 @@ def list_png_files(directory: str) -> list:
         print(f"Error listing PNG files: {e}")
         return []
 
-# --- Background color options ---
-BACKGROUND_COLORS = [
-    "Black", "White", "Red", "Orange", "Yellow", "Green", 
-    "Blue", "Indigo", "Violet", "Pink", "Cyan", "Magenta", "Amethyst", "Grey"
-]
-
 # Color name to pen mapping
 COLOR_PENS = {
     "Black": BLACK,
@@ -127,25 +78,20 @@ COLOR_PENS = {
 }
 
 # --- Load current settings ---
-settings = load_settings()
-brightness = round(settings.get("brightness", 1.0), 1)
-text_overlay = settings.get("text_overlay", True)
-selected_image = settings.get("selected_image", "")
-badge_image = settings.get("badge_image", True)
-clock_image = settings.get("clock_image", True)
-background_color = settings.get("background_color", "Black")
-# Ensure background_color is valid
-if background_color not in BACKGROUND_COLORS:
-    background_color = "Black"
-    settings["background_color"] = background_color
-    save_settings(settings)
+brightness = badge_settings.brightness()
+text_overlay = badge_settings.get("text_overlay")
+selected_image = badge_settings.get("selected_image")
+badge_image = badge_settings.get("badge_image")
+clock_image = badge_settings.get("clock_image")
+background_color = badge_settings.get("background_color")
+badge_settings.subscribe("brightness", apply_brightness)
 
 # --- Get RTC for clock settings ---
 rtc = machine.RTC()
 year, month, day, weekday, hour, minute, second, _ = rtc.datetime()
 
-# --- Get list of images ---
-image_files = list_png_files("/badge")
+# --- Get list of images, with the drawn flags after them ---
+image_files = list_png_files("/badge") + flags.names()
 if selected_image and selected_image not in image_files:
     selected_image = image_files[0] if image_files else ""
 elif not selected_image and image_files:
@@ -165,11 +111,9 @@ page2_items = ["Year", "Month", "Day", "Hour", "Minute", "Second"]
 page2_item_count = len(page2_items)
 
 # --- Button setup ---
-button_a = Button(7, invert=False)
-button_b = Button(8, invert=False)
-button_c = Button(9, invert=False)
-button_up = Button(22, invert=False)
-button_down = Button(6, invert=False)
+button_events.start()
+INPUT_PERIOD_MS = 20
+SETTINGS_PERIOD_MS = 250
 
 # --- Helper function to get days in month ---
 def days_in_month(month, year):
@@ -184,6 +128,7 @@ def days_in_month(month, year):
 # --- Draw page 1 (Display settings) ---
 def draw_page1():
     """Draw the display settings page"""
+    draw_section.begin()
     display.set_pen(BLACK)
     display.clear()
     
@@ -251,10 +196,13 @@ def draw_page1():
     display.text("A: Menu | B: Page | C: Select", 20, HEIGHT - 20, WIDTH, 0.6)
     
     display.update()
+    draw_section.end()
+    mem_telemetry.sample()
 
 # --- Draw page 2 (Clock settings) ---
 def draw_page2():
     """Draw the clock settings page"""
+    draw_section.begin()
     display.set_pen(BLACK)
     display.clear()
     
@@ -312,29 +260,26 @@ def draw_page2():
     display.text("A: Menu | B: Page | C: Select", 20, HEIGHT - 20, WIDTH, 0.6)
     
     display.update()
+    draw_section.end()
+    mem_telemetry.sample()
 
 # --- Handle button presses for page 1 ---
-def handle_page1_buttons():
+def handle_page1_buttons(pressed):
     """Handle button presses on page 1"""
-    global brightness, text_overlay, selected_image, badge_image, clock_image, background_color, selected_item, editing, settings
+    global brightness, text_overlay, selected_image, badge_image, clock_image, background_color, selected_item, editing
     
-    if button_c.read():
-        while button_c.is_pressed:
-            time.sleep(0.01)
+    if pressed == "c":
         
         
         if selected_item == 0:  # Text Overlay
             text_overlay = not text_overlay
-            settings["text_overlay"] = text_overlay
-            save_settings(settings)
+            badge_settings.set("text_overlay", text_overlay)
         elif selected_item == 1:  # Badge Image
             badge_image = not badge_image
-            settings["badge_image"] = badge_image
-            save_settings(settings)
+            badge_settings.set("badge_image", badge_image)
         elif selected_item == 2:  # Clock Image
             clock_image = not clock_image
-            settings["clock_image"] = clock_image
-            save_settings(settings)
+            badge_settings.set("clock_image", clock_image)
         elif selected_item == 3:  # Image
             editing = not editing
         elif selected_item == 4:  # Background Color
@@ -344,83 +289,55 @@ def handle_page1_buttons():
     
     if editing:
         if selected_item == 5:  # Brightness
-            if button_up.read():
-                while button_up.is_pressed:
-                    time.sleep(0.01)
+            if pressed == "up":
                 brightness = round(min(1.0, brightness + 0.1), 1)
-                display.set_backlight(brightness)
-                settings["brightness"] = brightness
-                save_settings(settings)
-            if button_down.read():
-                while button_down.is_pressed:
-                    time.sleep(0.01)
+                badge_settings.set("brightness", brightness)
+            if pressed == "down":
                 brightness = round(max(0.4, brightness - 0.1), 1)
-                display.set_backlight(brightness)
-                settings["brightness"] = brightness
-                save_settings(settings)
+                badge_settings.set("brightness", brightness)
         
         elif selected_item == 3:  # Image selection
-            if button_up.read():
-                while button_up.is_pressed:
-                    time.sleep(0.01)
+            if pressed == "up":
                 if image_files:
                     current_idx = image_files.index(selected_image) if selected_image in image_files else 0
                     current_idx = (current_idx - 1) % len(image_files)
                     selected_image = image_files[current_idx]
-                    settings["selected_image"] = selected_image
-                    save_settings(settings)
-            if button_down.read():
-                while button_down.is_pressed:
-                    time.sleep(0.01)
+                    badge_settings.set("selected_image", selected_image)
+            if pressed == "down":
                 if image_files:
                     current_idx = image_files.index(selected_image) if selected_image in image_files else 0
                     current_idx = (current_idx + 1) % len(image_files)
                     selected_image = image_files[current_idx]
-                    settings["selected_image"] = selected_image
-                    save_settings(settings)
+                    badge_settings.set("selected_image", selected_image)
         
         elif selected_item == 4:  # Background Color selection
-            if button_up.read():
-                while button_up.is_pressed:
-                    time.sleep(0.01)
+            if pressed == "up":
                 current_idx = BACKGROUND_COLORS.index(background_color) if background_color in BACKGROUND_COLORS else 0
                 current_idx = (current_idx - 1) % len(BACKGROUND_COLORS)
                 background_color = BACKGROUND_COLORS[current_idx]
-                settings["background_color"] = background_color
-                save_settings(settings)
-            if button_down.read():
-                while button_down.is_pressed:
-                    time.sleep(0.01)
+                badge_settings.set("background_color", background_color)
+            if pressed == "down":
                 current_idx = BACKGROUND_COLORS.index(background_color) if background_color in BACKGROUND_COLORS else 0
                 current_idx = (current_idx + 1) % len(BACKGROUND_COLORS)
                 background_color = BACKGROUND_COLORS[current_idx]
-                settings["background_color"] = background_color
-                save_settings(settings)
+                badge_settings.set("background_color", background_color)
     else:
-        if button_up.read():
-            while button_up.is_pressed:
-                time.sleep(0.01)
+        if pressed == "up":
             selected_item = (selected_item - 1) % page1_item_count
         
-        if button_down.read():
-            while button_down.is_pressed:
-                time.sleep(0.01)
+        if pressed == "down":
             selected_item = (selected_item + 1) % page1_item_count
 
 # --- Handle button presses for page 2 ---
-def handle_page2_buttons():
+def handle_page2_buttons(pressed):
     """Handle button presses on page 2"""
     global year, month, day, hour, minute, second, selected_item, editing
     
-    if button_c.read():
-        while button_c.is_pressed:
-            time.sleep(0.01)
+    if pressed == "c":
         editing = not editing
     
     if editing:
-        if button_up.read():
-            while button_up.is_pressed:
-                time.sleep(0.01)
+        if pressed == "up":
             
             if selected_item == 0:  # Year
                 year += 1
@@ -446,9 +363,7 @@ def handle_page2_buttons():
             elif selected_item == 5:  # Second
                 second = (second + 1) % 60
         
-        if button_down.read():
-            while button_down.is_pressed:
-                time.sleep(0.01)
+        if pressed == "down":
             
             if selected_item == 0:  # Year
                 year -= 1
@@ -474,14 +389,10 @@ def handle_page2_buttons():
             elif selected_item == 5:  # Second
                 second = (second - 1) % 60
     else:
-        if button_up.read():
-            while button_up.is_pressed:
-                time.sleep(0.01)
+        if pressed == "up":
             selected_item = (selected_item - 1) % page2_item_count
         
-        if button_down.read():
-            while button_down.is_pressed:
-                time.sleep(0.01)
+        if pressed == "down":
             selected_item = (selected_item + 1) % page2_item_count
 
 # --- Main loop ---
@@ -494,29 +405,31 @@ if current_page == 1:
 else:
     draw_page2()
 
-while True:
-    time.sleep(0.01)
-    
+def handle_input():
+    """Act on the next button press, if there is one"""
+    global current_page, selected_item, editing, year, month, day, weekday, hour, minute, second
+    pressed = button_events.pressed()
+
     # Button A: Back to menu
-    if button_a.read():
-        while button_a.is_pressed:
-            time.sleep(0.01)
+    if pressed == "a":
         
         # Save clock settings to RTC before exiting
         if current_page == 2:
             rtc.datetime((year, month, day, weekday, hour, minute, second, 0))
-        
-        prepare_for_launch()
-        break
+
+        # Write out any settings changes that are still pending
+        badge_settings.flush()
+        runtime.stop()
+        return
     
     # Button B: Toggle between pages
-    if button_b.read():
-        while button_b.is_pressed:
-            time.sleep(0.01)
+    if pressed == "b":
         
         # Save clock settings when leaving page 2
         if current_page == 2:
             rtc.datetime((year, month, day, weekday, hour, minute, second, 0))
+        else:
+            badge_settings.flush()
         
         current_page = 2 if current_page == 1 else 1
         selected_item = 0
@@ -528,15 +441,28 @@ while True:
             # Refresh RTC values when entering page 2
             year, month, day, weekday, hour, minute, second, _ = rtc.datetime()
             draw_page2()
-    
-    # Handle page-specific buttons
-    if current_page == 1:
-        handle_page1_buttons()
+        return
+
+    # Handle page-specific buttons, redrawing only when one was pressed
+    if pressed and current_page == 1:
+        handle_page1_buttons(pressed)
         draw_page1()
-    else:
-        handle_page2_buttons()
+    elif pressed:
+        handle_page2_buttons(pressed)
         draw_page2()
 
-# Return to main menu
-import machine
-machine.reset()
+
+# Buttons are handled every INPUT_PERIOD_MS, and settings are saved once the
+# buttons have been left alone for a moment
+runtime = Runtime()
+runtime.every("input", INPUT_PERIOD_MS, handle_input)
+runtime.every("settings", SETTINGS_PERIOD_MS, badge_settings.poll)
+runtime.run()
+print(f"Settings tasks: {runtime.stats()}")
+
+badge_settings.unsubscribe(apply_brightness)
+print(f"Settings saves: {badge_settings.stats}")
+profiler.dump()
+
+# Back to the launcher (or reset the badge when run on its own)
+app_context.finish()
@@ -0,0 +1,654 @@
+# Host-side simulator core for the Tufty 2040 badge apps.
+#
+# The stand-in modules in this folder (picographics, pngdec, pimoroni,
+# machine) all talk to the single Device created here.  The device owns:
+#
+#   * a virtual clock that only moves when the app sleeps or calls an API
+#     whose cost is modelled (see COSTS), so runs are deterministic,
+#   * a scripted input timeline for the five Tufty buttons,
+#   * a flash root on the host that absolute paths such as "/badge/x.png"
+#     are mapped into,
+#   * the metrics collected while an app runs (frames, decodes, I/O, heap).
+
+import builtins
+import gc
+import importlib.machinery
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SIM_DIR)
+
+# --- Button pins on the Tufty 2040 ---
+BUTTON_PINS = {
+    "a": 7,
+    "b": 8,
+    "c": 9,
+    "up": 22,
+    "down": 6,
+}
+
+# --- Approximate RP2040 @ 133 MHz costs, in microseconds ---
+# These are a model, not a measurement: they make a frame that fills more
+# pixels or decodes more PNG data take proportionally more virtual time, so
+# two versions of an app can be compared deterministically.
+COSTS = {
+    "call": 8.0,             # any Python-level call into a native module
+    "time_query": 15.0,      # time.ticks_ms() / time.localtime()
+    "fill_pixel": 0.025,     # rectangle/clear, per pixel
+    "draw_pixel": 0.05,      # lines, triangles, circles, per pixel
+    "glyph": 45.0,           # vector glyph rasterisation, per glyph per unit scale
+    "png_pixel": 2.5,        # pngdec inflate + unfilter + convert, per pixel
+    "png_byte": 0.4,         # pngdec reading compressed data, per byte
+    "update_byte": 0.1,      # parallel bus transfer to the ST7789, per byte
+    "blit_byte": 0.004,      # memcpy into the framebuffer, per byte
+    "flash_read_byte": 0.35,
+    "flash_write_byte": 3.0,
+    "flash_op": 2000.0,      # open/close/rename/remove metadata update
+    "import_byte": 8.0,      # compiling a .py module from source, per byte
+    "boot": 600000.0,        # machine.reset() until main.py starts: bootrom, VM init, mount
+}
+
+# Notional MicroPython heap size used for gc.mem_free()/gc.mem_alloc().
+HEAP_SIZE = 192 * 1024
+
+
+class DeviceReset(BaseException):
+    """Raised by machine.reset() so the harness can end or reboot the run"""
+
+
+class ScriptFinished(BaseException):
+    """Raised once the virtual clock runs past the end of the input script"""
+
+
+# --- Virtual clock ---
+class VirtualClock:
+    def __init__(self, start_epoch: int = 1767225600) -> None:
+        # 2026-01-01 00:00:00, the RTC value the badge boots with in the sim
+        self.us = 0
+        self.epoch = start_epoch
+        self.limit_us = None
+
+    def advance_us(self, us: float) -> None:
+        self.us += int(us)
+        if self.limit_us is not None and self.us > self.limit_us:
+            raise ScriptFinished()
+
+    def ticks_ms(self) -> int:
+        return (self.us // 1000) & 0x3FFFFFFF
+
+    def ticks_us(self) -> int:
+        return self.us & 0x3FFFFFFF
+
+    def seconds(self) -> float:
+        return self.epoch + self.us / 1000000
+
+
+# --- Scripted input ---
+class InputScript:
+    """Timeline of button presses: [{"at": ms, "button": "a", "hold": ms}]"""
+
+    def __init__(self, events=None, duration_ms=None) -> None:
+        self.presses = {}
+        end = 0
+        for event in events or []:
+            button = event["button"]
+            pin = BUTTON_PINS[button] if isinstance(button, str) else int(button)
+            at = int(event["at"])
+            hold = int(event.get("hold", 100))
+            self.presses.setdefault(pin, []).append((at, at + hold))
+            end = max(end, at + hold)
+        for spans in self.presses.values():
+            spans.sort()
+        self.duration_ms = duration_ms if duration_ms is not None else end + 1000
+
+    @classmethod
+    def load(cls, path: str) -> "InputScript":
+        with open(path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return cls(data)
+        return cls(data.get("events", []), data.get("duration"))
+
+    @classmethod
+    def parse(cls, specs, duration_ms=None) -> "InputScript":
+        """Build a script from CLI specs such as "a@1500" or "down@200+50" """
+        events = []
+        for spec in specs:
+            button, _, rest = spec.partition("@")
+            at, _, hold = rest.partition("+")
+            events.append({"button": button, "at": int(at), "hold": int(hold or 100)})
+        return cls(events, duration_ms)
+
+    def is_pressed(self, pin: int, now_ms: int) -> bool:
+        for start, end in self.presses.get(pin, ()):
+            if start <= now_ms < end:
+                return True
+            if start > now_ms:
+                break
+        return False
+
+    def next_edge(self, after_ms: int):
+        """Time of the next press or release after `after_ms`, or None"""
+        best = None
+        for spans in self.presses.values():
+            for start, end in spans:
+                for edge in (start, end):
+                    if edge > after_ms and (best is None or edge < best):
+                        best = edge
+        return best
+
+
+# --- Metrics ---
+class Metrics:
+    def __init__(self) -> None:
+        self.frames = []
+        self.decodes = []
+        self.counters = {
+            "calls": 0,
+            "pixels_filled": 0,
+            "pixels_drawn": 0,
+            "glyphs": 0,
+            "flash_read_bytes": 0,
+            "flash_write_bytes": 0,
+            "flash_writes": 0,
+            "flash_ops": 0,
+        }
+        self.events = []
+        self.last_frame_us = 0
+        self.last_frame_host = time.perf_counter()
+        self.last_frame_alloc = 0
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> dict:
+        def stats(values):
+            if not values:
+                return None
+            ordered = sorted(values)
+            return {
+                "n": len(ordered),
+                "min": round(ordered[0], 3),
+                "mean": round(sum(ordered) / len(ordered), 3),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                "max": round(ordered[-1], 3),
+            }
+
+        return {
+            "frames": len(self.frames),
+            "frame_ms": stats([f["frame_ms"] for f in self.frames]),
+            "frame_host_ms": stats([f["host_ms"] for f in self.frames]),
+            "frame_alloc_bytes": stats([f["alloc_bytes"] for f in self.frames]),
+            "decode_ms": stats([d["device_ms"] for d in self.decodes]),
+            "decode_host_ms": stats([d["host_ms"] for d in self.decodes]),
+            "counters": dict(self.counters),
+        }
+
+
+# --- Device ---
+class Device:
+    def __init__(self, root: str, script: InputScript = None, heap_size: int = HEAP_SIZE) -> None:
+        self.root = os.path.abspath(root)
+        self.clock = VirtualClock()
+        self.script = script or InputScript()
+        self.metrics = Metrics()
+        self.heap_size = heap_size
+        self.heap_base = 0
+        self.displays = []
+        self.irq_pins = []
+        self.screenshot_dir = None
+        self.alloc_peak = 0
+        # (app, clock us) of the last app exit, until the next frame is shown
+        self.exit_mark = None
+        self.current_app = None
+
+    # --- cost accounting ---
+    def charge(self, us: float) -> None:
+        self.metrics.count("calls")
+        target = self.clock.us + int(COSTS["call"] + us)
+        if self.irq_pins:
+            # A hard IRQ interrupts the operation at each edge crossed on the
+            # way, so its handler sees the time of the edge.  A soft IRQ is
+            # only scheduled, and runs once the operation returns, as
+            # MicroPython's scheduler only runs between bytecodes
+            while True:
+                edge = self.script.next_edge(self.now_ms())
+                if edge is None or edge * 1000 > target:
+                    break
+                self.clock.advance_us(edge * 1000 - self.clock.us)
+                self.fire_irqs(defer=True)
+        self.clock.advance_us(max(0, target - self.clock.us))
+        for pin in list(self.irq_pins):
+            if pin.scheduled:
+                pin.run_scheduled()
+
+    def now_ms(self) -> int:
+        return self.clock.us // 1000
+
+    # --- input ---
+    def pin_value(self, pin: int) -> int:
+        return 1 if self.script.is_pressed(pin, self.now_ms()) else 0
+
+    def sleep_us(self, us: float, wake_on_input: bool = False) -> None:
+        """Advance the clock, firing pin IRQs for any edges crossed on the way"""
+        target = self.clock.us + int(us)
+        self.metrics.count("sleep_us", max(0, int(us)))
+        while True:
+            edge = self.script.next_edge(self.now_ms())
+            if edge is None or edge * 1000 > target:
+                break
+            self.clock.advance_us(edge * 1000 - self.clock.us)
+            if self.fire_irqs() and wake_on_input:
+                return
+        self.clock.advance_us(max(0, target - self.clock.us))
+
+    def fire_irqs(self, defer: bool = False) -> bool:
+        fired = False
+        for pin in self.irq_pins:
+            fired = pin.poll_irq(defer) or fired
+        return fired
+
+    # --- filesystem ---
+    def host_path(self, path) -> str:
+        path = os.fspath(path)
+        if path.startswith(self.root):
+            return path
+        if path.startswith("/"):
+            return os.path.join(self.root, path.lstrip("/"))
+        return os.path.join(self.root, path)
+
+    # --- heap ---
+    def mem_alloc(self) -> int:
+        current, _ = tracemalloc.get_traced_memory()
+        return max(0, current - self.heap_base)
+
+    def mem_free(self) -> int:
+        return max(0, self.heap_size - self.mem_alloc())
+
+    # --- frames ---
+    def record_frame(self, display) -> None:
+        now_host = time.perf_counter()
+        metrics = self.metrics
+        alloc = self.mem_alloc()
+        metrics.frames.append({
+            "t_ms": round(self.clock.us / 1000, 3),
+            "frame_ms": round((self.clock.us - metrics.last_frame_us) / 1000, 3),
+            "host_ms": round((now_host - metrics.last_frame_host) * 1000, 3),
+            "alloc_bytes": alloc - metrics.last_frame_alloc,
+            "mem_free": self.mem_free(),
+        })
+        metrics.last_frame_us = self.clock.us
+        metrics.last_frame_host = now_host
+        metrics.last_frame_alloc = alloc
+        if self.exit_mark:
+            app, exit_us = self.exit_mark
+            metrics.events.append({"event": "return_frame", "after": app, "t_ms": self.now_ms(),
+                                   "latency_ms": round((self.clock.us - exit_us) / 1000, 3)})
+            self.exit_mark = None
+        if self.screenshot_dir:
+            # Keep the screenshot's own temporaries out of the app's peak
+            self.alloc_peak = max(self.alloc_peak, tracemalloc.get_traced_memory()[1] - self.heap_base)
+            name = f"frame_{len(metrics.frames):05}.png"
+            display.save_png(os.path.join(self.screenshot_dir, name))
+            tracemalloc.reset_peak()
+
+
+device = None
+
+
+# --- Patching the host so app code sees a MicroPython-like runtime ---
+_saved = {}
+
+
+def _ticks_diff(a: int, b: int) -> int:
+    half = 0x20000000
+    return ((a - b + half) & 0x3FFFFFFF) - half
+
+
+def _ticks_add(a: int, delta: int) -> int:
+    return (a + delta) & 0x3FFFFFFF
+
+
+def _sleep(seconds: float) -> None:
+    device.sleep_us(seconds * 1000000)
+
+
+def _sleep_ms(ms: int) -> None:
+    device.sleep_us(ms * 1000)
+
+
+def _sleep_us(us: int) -> None:
+    device.sleep_us(us)
+
+
+def _ticks_ms() -> int:
+    device.clock.advance_us(COSTS["time_query"])
+    return device.clock.ticks_ms()
+
+
+def _ticks_us() -> int:
+    device.clock.advance_us(COSTS["time_query"])
+    return device.clock.ticks_us()
+
+
+def _localtime(secs=None):
+    if secs is None:
+        device.clock.advance_us(COSTS["time_query"])
+        secs = device.clock.seconds()
+    t = _saved["time.gmtime"](int(secs))
+    # MicroPython returns an 8-tuple: (year, month, mday, hour, minute, second, weekday, yearday)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+
+def _time():
+    device.clock.advance_us(COSTS["time_query"])
+    return int(device.clock.seconds())
+
+
+class _SimFile:
+    """File wrapper that charges flash costs against the virtual clock"""
+
+    def __init__(self, f) -> None:
+        self._f = f
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        device.metrics.count("flash_read_bytes", len(data))
+        device.charge(len(data) * COSTS["flash_read_byte"])
+        return data
+
+    def readinto(self, buf):
+        n = self._f.readinto(buf)
+        device.metrics.count("flash_read_bytes", n or 0)
+        device.charge((n or 0) * COSTS["flash_read_byte"])
+        return n
+
+    def readline(self, *args):
+        data = self._f.readline(*args)
+        device.charge(len(data) * COSTS["flash_read_byte"])
+        return data
+
+    def write(self, data):
+        n = self._f.write(data)
+        device.metrics.count("flash_write_bytes", len(data))
+        device.charge(len(data) * COSTS["flash_write_byte"])
+        return n
+
+    def close(self):
+        if not self._f.closed and ("w" in self._f.mode or "a" in self._f.mode or "+" in self._f.mode):
+            device.metrics.count("flash_writes")
+        device.charge(COSTS["flash_op"])
+        return self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def _open(file, mode="r", *args, **kwargs):
+    if isinstance(file, int):
+        return _saved["open"](file, mode, *args, **kwargs)
+    device.metrics.count("flash_ops")
+    device.charge(COSTS["flash_op"])
+    return _SimFile(_saved["open"](device.host_path(file), mode, *args, **kwargs))
+
+
+def _wrap_path_fn(name: str):
+    fn = _saved["os." + name]
+
+    def wrapped(path=".", *args, **kwargs):
+        device.metrics.count("flash_ops")
+        device.charge(COSTS["flash_op"] if name in ("remove", "rename", "mkdir", "rmdir") else 0)
+        return fn(device.host_path(path), *args, **kwargs)
+
+    return wrapped
+
+
+def _rename(src, dst):
+    device.metrics.count("flash_ops")
+    device.charge(COSTS["flash_op"])
+    return _saved["os.replace"](device.host_path(src), device.host_path(dst))
+
+
+def _statvfs(path="/"):
+    # littlefs on the Tufty 2040: 4 KiB blocks, 1 MiB of user flash
+    used = 0
+    for dirpath, _, files in os.walk(device.root):
+        for name in files:
+            used += _saved["os.stat"](os.path.join(dirpath, name)).st_size
+    blocks = 256
+    free = max(0, blocks - (used + 4095) // 4096)
+    return (4096, 4096, blocks, free, free, 0, 0, 0, 0, 255)
+
+
+def _ilistdir(path="."):
+    for name in _saved["os.listdir"](device.host_path(path)):
+        full = os.path.join(device.host_path(path), name)
+        kind = 0x4000 if os.path.isdir(full) else 0x8000
+        yield (name, kind, 0, _saved["os.stat"](full).st_size)
+
+
+def install(dev: Device) -> None:
+    """Point the stand-in modules at `dev` and patch time/gc/os/open"""
+    global device
+    device = dev
+    if _saved:
+        return
+    for name in ("sleep", "localtime", "time", "gmtime"):
+        _saved["time." + name] = getattr(time, name)
+    for name in ("stat", "listdir", "remove", "mkdir", "rmdir", "rename", "replace"):
+        _saved["os." + name] = getattr(os, name)
+    _saved["open"] = builtins.open
+
+    time.sleep = _sleep
+    time.sleep_ms = _sleep_ms
+    time.sleep_us = _sleep_us
+    time.ticks_ms = _ticks_ms
+    time.ticks_us = _ticks_us
+    time.ticks_cpu = _ticks_us
+    time.ticks_diff = _ticks_diff
+    time.ticks_add = _ticks_add
+    time.localtime = _localtime
+    time.time = _time
+    gc.mem_free = lambda: device.mem_free()
+    gc.mem_alloc = lambda: device.mem_alloc()
+    for name in ("stat", "listdir", "remove", "mkdir", "rmdir"):
+        setattr(os, name, _wrap_path_fn(name))
+    os.rename = _rename
+    os.statvfs = _statvfs
+    os.ilistdir = _ilistdir
+    builtins.open = _open
+
+
+def uninstall() -> None:
+    if not _saved:
+        return
+    for key, value in _saved.items():
+        if key == "open":
+            builtins.open = value
+            continue
+        module, name = key.split(".")
+        setattr(time if module == "time" else os, name, value)
+    for name in ("sleep_ms", "sleep_us", "ticks_ms", "ticks_us", "ticks_cpu", "ticks_diff", "ticks_add"):
+        if hasattr(time, name):
+            delattr(time, name)
+    for name in ("mem_free", "mem_alloc"):
+        if hasattr(gc, name):
+            delattr(gc, name)
+    for name in ("statvfs", "ilistdir"):
+        if hasattr(os, name) and name not in _saved:
+            delattr(os, name)
+    _saved.clear()
+
+
+# --- Imports from flash ---
+class _FlashLoader(importlib.machinery.SourceFileLoader):
+    """Charges the compile time MicroPython spends on a .py module from flash"""
+
+    def exec_module(self, module):
+        size = len(self.get_data(self.path))
+        device.metrics.count("import_bytes", size)
+        device.charge(size * COSTS["import_byte"])
+        is_app = os.path.dirname(self.path) == device.root and self.name != "main"
+        if is_app:
+            device.current_app = self.name
+        super().exec_module(module)
+        if is_app:
+            # The app ran to the end, i.e. it returned to the launcher
+            device.exit_mark = (self.name, device.clock.us)
+            device.current_app = None
+
+
+class _FlashFinder:
+    @classmethod
+    def find_spec(cls, name, path=None, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(name, path)
+        if spec is None or not isinstance(spec.loader, importlib.machinery.SourceFileLoader):
+            return spec
+        if not spec.origin.startswith(device.root):
+            return spec
+        spec.loader = _FlashLoader(name, spec.origin)
+        return spec
+
+
+# --- Flash image ---
+FLASH_SKIP = {".git", "sim", "tools", "bench", "__pycache__", ".pytest_cache"}
+
+
+def make_flash(src: str = REPO_DIR) -> str:
+    """Copy the app tree into a temporary flash root, so runs never touch the repo"""
+    root = tempfile.mkdtemp(prefix="badge_flash_")
+    for name in os.listdir(src):
+        if name in FLASH_SKIP or name.startswith("."):
+            continue
+        path = os.path.join(src, name)
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(root, name), ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            shutil.copy2(path, os.path.join(root, name))
+    return root
+
+
+# --- Running an app ---
+def _forget_app_modules(root: str) -> None:
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if path.startswith(root):
+            del sys.modules[name]
+
+
+def run_app(app: str, root: str = None, script: InputScript = None, follow_resets: bool = False,
+            max_resets: int = 8, heap_size: int = HEAP_SIZE, screenshot_dir: str = None,
+            profile: bool = False) -> dict:
+    """Run `app` (e.g. "clock" or "main") against the simulator and return its metrics.
+
+    With `profile`, the app's profiler sections are turned on and their
+    summaries returned under "sections".  The returned dict is
+    JSON-serialisable apart from the "device" entry, which keeps the Device
+    (and its displays) around for inspection after the run.
+    """
+    root = root or make_flash()
+    if os.path.isfile(app) and not os.path.abspath(app).startswith(os.path.abspath(root)):
+        # A script from outside the flash, e.g. a benchmark: copy it onto the root
+        shutil.copy(app, root)
+        app = os.path.basename(app)
+    script = script or InputScript()
+    dev = Device(root, script, heap_size)
+    dev.clock.limit_us = script.duration_ms * 1000
+    dev.screenshot_dir = screenshot_dir
+    if screenshot_dir:
+        os.makedirs(screenshot_dir, exist_ok=True)
+
+    module = app[:-3] if app.endswith(".py") else app
+    saved_path = list(sys.path)
+    saved_cwd = os.getcwd()
+    for path in (SIM_DIR, os.path.join(root, "lib"), root):
+        sys.path.insert(0, path)
+    os.chdir(root)
+    # Import the stand-ins (and NumPy) up front so they don't count as app heap
+    for name in ("picographics", "pngdec", "pimoroni", "machine"):
+        __import__(name)
+    tracemalloc.start()
+    install(dev)
+    sys.meta_path.insert(0, _FlashFinder)
+    dev.heap_base = tracemalloc.get_traced_memory()[0]
+    resets = 0
+    outcome = "exited"
+    sections = {}
+    settings_stats = None
+    host_start = time.perf_counter()
+    try:
+        while True:
+            _forget_app_modules(root)
+            if profile:
+                __import__("profiler").enable()
+            dev.metrics.events.append({"event": "started", "app": module, "t_ms": dev.now_ms()})
+            try:
+                import_start = time.perf_counter()
+                boot_us = dev.clock.us
+                __import__(module)
+                dev.metrics.events.append({"event": "returned", "t_ms": dev.now_ms()})
+                break
+            except DeviceReset:
+                resets += 1
+                dev.metrics.events.append({"event": "reset", "t_ms": dev.now_ms(),
+                                           "uptime_ms": (dev.clock.us - boot_us) // 1000,
+                                           "host_ms": round((time.perf_counter() - import_start) * 1000, 3)})
+                if not follow_resets or resets > max_resets:
+                    outcome = "reset"
+                    break
+                app_name = dev.current_app or (module if module != "main" else None)
+                if app_name:
+                    dev.exit_mark = (app_name, dev.clock.us)
+                dev.current_app = None
+                dev.charge(COSTS["boot"])
+                module = "main"
+    except ScriptFinished:
+        outcome = "script_finished"
+    finally:
+        peak = max(dev.alloc_peak, tracemalloc.get_traced_memory()[1] - dev.heap_base)
+        # Read what the app's own modules measured before they're unloaded
+        if profile and "profiler" in sys.modules:
+            for section in sys.modules["profiler"]._sections:
+                sections[section.name] = section.summary()
+        if "badge_settings" in sys.modules:
+            settings_stats = dict(sys.modules["badge_settings"].stats)
+        sys.meta_path.remove(_FlashFinder)
+        uninstall()
+        tracemalloc.stop()
+        os.chdir(saved_cwd)
+        sys.path[:] = saved_path
+        _forget_app_modules(root)
+        # The uasyncio stand-in's task queue belongs to this run
+        sys.modules.pop("uasyncio", None)
+
+    result = {
+        "app": app,
+        "outcome": outcome,
+        "resets": resets,
+        "virtual_ms": round(dev.clock.us / 1000, 3),
+        "host_ms": round((time.perf_counter() - host_start) * 1000, 3),
+        "alloc_peak_bytes": peak,
+        "summary": dev.metrics.summary(),
+        "frames": dev.metrics.frames,
+        "decodes": dev.metrics.decodes,
+        "events": dev.metrics.events,
+        "sections": sections,
+        "settings_stats": settings_stats,
+    }
+    result["device"] = dev
+    return result
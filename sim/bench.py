@@ -0,0 +1,229 @@
+# Benchmark suite: every app under a fixed input script on the simulator.
+#
+#   python sim/bench.py --out before.json
+#   ... change something ...
+#   python sim/bench.py --out after.json --baseline before.json
+#   python sim/bench.py --compare before.json after.json
+#
+# The scenarios (app, input script, duration, any settings to start from
+# and any files to copy within the flash first, as {"to": "from"}) are in
+# sim/scripts/bench_suite.json.  Each runs on a fresh copy of the repo with
+# the apps' profiler sections turned on, and records:
+#
+#   cold_start_ms      virtual time from importing the app to its first frame
+#   import_bytes       source compiled on the way
+#   <section>.mean_us  profiler sections: menu frame, clock tick, settings
+#   <section>.p95_us   draw, badge show/decode and so on
+#   decode_mean_ms     PNG decodes, as modelled by the pngdec stand-in
+#   decode_max_ms
+#   settings_load_ms   badge_settings.stats, where the app loaded them
+#   settings_save_ms
+#   flash_write_bytes
+#   alloc_peak_bytes   host heap high-water mark (tracemalloc)
+#   <app>.peak_alloc_bytes  for apps run by the launcher, the peak
+#                      mem_telemetry logged while the app ran
+#
+# When the launcher runs an app, mem_telemetry's trial allocations on exit
+# fill the heap, so alloc_peak_bytes only says much about scenarios that
+# run an app directly; the per-app peaks cover the rest.
+#
+# Every metric is "lower is better".  The times are the simulator's virtual
+# time, so repeated runs of the same tree give the same numbers, and a
+# comparison only flags real changes.  A metric regresses when it grows by
+# more than its threshold percentage *and* its absolute floor (THRESHOLDS);
+# --compare and --baseline exit with status 1 if anything regressed.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import badge_sim  # noqa: E402
+
+SUITE_FILE = os.path.join(badge_sim.SIM_DIR, "scripts", "bench_suite.json")
+
+# Metric name suffix: (percent, absolute floor) a rise must pass to regress
+THRESHOLDS = {
+    "_ms": (5.0, 0.5),
+    "_us": (5.0, 500),
+    "_bytes": (10.0, 1024),
+}
+
+
+def load_suite(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=badge_sim.REPO_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cold_start_ms(result: dict):
+    """Virtual ms from the first import of the app to its first frame"""
+    started = next((e["t_ms"] for e in result["events"] if e["event"] == "started"), 0)
+    if not result["frames"]:
+        return None
+    return round(result["frames"][0]["t_ms"] - started, 3)
+
+
+def metrics_of(result: dict) -> dict:
+    summary = result["summary"]
+    counters = summary["counters"]
+    metrics = {
+        "cold_start_ms": cold_start_ms(result),
+        "import_bytes": counters.get("import_bytes", 0),
+        "flash_write_bytes": counters.get("flash_write_bytes", 0),
+        "alloc_peak_bytes": result["alloc_peak_bytes"],
+    }
+    for name, s in result["sections"].items():
+        if s["n"]:
+            metrics[f"{name}.mean_us"] = s["mean_us"]
+            metrics[f"{name}.p95_us"] = s["p95_us"]
+    if summary["decode_ms"]:
+        metrics["decode_mean_ms"] = summary["decode_ms"]["mean"]
+        metrics["decode_max_ms"] = summary["decode_ms"]["max"]
+    stats = result["settings_stats"]
+    if stats:
+        metrics["settings_load_ms"] = stats["load_ms"]
+        if stats["saves"]:
+            metrics["settings_save_ms"] = stats["max_save_ms"]
+    return {k: v for k, v in metrics.items() if v is not None}
+
+
+def logged_peaks(root: str) -> dict:
+    """Highest peak_alloc mem_telemetry logged for each app during the run"""
+    peaks = {}
+    try:
+        with open(os.path.join(root, "memlog.csv"), "r") as f:
+            for line in f:
+                fields = line.strip().split(",")
+                if len(fields) == 7 and fields[1].isdigit():
+                    key = f"{fields[0]}.peak_alloc_bytes"
+                    peaks[key] = max(peaks.get(key, 0), int(fields[1]))
+    except OSError:
+        pass
+    return peaks
+
+
+def run_scenario(scenario: dict, heap: int) -> dict:
+    script = badge_sim.InputScript(scenario.get("events", []), scenario.get("duration"))
+    root = badge_sim.make_flash()
+    try:
+        if "settings" in scenario:
+            path = os.path.join(root, "settings.json")
+            with open(path, "r") as f:
+                settings = json.load(f)
+            settings.update(scenario["settings"])
+            with open(path, "w") as f:
+                json.dump(settings, f)
+        for dest, src in scenario.get("files", {}).items():
+            shutil.copy(os.path.join(root, src), os.path.join(root, dest))
+        result = badge_sim.run_app(scenario["app"], root=root, script=script, heap_size=heap, profile=True)
+        result.pop("device")
+        metrics = metrics_of(result)
+        metrics.update(logged_peaks(root))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "app": scenario["app"],
+        "outcome": result["outcome"],
+        "metrics": metrics,
+        "info": {
+            "frames": result["summary"]["frames"],
+            "virtual_ms": result["virtual_ms"],
+            "host_ms": result["host_ms"],
+        },
+    }
+
+
+def run_suite(suite: dict, only=None) -> dict:
+    heap = suite.get("heap", badge_sim.HEAP_SIZE)
+    results = {"revision": git_revision(), "python": sys.version.split()[0], "heap": heap, "scenarios": {}}
+    for scenario in suite["scenarios"]:
+        if only and scenario["name"] not in only:
+            continue
+        print(f"--- {scenario['name']} ({scenario['app']})")
+        entry = results["scenarios"][scenario["name"]] = run_scenario(scenario, heap)
+        for key, value in entry["metrics"].items():
+            print(f"  {key:28} {value}")
+    return results
+
+
+def threshold(metric: str, thresholds: dict):
+    for suffix, limits in thresholds.items():
+        if metric.endswith(suffix):
+            return limits
+    return (5.0, 0)
+
+
+def compare(old: dict, new: dict, percent: float = None) -> list:
+    """Print old vs new for every metric both runs have; return the regressions"""
+    thresholds = THRESHOLDS if percent is None else {k: (percent, v[1]) for k, v in THRESHOLDS.items()}
+    regressions = []
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    for name, entry in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if before is None:
+            print(f"--- {name}: no baseline")
+            continue
+        print(f"--- {name}")
+        for metric, value in entry["metrics"].items():
+            was = before["metrics"].get(metric)
+            if was is None:
+                print(f"  {metric:28} {value} (new)")
+                continue
+            pct, floor = threshold(metric, thresholds)
+            change = value - was
+            relative = 100 * change / was if was else (0.0 if not change else 100.0)
+            mark = ""
+            if change > floor and relative > pct:
+                mark = "  REGRESSION"
+                regressions.append((name, metric, was, value))
+            elif -change > floor and -relative > pct:
+                mark = "  improved"
+            print(f"  {metric:28} {was} -> {value} ({relative:+.1f}%){mark}")
+    if regressions:
+        print(f"{len(regressions)} regression(s)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the badge benchmark suite on the host simulator")
+    parser.add_argument("--suite", default=SUITE_FILE, help="scenario file (default: sim/scripts/bench_suite.json)")
+    parser.add_argument("--only", action="append", help="run just this scenario, repeatable")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare this run against an earlier results file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files, run nothing")
+    parser.add_argument("--threshold", type=float, help="regression threshold in percent for every metric")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], "r") as f:
+            old = json.load(f)
+        with open(args.compare[1], "r") as f:
+            new = json.load(f)
+        return 1 if compare(old, new, args.threshold) else 0
+
+    results = run_suite(load_suite(args.suite), args.only)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            old = json.load(f)
+        return 1 if compare(old, results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# Host stand-in for the MicroPython machine module on the RP2040.
+
+import calendar
+
+import badge_sim
+
+
+def reset() -> None:
+    raise badge_sim.DeviceReset()
+
+
+def soft_reset() -> None:
+    raise badge_sim.DeviceReset()
+
+
+def freq(hz: int = None) -> int:
+    return 125000000
+
+
+def idle() -> None:
+    badge_sim.device.sleep_us(1)
+
+
+def lightsleep(ms: int = None) -> None:
+    """Sleep until `ms` elapses or a pin IRQ fires, like the RP2040's dormant wait"""
+    if ms is None:
+        ms = 1 << 30
+    badge_sim.device.sleep_us(ms * 1000, wake_on_input=True)
+
+
+def deepsleep(ms: int = None) -> None:
+    lightsleep(ms)
+    reset()
+
+
+def unique_id() -> bytes:
+    return b"SIMBADGE"
+
+
+_irq_state = 0
+
+# Soft IRQ handlers MicroPython's scheduler can hold at once (MICROPY_SCHEDULER_DEPTH)
+SCHEDULER_DEPTH = 4
+
+_UNSET = object()
+
+
+def disable_irq() -> int:
+    global _irq_state
+    _irq_state += 1
+    return _irq_state - 1
+
+
+def enable_irq(state: int = 0) -> None:
+    global _irq_state
+    _irq_state = state
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, pin: int, mode: int = IN, pull: int = None, value: int = None) -> None:
+        self.pin = pin
+        self.mode = mode
+        self.out_value = value or 0
+        self.handler = None
+        self.trigger = 0
+        self.hard = False
+        self.last = 0
+        self.irq_flags = 0
+        self.scheduled = 0
+
+    def value(self, v: int = None):
+        if v is not None:
+            self.out_value = v
+            return None
+        badge_sim.device.charge(0)
+        if self.mode == Pin.OUT:
+            return self.out_value
+        return badge_sim.device.pin_value(self.pin)
+
+    def __call__(self, v: int = None):
+        return self.value(v)
+
+    def on(self) -> None:
+        self.out_value = 1
+
+    def off(self) -> None:
+        self.out_value = 0
+
+    def irq(self, handler=_UNSET, trigger: int = IRQ_FALLING | IRQ_RISING, hard: bool = False):
+        if handler is _UNSET:
+            # pin.irq() with no arguments just returns the IRQ object
+            return self
+        device = badge_sim.device
+        self.handler = handler
+        self.trigger = trigger
+        self.hard = hard
+        self.scheduled = 0
+        self.last = device.pin_value(self.pin)
+        if handler is None:
+            if self in device.irq_pins:
+                device.irq_pins.remove(self)
+        elif self not in device.irq_pins:
+            device.irq_pins.append(self)
+        return self
+
+    def flags(self) -> int:
+        """The edge that triggered the last IRQ, as on the IRQ object"""
+        return self.irq_flags
+
+    def poll_irq(self, defer: bool = False) -> bool:
+        """Called by the simulator when time passes; fires the handler on a matching edge.
+
+        With `defer` (the edge came in the middle of a native call), a soft
+        IRQ is only scheduled: it runs from run_scheduled() once the call
+        returns, and reads the pin as it is then.  Hard IRQs always run at
+        the edge.
+        """
+        now = badge_sim.device.pin_value(self.pin)
+        if now == self.last:
+            return False
+        self.last = now
+        edge = Pin.IRQ_RISING if now else Pin.IRQ_FALLING
+        if self.handler is None or not self.trigger & edge or _irq_state:
+            return False
+        self.irq_flags = edge
+        if defer and not self.hard:
+            if self.scheduled < SCHEDULER_DEPTH:
+                self.scheduled += 1
+            return True
+        self.handler(self)
+        return True
+
+    def run_scheduled(self) -> None:
+        """Run the soft IRQ handlers scheduled while a native call was in progress"""
+        while self.scheduled:
+            self.scheduled -= 1
+            if self.handler is not None:
+                self.handler(self)
+
+
+class RTC:
+    def datetime(self, value: tuple = None):
+        clock = badge_sim.device.clock
+        if value is not None:
+            year, month, day, _, hour, minute, second, _ = value
+            target = calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+            clock.epoch = target - clock.us / 1000000
+            return None
+        t = badge_sim._localtime(clock.seconds())
+        year, month, day, hour, minute, second, weekday, _ = t
+        return (year, month, day, weekday, hour, minute, second, 0)
@@ -0,0 +1,331 @@
+# Host stand-in for Pimoroni's picographics module (Tufty 2040 only).
+#
+# The framebuffer is a bytearray laid out exactly like the device's (RGB565
+# big-endian, RGB332 or 8-bit palette indices), so memoryview(display) and
+# file.readinto(memoryview(display)) behave as they do on the badge.  A NumPy
+# view of the same memory (display.pixels) does the actual drawing.
+
+import struct
+import zlib
+
+import numpy as np
+
+import badge_sim
+
+DISPLAY_TUFTY_2040 = 5
+
+PEN_1BIT = 0
+PEN_P4 = 2
+PEN_P8 = 3
+PEN_RGB332 = 4
+PEN_RGB565 = 5
+PEN_RGB888 = 6
+
+WIDTH, HEIGHT = 320, 240
+
+# Approximate advance widths of the Hershey "sans"/"serif" glyphs, in pixels
+# at scale 1.  Anything not listed uses DEFAULT_ADVANCE.
+HERSHEY_ADVANCE = {" ": 16, ":": 10, ".": 10, ",": 10, "/": 22, "|": 8, "!": 10, "'": 8, "-": 18}
+HERSHEY_ADVANCE.update({c: 20 for c in "0123456789"})
+HERSHEY_ADVANCE.update({c: 19 for c in "abcdefghijklmnopqrstuvwxyz"})
+HERSHEY_ADVANCE.update({c: 21 for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"})
+DEFAULT_ADVANCE = 20
+HERSHEY_HEIGHT = 21
+
+BITMAP_FONTS = {"bitmap6": (6, 6), "bitmap8": (6, 8), "bitmap14_outline": (10, 14)}
+VECTOR_FONTS = ("sans", "serif", "gothic", "cursive", "serif_italic", "sans_bold")
+
+# A 3x5 block font so simulated text is legible in screenshots.  Each glyph
+# is five rows of three bits, most significant bit on the left.
+GLYPHS = {
+    "0": (7, 5, 5, 5, 7), "1": (2, 6, 2, 2, 7), "2": (7, 1, 7, 4, 7), "3": (7, 1, 7, 1, 7),
+    "4": (5, 5, 7, 1, 1), "5": (7, 4, 7, 1, 7), "6": (7, 4, 7, 5, 7), "7": (7, 1, 1, 1, 1),
+    "8": (7, 5, 7, 5, 7), "9": (7, 5, 7, 1, 7), ":": (0, 2, 0, 2, 0), "/": (1, 1, 2, 4, 4),
+    "A": (2, 5, 7, 5, 5), "B": (6, 5, 6, 5, 6), "C": (7, 4, 4, 4, 7), "D": (6, 5, 5, 5, 6),
+    "E": (7, 4, 6, 4, 7), "F": (7, 4, 6, 4, 4), "G": (7, 4, 5, 5, 7), "H": (5, 5, 7, 5, 5),
+    "I": (7, 2, 2, 2, 7), "J": (1, 1, 1, 5, 7), "K": (5, 5, 6, 5, 5), "L": (4, 4, 4, 4, 7),
+    "M": (5, 7, 7, 5, 5), "N": (6, 5, 5, 5, 5), "O": (7, 5, 5, 5, 7), "P": (7, 5, 7, 4, 4),
+    "Q": (7, 5, 5, 7, 1), "R": (7, 5, 6, 5, 5), "S": (7, 4, 7, 1, 7), "T": (7, 2, 2, 2, 2),
+    "U": (5, 5, 5, 5, 7), "V": (5, 5, 5, 5, 2), "W": (5, 5, 7, 7, 5), "X": (5, 5, 2, 5, 5),
+    "Y": (5, 5, 2, 2, 2), "Z": (7, 1, 2, 4, 7), "-": (0, 0, 7, 0, 0), ".": (0, 0, 0, 0, 2),
+    "|": (2, 2, 2, 2, 2), "%": (5, 1, 2, 4, 5), "!": (2, 2, 2, 0, 2), "?": (7, 1, 3, 0, 2),
+}
+BLOCK_GLYPH = (7, 5, 5, 5, 7)
+
+
+def rgb_to_rgb565(r: int, g: int, b: int) -> int:
+    return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+
+
+def rgb565_to_rgb(p: int) -> tuple:
+    r = (p >> 11) & 0x1F
+    g = (p >> 5) & 0x3F
+    b = p & 0x1F
+    return (r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)
+
+
+def rgb_to_rgb332(r: int, g: int, b: int) -> int:
+    return (r & 0xE0) | ((g & 0xE0) >> 3) | (b >> 6)
+
+
+def rgb332_to_rgb(p: int) -> tuple:
+    r = p & 0xE0
+    g = (p << 3) & 0xE0
+    b = (p << 6) & 0xC0
+    return r | (r >> 3) | (r >> 6), g | (g >> 3) | (g >> 6), b | (b >> 2) | (b >> 4) | (b >> 6)
+
+
+class PicoGraphics(bytearray):
+    """Framebuffer-backed PicoGraphics subset used by the badge apps"""
+
+    def __init__(self, display=DISPLAY_TUFTY_2040, pen_type=PEN_RGB565, rotate=0, **kwargs) -> None:
+        if display != DISPLAY_TUFTY_2040:
+            raise ValueError("only DISPLAY_TUFTY_2040 is simulated")
+        if pen_type not in (PEN_RGB565, PEN_RGB332, PEN_P8, PEN_P4):
+            raise ValueError(f"unsupported pen_type {pen_type}")
+        self.pen_type = pen_type
+        bpp = 16 if pen_type == PEN_RGB565 else 8
+        bytearray.__init__(self, WIDTH * HEIGHT * bpp // 8)
+        dtype = ">u2" if pen_type == PEN_RGB565 else np.uint8
+        # NumPy view over our own bytes: drawing through it updates the buffer
+        self.pixels = np.frombuffer(self, dtype=dtype).reshape(HEIGHT, WIDTH)
+        self.palette = [(0, 0, 0)] * (16 if pen_type == PEN_P4 else 256)
+        self.palette_used = 0
+        self.palette_reserved = [False] * len(self.palette)
+        self.pen = 0
+        self.font = "bitmap8"
+        self.thickness = 1
+        self.backlight = 1.0
+        self.clip = (0, 0, WIDTH, HEIGHT)
+        self.device = badge_sim.device
+        # Only the newest display is kept alive for inspection, so a framebuffer
+        # the app has dropped is freed (and leaves the heap figures) as on the badge
+        self.device.displays[:] = [self]
+        self.device.charge(0)
+
+    # --- pens ---
+    def create_pen(self, r: int, g: int, b: int) -> int:
+        self.device.charge(0)
+        r, g, b = int(r) & 0xFF, int(g) & 0xFF, int(b) & 0xFF
+        if self.pen_type == PEN_RGB565:
+            return rgb_to_rgb565(r, g, b)
+        if self.pen_type == PEN_RGB332:
+            return rgb_to_rgb332(r, g, b)
+        # Paletted: reserve the next free slot, as PicoGraphics_PenP8 does
+        for i in range(len(self.palette)):
+            if not self.palette_reserved[i]:
+                self.palette_reserved[i] = True
+                self.palette[i] = (r, g, b)
+                self.palette_used = max(self.palette_used, i + 1)
+                return i
+        return -1
+
+    def create_pen_hsv(self, h: float, s: float, v: float) -> int:
+        import colorsys
+        r, g, b = colorsys.hsv_to_rgb(h % 1.0, s, v)
+        return self.create_pen(int(r * 255), int(g * 255), int(b * 255))
+
+    def update_pen(self, index: int, r: int, g: int, b: int) -> None:
+        self.device.charge(0)
+        if self.pen_type in (PEN_P8, PEN_P4):
+            self.palette[index] = (int(r) & 0xFF, int(g) & 0xFF, int(b) & 0xFF)
+
+    def reset_pen(self, index: int) -> None:
+        self.device.charge(0)
+        if self.pen_type in (PEN_P8, PEN_P4):
+            self.palette[index] = (0, 0, 0)
+            self.palette_reserved[index] = False
+
+    def set_palette(self, palette) -> None:
+        self.device.charge(0)
+        for i, colour in enumerate(palette):
+            self.palette[i] = tuple(colour)
+            self.palette_reserved[i] = True
+        self.palette_used = max(self.palette_used, len(palette))
+
+    def set_pen(self, pen: int) -> None:
+        self.device.charge(0)
+        self.pen = int(pen)
+
+    def set_backlight(self, brightness: float) -> None:
+        self.device.charge(0)
+        self.backlight = brightness
+
+    def set_font(self, font: str) -> None:
+        self.device.charge(0)
+        if font not in BITMAP_FONTS and font not in VECTOR_FONTS:
+            raise ValueError(f"unknown font {font}")
+        self.font = font
+
+    def set_thickness(self, thickness: int) -> None:
+        self.device.charge(0)
+        self.thickness = max(1, int(thickness))
+
+    def get_bounds(self) -> tuple:
+        return WIDTH, HEIGHT
+
+    # --- clipping ---
+    def set_clip(self, x: int, y: int, w: int, h: int) -> None:
+        self.device.charge(0)
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(WIDTH, int(x) + int(w)), min(HEIGHT, int(y) + int(h))
+        self.clip = (x0, y0, max(x0, x1), max(y0, y1))
+
+    def remove_clip(self) -> None:
+        self.device.charge(0)
+        self.clip = (0, 0, WIDTH, HEIGHT)
+
+    def _fill(self, x0: int, y0: int, x1: int, y1: int, cost: str = "fill_pixel") -> int:
+        cx0, cy0, cx1, cy1 = self.clip
+        x0, y0 = max(x0, cx0), max(y0, cy0)
+        x1, y1 = min(x1, cx1), min(y1, cy1)
+        if x1 <= x0 or y1 <= y0:
+            return 0
+        self.pixels[y0:y1, x0:x1] = self.pen
+        return (x1 - x0) * (y1 - y0)
+
+    # --- primitives ---
+    def clear(self) -> None:
+        n = self._fill(0, 0, WIDTH, HEIGHT)
+        self.device.metrics.count("pixels_filled", n)
+        self.device.charge(n * badge_sim.COSTS["fill_pixel"])
+
+    def rectangle(self, x: int, y: int, w: int, h: int) -> None:
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        n = self._fill(x, y, x + w, y + h)
+        self.device.metrics.count("pixels_filled", n)
+        self.device.charge(n * badge_sim.COSTS["fill_pixel"])
+
+    def pixel(self, x: int, y: int) -> None:
+        n = self._fill(int(x), int(y), int(x) + 1, int(y) + 1)
+        self.device.metrics.count("pixels_drawn", n)
+        self.device.charge(n * badge_sim.COSTS["draw_pixel"])
+
+    def pixel_span(self, x: int, y: int, length: int) -> None:
+        n = self._fill(int(x), int(y), int(x) + int(length), int(y) + 1)
+        self.device.metrics.count("pixels_filled", n)
+        self.device.charge(n * badge_sim.COSTS["fill_pixel"])
+
+    def line(self, x1: int, y1: int, x2: int, y2: int, thickness: int = 1) -> None:
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+        n = 0
+        half = int(thickness) // 2
+        for i in range(steps + 1):
+            x = x1 + (x2 - x1) * i // steps
+            y = y1 + (y2 - y1) * i // steps
+            n += self._fill(x - half, y - half, x - half + int(thickness), y - half + int(thickness))
+        self.device.metrics.count("pixels_drawn", n)
+        self.device.charge(n * badge_sim.COSTS["draw_pixel"])
+
+    def circle(self, x: int, y: int, r: int) -> None:
+        x, y, r = int(x), int(y), int(r)
+        n = 0
+        for dy in range(-r, r + 1):
+            dx = int((r * r - dy * dy) ** 0.5)
+            n += self._fill(x - dx, y + dy, x + dx + 1, y + dy + 1)
+        self.device.metrics.count("pixels_drawn", n)
+        self.device.charge(n * badge_sim.COSTS["draw_pixel"])
+
+    def polygon(self, points) -> None:
+        points = [(int(px), int(py)) for px, py in points]
+        if len(points) < 3:
+            return
+        ys = [p[1] for p in points]
+        n = 0
+        for y in range(max(min(ys), self.clip[1]), min(max(ys) + 1, self.clip[3])):
+            # Scanline fill sampling pixel centres, the same rule PicoGraphics uses
+            xs = []
+            sy = y + 0.5
+            for i in range(len(points)):
+                ax, ay = points[i]
+                bx, by = points[(i + 1) % len(points)]
+                if (ay <= sy < by) or (by <= sy < ay):
+                    xs.append(ax + (sy - ay) * (bx - ax) / (by - ay))
+            xs.sort()
+            for i in range(0, len(xs) - 1, 2):
+                n += self._fill(int(round(xs[i])), y, int(round(xs[i + 1])), y + 1)
+        self.device.metrics.count("pixels_drawn", n)
+        self.device.charge(n * badge_sim.COSTS["draw_pixel"])
+
+    def triangle(self, x1: int, y1: int, x2: int, y2: int, x3: int, y3: int) -> None:
+        self.polygon(((x1, y1), (x2, y2), (x3, y3)))
+
+    # --- text ---
+    def _advance(self, char: str, scale: float, spacing: int = 1) -> float:
+        if self.font in BITMAP_FONTS:
+            return (BITMAP_FONTS[self.font][0] + spacing - 1) * max(1, int(scale))
+        return HERSHEY_ADVANCE.get(char, DEFAULT_ADVANCE) * scale
+
+    def measure_text(self, text: str, scale: float = 2, spacing: int = 1, fixed_width: bool = False) -> int:
+        self.device.charge(len(text) * 2)
+        return int(sum(self._advance(c, scale, spacing) for c in text))
+
+    def text(self, text: str, x: int, y: int, wordwrap: int = -1, scale: float = 2, angle: int = 0,
+             spacing: int = 1, fixed_width: bool = False) -> None:
+        if self.font in BITMAP_FONTS:
+            # Bitmap fonts take their top-left corner at (x, y)
+            glyph_h = BITMAP_FONTS[self.font][1] * max(1, int(scale))
+            top = int(y)
+        else:
+            # Hershey glyphs are positioned around their vertical centre
+            glyph_h = HERSHEY_HEIGHT * scale
+            top = int(y - glyph_h / 2)
+        cursor = float(x)
+        drawn = 0
+        glyphs = 0
+        for char in str(text):
+            advance = self._advance(char, scale, spacing)
+            if char != " ":
+                glyphs += 1
+                drawn += self._glyph(char, int(cursor), top, advance, glyph_h)
+            cursor += advance
+        self.device.metrics.count("glyphs", glyphs)
+        self.device.metrics.count("pixels_drawn", drawn)
+        unit = 1 if self.font in BITMAP_FONTS else max(1.0, scale)
+        self.device.charge(glyphs * badge_sim.COSTS["glyph"] * unit + drawn * badge_sim.COSTS["draw_pixel"])
+
+    def _glyph(self, char: str, x: int, top: int, advance: float, height: float) -> int:
+        rows = GLYPHS.get(char.upper(), BLOCK_GLYPH)
+        cell_w = max(1, int(advance * 0.7) // 3)
+        cell_h = max(1, int(height) // 5)
+        n = 0
+        for row, bits in enumerate(rows):
+            for col in range(3):
+                if bits & (4 >> col):
+                    px = x + col * cell_w
+                    py = top + row * cell_h
+                    n += self._fill(px, py, px + cell_w, py + cell_h)
+        return n
+
+    # --- output ---
+    def update(self) -> None:
+        # The panel is always fed RGB565; other pen types are converted on the way out
+        self.device.charge(WIDTH * HEIGHT * 2 * badge_sim.COSTS["update_byte"])
+        self.device.record_frame(self)
+
+    def to_rgb(self) -> np.ndarray:
+        """Return the framebuffer as an HxWx3 uint8 array"""
+        if self.pen_type == PEN_RGB565:
+            p = self.pixels.astype(np.uint16)
+            r = (p >> 11) & 0x1F
+            g = (p >> 5) & 0x3F
+            b = p & 0x1F
+            return np.dstack(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2))).astype(np.uint8)
+        if self.pen_type == PEN_RGB332:
+            lut = np.array([rgb332_to_rgb(i) for i in range(256)], dtype=np.uint8)
+        else:
+            lut = np.array(self.palette + [(0, 0, 0)] * (256 - len(self.palette)), dtype=np.uint8)
+        return lut[self.pixels]
+
+    def save_png(self, path: str) -> None:
+        """Write the current frame to a host PNG (screenshots from the simulator)"""
+        rgb = self.to_rgb()
+        raw = b"".join(b"\x00" + rgb[y].tobytes() for y in range(HEIGHT))
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        header = struct.pack(">IIBBBBB", WIDTH, HEIGHT, 8, 2, 0, 0, 0)
+        with badge_sim._saved.get("open", open)(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
@@ -0,0 +1,56 @@
+# Host stand-in for the parts of Pimoroni's pimoroni module the badge uses.
+#
+# Buttons read the scripted input timeline from badge_sim, with the same
+# press/repeat behaviour as the C++ Button class: read() is true once on the
+# press edge, then again every repeat_time ms after hold_time ms.
+
+import badge_sim
+
+
+class Button:
+    def __init__(self, pin: int, invert: bool = True, repeat_time: int = 200, hold_time: int = 1000) -> None:
+        self.pin = pin
+        self.invert = invert
+        self.repeat_time = repeat_time
+        self.hold_time = hold_time
+        self.last_state = False
+        self.pressed_time = 0
+        self.last_time = 0
+
+    def raw(self) -> bool:
+        badge_sim.device.charge(0)
+        return badge_sim.device.pin_value(self.pin) == 1
+
+    @property
+    def is_pressed(self) -> bool:
+        return self.raw()
+
+    def read(self) -> bool:
+        device = badge_sim.device
+        device.charge(0)
+        now = device.now_ms()
+        state = device.pin_value(self.pin) == 1
+        changed = state != self.last_state
+        self.last_state = state
+
+        if changed:
+            if state:
+                self.pressed_time = now
+                self.last_time = now
+                return True
+            return False
+
+        if state and self.repeat_time and now - self.pressed_time > self.hold_time:
+            if now - self.last_time > self.repeat_time:
+                self.last_time = now
+                return True
+        return False
+
+
+class Analog:
+    def __init__(self, pin: int, amplifier_gain: float = 1, resistor: float = 0, offset: float = 0) -> None:
+        self.pin = pin
+
+    def read_voltage(self) -> float:
+        badge_sim.device.charge(0)
+        return 4.0
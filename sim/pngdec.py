@@ -0,0 +1,205 @@
+# Host stand-in for Pimoroni's pngdec module.
+#
+# Decodes 8-bit greyscale/RGB/RGBA/paletted PNGs (and 1/2/4-bit palettes)
+# into a simulated PicoGraphics framebuffer.  Decode time on the badge is
+# modelled from the pixel and compressed-byte counts and charged to the
+# virtual clock; host time is recorded alongside it.
+
+import struct
+import time
+import zlib
+
+import numpy as np
+
+import badge_sim
+from picographics import PEN_P4, PEN_P8, PEN_RGB332, PEN_RGB565, rgb_to_rgb332
+
+PNG_NORMAL = 0
+PNG_POSTERISE = 1
+PNG_DITHER = 2
+PNG_COPY = 3
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def _paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def unfilter(raw: bytes, width: int, height: int, bpp: int, row_bytes: int) -> np.ndarray:
+    """Undo PNG scanline filters, returning a height x row_bytes uint8 array"""
+    out = np.zeros((height, row_bytes), dtype=np.uint8)
+    prev = np.zeros(row_bytes, dtype=np.int32)
+    pos = 0
+    for y in range(height):
+        kind = raw[pos]
+        line = np.frombuffer(raw, dtype=np.uint8, count=row_bytes, offset=pos + 1).astype(np.int32)
+        pos += row_bytes + 1
+        if kind == 0:
+            cur = line
+        elif kind == 1:
+            # Sub: a running sum per channel, which cumsum does in one pass
+            padded = np.zeros(((row_bytes + bpp - 1) // bpp) * bpp, dtype=np.int32)
+            padded[:row_bytes] = line
+            cur = (np.cumsum(padded.reshape(-1, bpp), axis=0).reshape(-1)[:row_bytes]) & 0xFF
+        elif kind == 2:
+            cur = (line + prev) & 0xFF
+        elif kind == 3:
+            cur = line.copy()
+            for i in range(row_bytes):
+                left = cur[i - bpp] if i >= bpp else 0
+                cur[i] = (cur[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            cur = line.copy()
+            up = prev.tolist()
+            vals = cur.tolist()
+            for i in range(row_bytes):
+                a = vals[i - bpp] if i >= bpp else 0
+                c = up[i - bpp] if i >= bpp else 0
+                vals[i] = (vals[i] + _paeth(a, up[i], c)) & 0xFF
+            cur = np.array(vals, dtype=np.int32)
+        else:
+            raise ValueError(f"bad PNG filter {kind}")
+        out[y] = cur
+        prev = cur
+    return out
+
+
+class PNG:
+    def __init__(self, display) -> None:
+        self.display = display
+        self.data = None
+        self.width = 0
+        self.height = 0
+        self.header = None
+
+    def open_file(self, path: str) -> None:
+        with open(path, "rb") as f:
+            data = f.read()
+        self.open_RAM(data)
+
+    def open_RAM(self, data) -> None:
+        data = bytes(data)
+        if data[:8] != PNG_SIGNATURE:
+            raise OSError("not a PNG file")
+        self.data = data
+        self.width, self.height, depth, colour, _, _, interlace = struct.unpack(">IIBBBBB", data[16:29])
+        if interlace:
+            raise OSError("interlaced PNGs are not supported")
+        self.header = (depth, colour)
+        badge_sim.device.charge(0)
+
+    def get_width(self) -> int:
+        return self.width
+
+    def get_height(self) -> int:
+        return self.height
+
+    def _chunks(self):
+        pos = 8
+        while pos < len(self.data):
+            length, kind = struct.unpack(">I4s", self.data[pos:pos + 8])
+            yield kind, self.data[pos + 8:pos + 8 + length]
+            pos += length + 12
+
+    def decode_rgba(self) -> np.ndarray:
+        """Decode the open PNG to an HxWx4 uint8 array (host helper, not device API)"""
+        depth, colour = self.header
+        palette = None
+        trns = None
+        idat = []
+        for kind, body in self._chunks():
+            if kind == b"PLTE":
+                palette = np.frombuffer(body, dtype=np.uint8).reshape(-1, 3)
+            elif kind == b"tRNS":
+                trns = body
+            elif kind == b"IDAT":
+                idat.append(body)
+        raw = zlib.decompress(b"".join(idat))
+        channels = CHANNELS[colour]
+        if depth == 8:
+            bpp = channels
+            rows = unfilter(raw, self.width, self.height, bpp, self.width * channels)
+            px = rows.reshape(self.height, self.width, channels)
+        elif colour in (0, 3) and depth in (1, 2, 4):
+            row_bytes = (self.width * depth + 7) // 8
+            rows = unfilter(raw, self.width, self.height, 1, row_bytes)
+            bits = np.unpackbits(rows, axis=1).reshape(self.height, -1, depth)
+            weights = 1 << np.arange(depth - 1, -1, -1)
+            px = (bits * weights).sum(axis=2)[:, :self.width].astype(np.uint8)[:, :, None]
+            if colour == 0:
+                px = (px * (255 // ((1 << depth) - 1))).astype(np.uint8)
+        else:
+            raise OSError(f"unsupported PNG format depth={depth} colour={colour}")
+
+        rgba = np.full((self.height, self.width, 4), 255, dtype=np.uint8)
+        if colour == 0:
+            rgba[:, :, :3] = px[:, :, :1]
+        elif colour == 2:
+            rgba[:, :, :3] = px
+        elif colour == 3:
+            idx = px[:, :, 0]
+            rgba[:, :, :3] = palette[idx]
+            if trns is not None:
+                alpha = np.full(256, 255, dtype=np.uint8)
+                alpha[:len(trns)] = np.frombuffer(trns, dtype=np.uint8)
+                rgba[:, :, 3] = alpha[idx]
+        elif colour == 4:
+            rgba[:, :, :3] = px[:, :, :1]
+            rgba[:, :, 3] = px[:, :, 1]
+        elif colour == 6:
+            rgba[:] = px
+        return rgba
+
+    def decode(self, x: int = 0, y: int = 0, scale=1, mode: int = PNG_NORMAL, source=None, palette_offset: int = 0) -> None:
+        if self.data is None:
+            raise OSError("no PNG open")
+        host_start = time.perf_counter()
+        device_start = badge_sim.device.clock.us
+        rgba = self.decode_rgba()
+        if isinstance(scale, tuple):
+            sx, sy = scale
+        else:
+            sx = sy = int(scale)
+        if sx > 1 or sy > 1:
+            rgba = rgba.repeat(sy, axis=0).repeat(sx, axis=1)
+        self._blit(rgba, int(x), int(y))
+        badge_sim.device.charge(self.width * self.height * badge_sim.COSTS["png_pixel"]
+                                + len(self.data) * badge_sim.COSTS["png_byte"])
+        badge_sim.device.metrics.decodes.append({
+            "size": [self.width, self.height],
+            "bytes": len(self.data),
+            "device_ms": round((badge_sim.device.clock.us - device_start) / 1000, 3),
+            "host_ms": round((time.perf_counter() - host_start) * 1000, 3),
+        })
+
+    def _blit(self, rgba: np.ndarray, x: int, y: int) -> None:
+        display = self.display
+        cx0, cy0, cx1, cy1 = display.clip
+        h, w = rgba.shape[:2]
+        x0, y0 = max(x, cx0), max(y, cy0)
+        x1, y1 = min(x + w, cx1), min(y + h, cy1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        src = rgba[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.uint16)
+        r, g, b, a = src[:, :, 0], src[:, :, 1], src[:, :, 2], src[:, :, 3]
+        if display.pen_type == PEN_RGB565:
+            value = ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+        elif display.pen_type == PEN_RGB332:
+            value = (r & 0xE0) | ((g & 0xE0) >> 3) | (b >> 6)
+        elif display.pen_type in (PEN_P8, PEN_P4):
+            # Nearest palette entry, like pngdec's PNG_POSTERISE on paletted buffers
+            pal = np.array(display.palette[:max(1, display.palette_used)], dtype=np.int32)
+            diff = src[:, :, None, :3].astype(np.int32) - pal[None, None, :, :]
+            value = (diff * diff).sum(axis=3).argmin(axis=2)
+        else:
+            value = np.array(rgb_to_rgb332(0, 0, 0))
+        # pngdec skips pixels that are mostly transparent instead of blending
+        target = display.pixels[y0:y1, x0:x1]
+        opaque = a >= 128
+        target[opaque] = value[opaque]
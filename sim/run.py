@@ -0,0 +1,63 @@
+# Run one of the badge apps on the host simulator.
+#
+#   python sim/run.py clock --press a@5000 --duration 6000
+#   python sim/run.py main --script sim/scripts/menu_scroll.json --follow-resets --json out.json
+#
+# Every run works on a throwaway copy of the app tree (the "flash"), so
+# settings saved by the app never touch the repository.
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import badge_sim  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a Tufty 2040 badge app on the host simulator")
+    parser.add_argument("app", help="app module or file, e.g. clock, 4_jam_mood.py or bench/settings_store.py")
+    parser.add_argument("--script", help="JSON input script: [{\"at\": ms, \"button\": \"a\", \"hold\": ms}, ...]")
+    parser.add_argument("--press", action="append", default=[], help="button press as BUTTON@MS[+HOLD], repeatable")
+    parser.add_argument("--duration", type=int, help="virtual milliseconds to run for")
+    parser.add_argument("--follow-resets", action="store_true", help="reboot into main.py on machine.reset()")
+    parser.add_argument("--root", help="flash root to run against (default: a fresh copy of the repo)")
+    parser.add_argument("--heap", type=int, default=badge_sim.HEAP_SIZE, help="notional heap size in bytes")
+    parser.add_argument("--screenshots", help="directory to write a PNG of every frame into")
+    parser.add_argument("--json", help="write the full result as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.script:
+        script = badge_sim.InputScript.load(args.script)
+        if args.duration is not None:
+            script.duration_ms = args.duration
+    else:
+        script = badge_sim.InputScript.parse(args.press, args.duration)
+
+    result = badge_sim.run_app(args.app, root=args.root, script=script, follow_resets=args.follow_resets,
+                               heap_size=args.heap, screenshot_dir=args.screenshots)
+    result.pop("device")
+
+    summary = result["summary"]
+    print(f"{result['app']}: {result['outcome']} after {result['virtual_ms']} virtual ms "
+          f"({result['host_ms']} host ms), {summary['frames']} frames, {result['resets']} resets")
+    for key in ("frame_ms", "frame_host_ms", "frame_alloc_bytes", "decode_ms", "decode_host_ms"):
+        if summary[key]:
+            s = summary[key]
+            print(f"  {key:18} n={s['n']:<5} min={s['min']:<10} mean={s['mean']:<10} p95={s['p95']:<10} max={s['max']}")
+    print(f"  alloc peak         {result['alloc_peak_bytes']} bytes")
+    print("  " + ", ".join(f"{k}={v}" for k, v in summary["counters"].items()))
+    for event in result["events"]:
+        if event["event"] == "return_frame":
+            print(f"  back from {event['after']}: first frame after {event['latency_ms']} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# Host tests for lib/badge_settings.py, run on the simulator:
+#
+#   python -m pytest sim/tests
+
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import badge_sim  # noqa: E402
+
+# Runs on the simulated badge: load the settings cold twice and write down
+# what each load saw and whether a record was kept
+CHECK = """
+import json
+import os
+import badge_settings
+
+seen = []
+for _ in range(2):
+    badge_settings.reload()
+    seen.append(badge_settings.badge_text()["line_1"])
+try:
+    os.stat(badge_settings.STORE_FILE)
+    record = True
+except OSError:
+    record = False
+with open("/check.json", "w") as f:
+    json.dump({"seen": seen, "record": record, "migrations": badge_settings.stats["migrations"]}, f)
+"""
+
+
+@pytest.fixture
+def flash(tmp_path):
+    root = badge_sim.make_flash()
+    script = tmp_path / "check_settings.py"
+    script.write_text(CHECK)
+    yield root, str(script)
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def run_check(root: str, script: str, line_1: str) -> dict:
+    with open(os.path.join(root, "badge_text.json"), "w") as f:
+        json.dump({"line_1": line_1, "line_2": "Descriptor"}, f)
+    result = badge_sim.run_app(script, root=root)
+    assert result["outcome"] == "exited"
+    with open(os.path.join(root, "check.json"), "r") as f:
+        return json.load(f)
+
+
+def test_long_line_reads_back_intact(flash):
+    line_1 = "x" * 70
+    check = run_check(*flash, line_1)
+    assert check["seen"] == [line_1, line_1]
+    assert not check["record"]
+
+
+def test_long_line_drops_an_older_record(flash):
+    root, script = flash
+    run_check(root, script, "Name")
+    check = run_check(root, script, "é" * 35)
+    assert check["seen"] == ["é" * 35] * 2
+    assert not check["record"]
+
+
+def test_short_line_uses_the_record(flash):
+    check = run_check(*flash, "Name")
+    assert check["seen"] == ["Name", "Name"]
+    assert check["record"]
+    assert check["migrations"] == 1
@@ -0,0 +1,181 @@
+# Host stand-in for MicroPython's uasyncio, on the simulator's virtual clock.
+#
+# CPython's asyncio sleeps in real time, which would leave the virtual clock
+# (and so every timing the simulator reports) standing still.  This is the
+# subset of uasyncio the badge code uses: run(), create_task(), sleep(),
+# sleep_ms(), Event and Task.cancel().  Sleeping goes through time.sleep_ms,
+# so pin IRQs fire while every task is waiting, as they do on the badge.
+#
+# As with uasyncio, tasks still waiting when run()'s coroutine finishes stay
+# queued and carry on in the next run().
+
+import heapq
+import time
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class _Sleep:
+    def __init__(self, ms: int) -> None:
+        self.ms = ms
+
+    def __await__(self):
+        yield self
+
+
+def sleep_ms(ms: int) -> _Sleep:
+    return _Sleep(max(0, int(ms)))
+
+
+def sleep(seconds: float) -> _Sleep:
+    return _Sleep(max(0, int(seconds * 1000)))
+
+
+class Task:
+    def __init__(self, coro) -> None:
+        self.coro = coro
+        self.finished = False
+        self.result = None
+        self.exception = None
+        self.joiners = []
+        self.token = 0  # bumped on every reschedule, so stale queue entries are skipped
+        self.throw = None
+
+    def done(self) -> bool:
+        return self.finished
+
+    def cancel(self) -> bool:
+        if self.finished:
+            return False
+        for event in _events:
+            if self in event.waiting:
+                event.waiting.remove(self)
+        _schedule(self, 0, CancelledError())
+        return True
+
+    def __await__(self):
+        if not self.finished:
+            yield self
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+class Event:
+    def __init__(self) -> None:
+        self.state = False
+        self.waiting = []
+        _events.append(self)
+
+    def is_set(self) -> bool:
+        return self.state
+
+    def set(self) -> None:
+        self.state = True
+        for task in self.waiting:
+            _schedule(task, 0)
+        self.waiting = []
+
+    def clear(self) -> None:
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            await _WaitEvent(self)
+        return True
+
+
+class _WaitEvent:
+    def __init__(self, event: Event) -> None:
+        self.event = event
+
+    def __await__(self):
+        yield self
+
+
+_queue = []  # (due ticks_ms, sequence, token, task)
+_sequence = 0
+_events = []
+_current = None
+
+
+def _schedule(task: Task, delay_ms: int, throw: BaseException = None) -> None:
+    global _sequence
+    _sequence += 1
+    task.token += 1
+    task.throw = throw
+    heapq.heappush(_queue, (time.ticks_ms() + delay_ms, _sequence, task.token, task))
+
+
+def _finish(task: Task, result=None, exception: BaseException = None) -> None:
+    task.finished = True
+    task.result = result
+    task.exception = exception
+    for joiner in task.joiners:
+        _schedule(joiner, 0)
+    if exception is not None and not task.joiners and not isinstance(exception, CancelledError):
+        print(f"Task exception wasn't retrieved: {exception!r}")
+
+
+def _step(task: Task) -> None:
+    global _current
+    throw, task.throw = task.throw, None
+    _current = task
+    try:
+        awaited = task.coro.throw(throw) if throw is not None else task.coro.send(None)
+    except StopIteration as e:
+        _finish(task, e.value)
+    except CancelledError as e:
+        _finish(task, exception=e)
+    except Exception as e:
+        _finish(task, exception=e)
+    else:
+        if isinstance(awaited, _Sleep):
+            _schedule(task, awaited.ms)
+        elif isinstance(awaited, _WaitEvent):
+            awaited.event.waiting.append(task)
+        elif isinstance(awaited, Task):
+            awaited.joiners.append(task)
+        else:
+            _schedule(task, 0)
+    finally:
+        _current = None
+
+
+def create_task(coro) -> Task:
+    task = Task(coro)
+    _schedule(task, 0)
+    return task
+
+
+def current_task() -> Task:
+    return _current
+
+
+def run_until_complete(main: Task):
+    while not main.finished:
+        if not _queue:
+            raise RuntimeError("deadlock: every task is waiting on an event")
+        due, _, token, task = _queue[0]
+        if token != task.token or task.finished:
+            heapq.heappop(_queue)
+            continue
+        wait = time.ticks_diff(due, time.ticks_ms())
+        if wait > 0:
+            time.sleep_ms(wait)
+            continue
+        heapq.heappop(_queue)
+        _step(task)
+    if main.exception is not None:
+        raise main.exception
+    return main.result
+
+
+def run(coro):
+    return run_until_complete(create_task(coro))
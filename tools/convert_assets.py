@@ -0,0 +1,405 @@
+# Convert images into the form that decodes fastest on the badge.
+#
+#   python tools/convert_assets.py bg_images --out /tmp/badge
+#   python tools/convert_assets.py bg_images/Bi-Flag.psd --out /tmp/badge --fit scale --colours 16
+#   python tools/convert_assets.py bg_images --out /tmp/badge --format both
+#
+# Every PNG or PSD given (or found in a given folder) is:
+#   * cropped to fill the 320x240 screen, or scaled to fit inside it (--fit),
+#   * flattened onto --background where it has transparency, because
+#     pngdec skips transparent pixels instead of blending them,
+#   * reduced to the 16-bit colour the display can show, then to at most
+#     --colours colours (median cut, only if there are more than that),
+#   * written as a paletted PNG at the smallest bit depth that holds the
+#     palette, and/or as a run-length .rle file (see lib/rle_image.py);
+#     --format auto keeps whichever of the two the badge draws faster.
+#
+# A report lists the size of each file before and after, and the decode time
+# the simulator models for it on the badge (see COSTS in sim/badge_sim.py).
+# PSDs can't be decoded on the badge at all, so they have no "before" time.
+#
+# Needs numpy (pip install -r sim/requirements.txt).
+
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "sim"))
+sys.path.insert(0, os.path.join(REPO_DIR, "lib"))
+
+import badge_sim  # noqa: E402
+import pngdec  # noqa: E402
+import rle_image  # noqa: E402
+from picographics import DISPLAY_TUFTY_2040, PEN_RGB565, PicoGraphics  # noqa: E402
+
+WIDTH, HEIGHT = 320, 240
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PSD_SIGNATURE = b"8BPS"
+
+
+# --- Reading ---
+def read_png(path: str) -> np.ndarray:
+    """Return an HxWx4 uint8 array, using the simulator's decoder"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError("not a PNG file")
+    width, height, depth, colour, _, _, interlace = struct.unpack(">IIBBBBB", data[16:29])
+    if interlace:
+        raise ValueError("interlaced PNGs are not supported")
+    png = pngdec.PNG(None)
+    png.data = data
+    png.width, png.height = width, height
+    png.header = (depth, colour)
+    return png.decode_rgba()
+
+
+def unpack_bits(data: bytes, pos: int, length: int) -> tuple:
+    """Decode one PackBits row of `length` bytes starting at `pos`, return (row, next pos)"""
+    out = bytearray()
+    while len(out) < length:
+        n = data[pos]
+        pos += 1
+        if n < 128:
+            out += data[pos:pos + n + 1]
+            pos += n + 1
+        elif n > 128:
+            out += bytes([data[pos]]) * (257 - n)
+            pos += 1
+    return bytes(out[:length]), pos
+
+
+def read_psd(path: str) -> np.ndarray:
+    """Return the merged image of an 8-bit RGB or greyscale PSD as an HxWx4 uint8 array"""
+    with open(path, "rb") as f:
+        data = f.read()
+    signature, version, channels, height, width, depth, mode = struct.unpack(">4sH6xHIIHH", data[:26])
+    if signature != PSD_SIGNATURE or version != 1:
+        raise ValueError("not a PSD file")
+    if depth != 8 or mode not in (1, 3):
+        raise ValueError(f"only 8-bit greyscale or RGB PSDs are supported (depth={depth}, mode={mode})")
+
+    # Skip the colour mode data, image resources and layers: only the merged image is needed
+    pos = 26
+    for _ in range(3):
+        pos += 4 + struct.unpack(">I", data[pos:pos + 4])[0]
+    compression = struct.unpack(">H", data[pos:pos + 2])[0]
+    pos += 2
+
+    planes = []
+    if compression == 0:
+        for c in range(channels):
+            plane = np.frombuffer(data, dtype=np.uint8, count=width * height, offset=pos)
+            planes.append(plane.reshape(height, width))
+            pos += width * height
+    elif compression == 1:
+        # A table of every row's compressed length, then the rows channel by channel
+        pos += channels * height * 2
+        for c in range(channels):
+            rows = []
+            for _ in range(height):
+                row, pos = unpack_bits(data, pos, width)
+                rows.append(np.frombuffer(row, dtype=np.uint8))
+            planes.append(np.stack(rows))
+    else:
+        raise ValueError(f"unsupported PSD compression {compression}")
+
+    colour_planes = 3 if mode == 3 else 1
+    rgba = np.full((height, width, 4), 255, dtype=np.uint8)
+    for c in range(3):
+        rgba[:, :, c] = planes[c if colour_planes == 3 else 0]
+    if channels > colour_planes:
+        rgba[:, :, 3] = planes[colour_planes]
+    return rgba
+
+
+def read_image(path: str) -> np.ndarray:
+    with open(path, "rb") as f:
+        signature = f.read(8)
+    if signature == PNG_SIGNATURE:
+        return read_png(path)
+    if signature[:4] == PSD_SIGNATURE:
+        return read_psd(path)
+    raise ValueError("not a PNG or PSD file")
+
+
+# --- Conversion ---
+def resample(rgba: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Nearest-neighbour resize; keeps flat colours flat, which suits a palette"""
+    h, w = rgba.shape[:2]
+    ys = (np.arange(height) * h // height).clip(0, h - 1)
+    xs = (np.arange(width) * w // width).clip(0, w - 1)
+    return rgba[ys][:, xs]
+
+
+def fit_screen(rgba: np.ndarray, mode: str, background: tuple) -> np.ndarray:
+    """Return a HEIGHTxWIDTHx4 image: "crop" fills the screen, "scale" fits inside it"""
+    h, w = rgba.shape[:2]
+    if (w, h) == (WIDTH, HEIGHT):
+        return rgba
+    if mode == "crop":
+        scale = max(WIDTH / w, HEIGHT / h)
+    else:
+        scale = min(WIDTH / w, HEIGHT / h)
+    new_w, new_h = max(1, round(w * scale)), max(1, round(h * scale))
+    resized = rgba if (new_w, new_h) == (w, h) else resample(rgba, new_w, new_h)
+    if mode == "crop":
+        x, y = (new_w - WIDTH) // 2, (new_h - HEIGHT) // 2
+        return resized[y:y + HEIGHT, x:x + WIDTH]
+    out = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    out[:, :, :3] = background
+    out[:, :, 3] = 255
+    x, y = (WIDTH - new_w) // 2, (HEIGHT - new_h) // 2
+    out[y:y + new_h, x:x + new_w] = resized
+    return out
+
+
+def flatten(rgba: np.ndarray, background: tuple) -> np.ndarray:
+    """Blend onto `background`, return HxWx3"""
+    alpha = rgba[:, :, 3:4].astype(np.uint32)
+    rgb = rgba[:, :, :3].astype(np.uint32)
+    bg = np.array(background, dtype=np.uint32)
+    return ((rgb * alpha + bg * (255 - alpha) + 127) // 255).astype(np.uint8)
+
+
+def to_rgb565_colours(rgb: np.ndarray) -> np.ndarray:
+    """Drop the bits RGB565 can't show, widening back so each value maps to itself"""
+    r = rgb[:, :, 0] & 0xF8
+    g = rgb[:, :, 1] & 0xFC
+    b = rgb[:, :, 2] & 0xF8
+    return np.stack([r | (r >> 5), g | (g >> 6), b | (b >> 5)], axis=2).astype(np.uint8)
+
+
+def median_cut(colours: np.ndarray, counts: np.ndarray, target: int) -> np.ndarray:
+    """Return, for each of `colours` (Nx3), the index of its box after splitting into `target` boxes"""
+    boxes = [np.arange(len(colours))]
+    while len(boxes) < target:
+        # Split the box with the most pixels spread over the widest range
+        best, best_score, best_channel = None, 0, 0
+        for i, box in enumerate(boxes):
+            if len(box) < 2:
+                continue
+            spans = colours[box].max(axis=0).astype(int) - colours[box].min(axis=0)
+            channel = int(spans.argmax())
+            score = int(spans[channel]) * int(counts[box].sum())
+            if score > best_score:
+                best, best_score, best_channel = i, score, channel
+        if best is None:
+            break
+        box = boxes.pop(best)
+        box = box[np.argsort(colours[box, best_channel], kind="stable")]
+        cumulative = np.cumsum(counts[box])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2)) + 1
+        cut = min(max(cut, 1), len(box) - 1)
+        boxes += [box[:cut], box[cut:]]
+    assignment = np.zeros(len(colours), dtype=np.int32)
+    for i, box in enumerate(boxes):
+        assignment[box] = i
+    return assignment
+
+
+def quantise(rgb: np.ndarray, max_colours: int) -> tuple:
+    """Return (HxW indices, Px3 palette) using at most `max_colours` colours"""
+    packed = (rgb[:, :, 0].astype(np.uint32) << 16) | (rgb[:, :, 1].astype(np.uint32) << 8) | rgb[:, :, 2]
+    unique, inverse, counts = np.unique(packed.ravel(), return_inverse=True, return_counts=True)
+    colours = np.stack([(unique >> 16) & 0xFF, (unique >> 8) & 0xFF, unique & 0xFF], axis=1).astype(np.uint8)
+    if len(unique) <= max_colours:
+        return inverse.reshape(rgb.shape[:2]).astype(np.uint8), colours
+
+    assignment = median_cut(colours, counts, max_colours)
+    boxes = assignment.max() + 1
+    palette = np.zeros((boxes, 3), dtype=np.uint8)
+    for i in range(boxes):
+        members = assignment == i
+        weights = counts[members].astype(np.float64)
+        mean = (colours[members].astype(np.float64) * weights[:, None]).sum(axis=0) / weights.sum()
+        palette[i] = mean.round().astype(np.uint8)
+    # Keep palette entries exactly representable in RGB565 too
+    palette = to_rgb565_colours(palette[None, :, :])[0]
+    return assignment[inverse].reshape(rgb.shape[:2]).astype(np.uint8), palette
+
+
+def bit_depth(colours: int) -> int:
+    for depth in (1, 2, 4):
+        if colours <= 1 << depth:
+            return depth
+    return 8
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_palette_png(indices: np.ndarray, palette: np.ndarray) -> bytes:
+    height, width = indices.shape
+    depth = bit_depth(len(palette))
+    if depth < 8:
+        # Pack 8 // depth pixels into each byte, most significant first
+        per_byte = 8 // depth
+        padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+        padded[:, :width] = indices
+        groups = padded.reshape(height, -1, per_byte)
+        shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * depth
+        rows = (groups << shifts).sum(axis=2).astype(np.uint8)
+    else:
+        rows = indices
+    # Filter type 0 on every row: the usual best choice for paletted images
+    raw = b"".join(b"\x00" + rows[y].tobytes() for y in range(height))
+    header = struct.pack(">IIBBBBB", width, height, depth, 3, 0, 0, 0)
+    return (PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"PLTE", palette.tobytes())
+            + png_chunk(b"IDAT", zlib.compress(raw, 9)) + png_chunk(b"IEND", b""))
+
+
+def encode_rle(indices: np.ndarray, palette: np.ndarray) -> bytes:
+    """Encode in the .rle format read by lib/rle_image.py"""
+    height, width = indices.shape
+    if width > rle_image.MAX_WIDTH:
+        raise ValueError(f"too wide for .rle ({width} > {rle_image.MAX_WIDTH})")
+    out = bytearray(struct.pack(rle_image.HEADER, rle_image.MAGIC, rle_image.VERSION, len(palette) & 0xFF,
+                                width, height))
+    out += palette.tobytes()
+    y = 0
+    while y < height:
+        row = indices[y]
+        rows = 1
+        while y + rows < height and rows < 255 and np.array_equal(indices[y + rows], row):
+            rows += 1
+        # Start of every run of one palette index, then split runs longer than 256
+        starts = np.flatnonzero(np.r_[True, row[1:] != row[:-1]])
+        ends = np.r_[starts[1:], width]
+        runs = bytearray()
+        for start, end in zip(starts, ends):
+            while end - start > 0:
+                length = min(256, end - start)
+                runs += bytes((length - 1, row[start]))
+                start += length
+        out += struct.pack(rle_image.GROUP, rows, len(runs) // 2) + runs
+        y += rows
+    return bytes(out)
+
+
+# --- Simulated decode time ---
+def simulated_decode_ms(path: str):
+    """Modelled time to draw `path` (PNG or .rle) on an RGB565 display, or None"""
+    device = badge_sim.Device(os.path.dirname(os.path.abspath(path)))
+    badge_sim.install(device)
+    try:
+        display = PicoGraphics(display=DISPLAY_TUFTY_2040, pen_type=PEN_RGB565)
+        png = rle_image.RLE(display) if rle_image.is_rle(path) else pngdec.PNG(display)
+        start = device.clock.us
+        png.open_file("/" + os.path.basename(path))
+        png.decode(0, 0)
+        return round((device.clock.us - start) / 1000, 1)
+    except Exception:
+        return None
+    finally:
+        badge_sim.uninstall()
+
+
+# --- Command line ---
+def find_inputs(paths: list) -> list:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith((".png", ".psd")):
+                    found.append(os.path.join(path, name))
+        else:
+            found.append(path)
+    return found
+
+
+def convert(path: str, out_dir: str, fit: str, background: tuple, max_colours: int, output: str) -> dict:
+    rgba = read_image(path)
+    source_size = rgba.shape[1], rgba.shape[0]
+    rgb = to_rgb565_colours(flatten(fit_screen(rgba, fit, background), background))
+    indices, palette = quantise(rgb, max_colours)
+
+    base = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0])
+    written = {}
+    if output != "rle":
+        written["png"] = encode_palette_png(indices, palette)
+    if output != "png":
+        written["rle"] = encode_rle(indices, palette)
+    outputs = []
+    for kind, data in written.items():
+        out_path = f"{base}.{kind}"
+        with open(out_path, "wb") as f:
+            f.write(data)
+        outputs.append({"format": kind, "output": out_path, "output_bytes": len(data),
+                        "output_decode_ms": simulated_decode_ms(out_path)})
+    if output == "auto":
+        # Keep only the one that draws faster
+        outputs.sort(key=lambda o: (o["output_decode_ms"] is None, o["output_decode_ms"], o["output_bytes"]))
+        for rejected in outputs[1:]:
+            os.remove(rejected["output"])
+        outputs = outputs[:1]
+
+    source = {
+        "source": path,
+        "source_size": list(source_size),
+        "colours": len(palette),
+        "bit_depth": bit_depth(len(palette)),
+        "source_bytes": os.path.getsize(path),
+        "source_decode_ms": simulated_decode_ms(path) if path.lower().endswith(".png") else None,
+    }
+    return [dict(source, **o) for o in outputs]
+
+
+def parse_colour(text: str) -> tuple:
+    parts = [int(p) for p in text.split(",")]
+    if len(parts) != 3 or not all(0 <= p <= 255 for p in parts):
+        raise argparse.ArgumentTypeError("expected R,G,B with each 0-255")
+    return tuple(parts)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert images for the Tufty 2040 badge")
+    parser.add_argument("inputs", nargs="+", help="PNG/PSD files or folders of them")
+    parser.add_argument("--out", required=True, help="folder to write the converted PNGs into")
+    parser.add_argument("--fit", choices=("crop", "scale"), default="crop",
+                        help="crop to fill the screen (default) or scale to fit inside it")
+    parser.add_argument("--background", type=parse_colour, default=(0, 0, 0),
+                        help="R,G,B behind transparent pixels and around scaled images (default 0,0,0)")
+    parser.add_argument("--colours", type=int, default=256, choices=(2, 4, 16, 256),
+                        help="largest palette to use (default 256)")
+    parser.add_argument("--format", choices=("png", "rle", "both", "auto"), default="auto",
+                        help="paletted PNG, run-length .rle, both, or whichever draws faster (default)")
+    parser.add_argument("--json", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    report = []
+    failed = 0
+    for path in find_inputs(args.inputs):
+        try:
+            report += convert(path, args.out, args.fit, args.background, args.colours, args.format)
+        except (OSError, ValueError) as e:
+            print(f"Error converting {path}: {e}", file=sys.stderr)
+            failed += 1
+
+    def ms(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    print(f"{'file':24} {'source':>9} {'format':>6} {'colours':>7} {'bytes':>8} {'->':^2} {'bytes':<8} "
+          f"{'decode ms':>9} {'->':^2} {'decode ms':<9}")
+    for entry in report:
+        print(f"{os.path.basename(entry['source']):24} {'x'.join(map(str, entry['source_size'])):>9} {entry['format']:>6} "
+              f"{entry['colours']:>7} {entry['source_bytes']:>8} -> {entry['output_bytes']:<8} "
+              f"{ms(entry['source_decode_ms']):>9} -> {ms(entry['output_decode_ms']):<9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())